@@ -1,10 +1,27 @@
 from flask import Flask
+import os
+import fast_json
 
 app = Flask(__name__)
+# jsonify through orjson when it is installed
+if fast_json.orjson is not None:
+    app.json = fast_json.FastJSONProvider(app)
 
 import controller_article
 import controller_auth
 import controller_ml_model
+import controller_health
+import controller_profiling
+from async_firestore import FIRESTORE_MODE
+if FIRESTORE_MODE == 'async':
+    import controller_async
+import controller_compression
+from startup import STARTUP
+
+# Load the catalog, ratings, models and indexes in background threads; /readyz reports progress
+STARTUP.start()
+if os.getenv('STARTUP_BLOCKING') == '1':
+    STARTUP.wait()
 
 if __name__ == "__main__":
     app.run()
@@ -0,0 +1,88 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import threading
+from dotenv import load_dotenv
+# Load environment variables from .env file
+load_dotenv()
+
+# 'sync' serves every route with the blocking Firestore client; 'async' swaps the
+# Firestore-bound routes for async handlers on firestore.AsyncClient (see controller_async.py)
+FIRESTORE_MODE = os.getenv('FIRESTORE_MODE', 'sync')
+
+
+# Runs Firestore AsyncClient calls on one long-lived event loop thread.
+# Flask runs each async view on its own short-lived loop, while the client's gRPC channel
+# must stay on the loop it was created on, so views hand their coroutines over with
+# run()/gather() and await the result from their own loop. The coroutines run in a copy of
+# the caller's context, so request metrics (metrics.CURRENT_REQUEST) see their Firestore calls.
+class AsyncFirestore:
+    def __init__(self, client_factory):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='firestore-async', daemon=True)
+        self._thread.start()
+        self.client = asyncio.run_coroutine_threadsafe(self._create(client_factory), self._loop).result()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    async def _create(client_factory):
+        return client_factory()
+
+    # Await a coroutine built from self.client on the client's loop
+    async def run(self, coroutine):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await asyncio.wrap_future(self._submit(coroutine))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    # Like asyncio.run_coroutine_threadsafe, but the task runs in the caller's context
+    def _submit(self, coroutine):
+        future = concurrent.futures.Future()
+
+        def done(task):
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def start():
+            # Tasks copy the context current when they are created: the caller's, here
+            asyncio.ensure_future(coroutine).add_done_callback(done)
+
+        self._loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+        return future
+
+    # Run independent calls concurrently; results come back in argument order
+    async def gather(self, *coroutines):
+        return await self.run(self._gather(coroutines))
+
+    @staticmethod
+    async def _gather(coroutines):
+        return await asyncio.gather(*coroutines)
+
+    # Documents of several references in one batched read, in no particular order
+    async def get_all(self, references):
+        return await self.run(self._get_all(references))
+
+    async def _get_all(self, references):
+        return [doc async for doc in self.client.get_all(references)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': FIRESTORE_MODE,
+                'calls': self.calls,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+            }
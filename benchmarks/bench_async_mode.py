@@ -0,0 +1,121 @@
+# Compare how many requests one worker keeps in flight with FIRESTORE_MODE=sync and =async.
+# Replays the Firestore calls of add_to_favorite and delete_rating against fake_firestore with
+# a simulated round trip per RPC instead of a Firebase project:
+#   sync         each request blocks a worker thread on its calls, one after another
+#   async        each request runs as an async view (asgiref's async_to_sync, as Flask does),
+#                with independent reads gathered on the shared AsyncFirestore loop
+#   async-loop   every request is a coroutine on one event loop, the ceiling an ASGI server
+#                would reach with the same handlers
+# Run from the repository root: python -m benchmarks.bench_async_mode [threads] [latency_ms]
+import asyncio
+import sys
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+
+from async_firestore import AsyncFirestore
+from fake_firestore import FakeAsyncFirestore, FakeFirestore
+
+
+def sync_request(db, i):
+    user_ref = db.collection('users').document(f"user{i}")
+    # add_to_favorite: article check, user check, user re-read, update
+    db.collection('articles').document(f"article{i}").get()
+    user_ref.get()
+    favorites = user_ref.get().to_dict().get('favorite_articles', [])
+    user_ref.update({'favorite_articles': favorites + [f"article{i}"]})
+    # delete_rating: user and rating in one get_all, then the batch
+    rating_ref = db.collection('ratings').document(f"user{i}_article{i}")
+    list(db.get_all([user_ref, rating_ref]))
+    batch = db.batch()
+    batch.set(rating_ref, {'article_rating': 5})
+    batch.commit()
+
+
+async def async_request(firestore, i):
+    db = firestore.client
+    user_ref = db.collection('users').document(f"user{i}")
+    article_doc, user_doc = await firestore.gather(
+        db.collection('articles').document(f"article{i}").get(), user_ref.get())
+    favorites = user_doc.to_dict().get('favorite_articles', [])
+    await firestore.run(user_ref.update({'favorite_articles': favorites + [f"article{i}"]}))
+    rating_ref = db.collection('ratings').document(f"user{i}_article{i}")
+    await firestore.gather(user_ref.get(), rating_ref.get())
+    batch = db.batch()
+    batch.set(rating_ref, {'article_rating': 5})
+    await firestore.run(batch.commit())
+
+
+# Run `requests` requests on `threads` worker threads; returns (seconds, per-request latencies)
+def run_threads(handler, threads, requests):
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            handler(i)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+
+def run_loop(firestore, concurrency, requests):
+    latencies = []
+
+    async def one(i, semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            await async_request(firestore, i)
+            latencies.append(time.perf_counter() - start)
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(one(i, semaphore) for i in range(requests)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - start, latencies
+
+
+def main(threads, latency_ms, requests=400):
+    db = FakeFirestore()
+    for i in range(requests):
+        db.collection('users').document(f"user{i}").set({'user_id': f"user{i}", 'favorite_articles': []})
+        db.collection('articles').document(f"article{i}").set({'article_id': f"article{i}"})
+    db.latency = latency_ms / 1000
+    firestore = AsyncFirestore(lambda: FakeAsyncFirestore(db))
+    handle_async = async_to_sync(async_request)
+
+    print(f"{threads} worker threads, {latency_ms} ms per round trip, {requests} requests")
+    print(f"{'mode':>11} {'in flight':>9} {'req/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'RPCs/req':>8}")
+    rows = [
+        ('sync', threads, lambda: run_threads(lambda i: sync_request(db, i), threads, requests)),
+        ('async', threads, lambda: run_threads(lambda i: handle_async(firestore, i), threads, requests)),
+        ('async-loop', threads * 10, lambda: run_loop(firestore, threads * 10, requests)),
+    ]
+    for mode, in_flight, run in rows:
+        round_trips = db.round_trips
+        elapsed, latencies = run()
+        latencies.sort()
+        print(f"{mode:>11} {in_flight:>9} {requests / elapsed:>8.0f} {latencies[len(latencies) // 2] * 1e3:>7.1f} "
+              f"{latencies[int(len(latencies) * 0.95)] * 1e3:>7.1f} {(db.round_trips - round_trips) / requests:>8.1f}")
+    print(f"peak concurrent Firestore calls (async modes): {firestore.stats()['max_in_flight']}")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 8, float(args[1]) if len(args) > 1 else 20)
@@ -0,0 +1,62 @@
+# Compare the memory held by the catalog as a list of dicts (the old ARTICLES) and as
+# the columnar ArticleCatalog, plus the cost of the per-request DataFrame the old
+# recommenders built from it.
+# Run from the repository root: python -m benchmarks.bench_catalog_memory [sizes...]
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from catalog import ArticleCatalog
+from benchmarks.bench_search import synthetic_titles, WORDS
+
+SOURCES = ['Nature', 'Science', 'IEEE Access', 'PLOS ONE', 'Scientific Reports', 'Energy', 'Water Research']
+
+
+def synthetic_frame(count, seed=0):
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        'article_id': range(1, count + 1),
+        'title': synthetic_titles(count, seed),
+        'year': [rng.randint(1990, 2024) for _ in range(count)],
+        'cited_by': [rng.randint(0, 5000) for _ in range(count)],
+        'source_title': [rng.choice(SOURCES) for _ in range(count)],
+        'index_keywords': ['; '.join(rng.sample(WORDS, 4)) for _ in range(count)],
+        'doi': [f"10.{rng.randint(1000, 9999)}/{i}" for i in range(count)],
+    })
+
+
+# Bytes still allocated by build() while its result is alive
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def main(sizes):
+    print(f"{'articles':>10} {'dicts MB':>9} {'columnar MB':>12} {'ratio':>6} {'DataFrame(dicts) ms':>20} {'rows(10) us':>12}")
+    for size in sizes:
+        df = synthetic_frame(size)
+        dicts_bytes, records = traced(lambda: df.to_dict(orient='records'))
+        catalog = ArticleCatalog()
+        catalog_bytes, _ = traced(lambda: catalog.load_frame(df))
+        start = time.perf_counter()
+        pd.DataFrame(records)
+        frame_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for position in range(0, 1000):
+            catalog.rows(range(position, position + 10))
+        rows_time = (time.perf_counter() - start) / 1000
+        assert catalog.rows(range(3)) == records[:3], "materialized rows differ from the dicts"
+        print(f"{size:>10} {dicts_bytes / 2**20:>9.1f} {catalog_bytes / 2**20:>12.1f} "
+              f"{dicts_bytes / catalog_bytes:>5.1f}x {frame_time * 1e3:>20.1f} {rows_time * 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000, 500000])
@@ -0,0 +1,228 @@
+# Latency and peak-memory scaling of the recommendation and search engines, fully offline:
+# a synthetic catalog, users and ratings served from fake_firestore in place of firebase.db,
+# and tiny randomly initialized models with the real models' input/output shapes.
+#
+# Each point of the curve is <articles>x<users>; ratings are density * articles * users.
+# Results are compared with benchmarks/baselines/bench_engines.json, which is committed, so a
+# change that moves the numbers shows up in review as a diff of that file.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_engines                  print the curves and the change vs the baseline
+#   python -m benchmarks.bench_engines --check          also exit 1 if an engine regressed
+#   python -m benchmarks.bench_engines --save           rewrite the baseline with this run
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import types
+
+import numpy as np
+
+from fake_firestore import FakeFirestore
+
+sys.modules.setdefault('firebase', types.SimpleNamespace(db=FakeFirestore()))
+import load_articles  # noqa: E402
+import load_models  # noqa: E402
+import load_ratings  # noqa: E402
+import operate_collaborative_model  # noqa: E402
+import operate_content_model  # noqa: E402
+from benchmarks.bench_search import QUERIES  # noqa: E402
+from benchmarks.synthetic import populate, synthetic_frame, synthetic_ratings, synthetic_users, tiny_models  # noqa: E402
+from search_index import SortOrders, TitleSearchIndex  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'bench_engines.json')
+DEFAULT_POINTS = ['1000x500', '5000x2000', '20000x5000']
+# Allowed growth over the baseline before --check fails. Latency is compared after scaling by
+# the calibration loop, so a slower or faster machine does not count as a regression.
+LATENCY_TOLERANCE = 1.5
+MEMORY_TOLERANCE = 1.25
+LATENCY_FLOOR_MS = 0.1
+MEMORY_FLOOR_MB = 0.1
+
+
+# Fixed NumPy + Python workload timed on every run to normalize latencies across machines
+def calibrate(repeat=5):
+    rng = np.random.default_rng(0)
+    matrix = rng.random((300, 300))
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        np.argsort(matrix @ matrix, axis=1)
+        sorted(str(i) for i in range(50000))
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+# Load a synthetic dataset into the module globals the engines read, the way the startup
+# stages would from the CSV, Firestore and the model files
+def load_dataset(num_articles, num_users, density, seed=0):
+    frame = synthetic_frame(num_articles, seed)
+    load_articles.ARTICLES.load_frame(frame)
+    titles = load_articles.ARTICLES.column('title')
+    load_articles.TITLE_INDEX = TitleSearchIndex(titles)
+    load_articles.SORT_ORDERS = SortOrders(titles, load_articles.ARTICLES.column('year'), load_articles.ARTICLES.column('cited_by'))
+
+    db = FakeFirestore()
+    users = synthetic_users(num_users, seed)
+    ratings = synthetic_ratings(num_users, frame['article_id'].to_numpy(), density, seed)
+    populate(db, users, ratings)
+    store = load_ratings.RatingsStore(db)
+    store.start()
+    for module in (load_ratings, operate_collaborative_model, operate_content_model):
+        module.RATINGS = store
+
+    load_models.MODEL_CONTENT, load_models.MODEL_COLLABORATIVE = tiny_models(num_users, num_articles, seed=seed)
+    operate_collaborative_model.initialize_collaborative_scorer()
+    operate_content_model.initialize_similarity_index()
+    operate_content_model.initialize_user_article_matrix()
+
+    rated_users = sorted({user_id for user_id, _, _ in ratings})
+    return {
+        'users': rated_users,
+        'articles': frame['article_id'].tolist(),
+        'subject_areas': [users[user_id]['subject_area'] for user_id in rated_users],
+        'ratings': len(ratings),
+    }
+
+
+# Engine name -> function(i) running one call on the i-th sample input
+def engines(dataset):
+    users, articles, subject_areas = dataset['users'], dataset['articles'], dataset['subject_areas']
+    content_model = load_models.MODEL_CONTENT
+
+    def collaborative_predict(i):
+        scorer = operate_collaborative_model.COLLABORATIVE_SCORER
+        operate_collaborative_model.COLLABORATIVE_SCORER = None
+        try:
+            return operate_collaborative_model.recommend_articles(users[i % len(users)])
+        finally:
+            operate_collaborative_model.COLLABORATIVE_SCORER = scorer
+
+    def search(i):
+        _, page, _, _ = load_articles.search_catalog(QUERIES[i % len(QUERIES)], (), ('title', 'year', 'cited_by')[i % 3])
+        return load_articles.ARTICLES.rows(page)
+
+    return {
+        'recommend_articles': lambda i: operate_collaborative_model.recommend_articles(users[i % len(users)]),
+        'recommend_articles[predict]': collaborative_predict,
+        'recommend_articles[new user]': lambda i: operate_collaborative_model.recommend_articles(f"new{i}"),
+        'recommend_for_user': lambda i: operate_content_model.recommend_for_user(
+            users[i % len(users)], subject_areas[i % len(users)], model=content_model),
+        'recommend_for_user[new user]': lambda i: operate_content_model.recommend_for_user(
+            f"new{i}", subject_areas[i % len(users)], model=content_model),
+        'get_recommendations_legacy': lambda i: operate_content_model.get_recommendations_legacy(articles[i * 7919 % len(articles)]),
+        'search': search,
+    }
+
+
+def measure(fn, repeat):
+    fn(0)  # warm up per-version caches such as RATINGS.ratings_arrays()
+    latencies = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    fn(repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies = np.array(latencies) * 1e3
+    return {
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        'peak_mb': round(peak / 2**20, 3),
+    }
+
+
+def run(points, density, repeat):
+    results = {}
+    for point in points:
+        num_articles, num_users = (int(value) for value in point.split('x'))
+        start = time.perf_counter()
+        dataset = load_dataset(num_articles, num_users, density)
+        print(f"{point}: {dataset['ratings']} ratings, loaded in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        results[point] = {name: measure(fn, repeat) for name, fn in engines(dataset).items()}
+        operate_content_model.RATINGS.stop()
+    return results
+
+
+# Ratio of this run to the baseline per engine and point (latency scaled by the calibration)
+def compare(run_results, baseline, calibration_ms):
+    scale = baseline['calibration_ms'] / calibration_ms
+    changes = {}
+    for point, engines_results in run_results.items():
+        for name, result in engines_results.items():
+            base = baseline['results'].get(point, {}).get(name)
+            if base is None:
+                continue
+            # Below the floors, differences are timer and allocator noise
+            changes[(point, name)] = (
+                max(result['p50_ms'] * scale, LATENCY_FLOOR_MS) / max(base['p50_ms'], LATENCY_FLOOR_MS),
+                max(result['peak_mb'], MEMORY_FLOOR_MB) / max(base['peak_mb'], MEMORY_FLOOR_MB),
+            )
+    return changes
+
+
+def report(results, changes):
+    print(f"{'engine':>30} {'point':>11} {'p50 ms':>8} {'p95 ms':>8} {'peak MB':>8} {'p50 vs base':>12} {'peak vs base':>13}")
+    for name in next(iter(results.values())):
+        for point, engines_results in results.items():
+            result = engines_results[name]
+            latency_change, memory_change = changes.get((point, name), (None, None))
+            print(f"{name:>30} {point:>11} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['peak_mb']:>8.2f} "
+                  f"{f'{latency_change:.2f}x' if latency_change else '-':>12} {f'{memory_change:.2f}x' if memory_change else '-':>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recommendation and search engine scaling benchmark')
+    parser.add_argument('--points', default=','.join(DEFAULT_POINTS), help='comma-separated <articles>x<users>')
+    parser.add_argument('--density', type=float, default=0.005, help='fraction of (user, article) pairs rated')
+    parser.add_argument('--repeat', type=int, default=30, help='timed calls per engine and point')
+    parser.add_argument('--save', action='store_true', help='write this run as the new baseline')
+    parser.add_argument('--check', action='store_true', help='exit 1 if an engine regressed against the baseline')
+    args = parser.parse_args()
+
+    calibration_ms = calibrate()
+    results = run(args.points.split(','), args.density, args.repeat)
+    baseline = None
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    changes = {}
+    if baseline is not None and baseline['density'] == args.density:
+        changes = compare(results, baseline, calibration_ms)
+    report(results, changes)
+
+    if args.save:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({
+                'calibration_ms': round(calibration_ms, 3),
+                'machine': f"{platform.machine()} / Python {platform.python_version()} / NumPy {np.__version__}",
+                'density': args.density,
+                'repeat': args.repeat,
+                'results': results,
+            }, f, indent=2)
+            f.write('\n')
+        print(f"Saved baseline to {BASELINE_PATH}")
+    if args.check:
+        regressions = [
+            f"{name} at {point}: p50 {latency_change:.2f}x, peak memory {memory_change:.2f}x"
+            for (point, name), (latency_change, memory_change) in changes.items()
+            if latency_change > LATENCY_TOLERANCE or memory_change > MEMORY_TOLERANCE
+        ]
+        if baseline is None or not changes:
+            print("No comparable baseline; run with --save first")
+            sys.exit(1)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# Compare the /auth/google user lookups: the `where('email', '==', ...)` query path against the
+# email index kept by the users listener. Runs against fake_firestore with a simulated round
+# trip per RPC instead of a Firebase project.
+# Run from the repository root: python -m benchmarks.bench_login [num_users] [latency_ms]
+import sys
+import time
+import types
+
+from fake_firestore import FakeFirestore
+
+DB = FakeFirestore()
+sys.modules.setdefault('firebase', types.SimpleNamespace(db=DB))
+from load_ratings import RatingsStore  # noqa: E402
+
+
+# The previous lookups: query, then on registration update and re-read the guest
+def query_login(db, email, user_id):
+    user_ref = db.collection('users').where('email', '==', email).get()
+    if not user_ref:
+        db.collection('users').document(user_id).update({'email': email, 'name': 'Guest'})
+        return db.collection('users').document(user_id).get().to_dict()
+    return user_ref[0].to_dict()
+
+
+# The indexed lookups: the listener's email index, then on registration a single update
+def indexed_login(db, store, email, user_id):
+    found = store.find_user_by_email(email)
+    if found is None:
+        user = store.get_user(user_id)
+        if user is None:
+            user = db.collection('users').document(user_id).get().to_dict() or {}
+        db.collection('users').document(user_id).update({'email': email, 'name': 'Guest'})
+        store.apply_local_user(user_id, {'email': email, 'name': 'Guest'})
+        user.update({'email': email, 'name': 'Guest'})
+        return user
+    return found[1]
+
+
+def measure(db, fn, calls):
+    reads, writes, round_trips = db.reads, db.writes, db.round_trips
+    start = time.perf_counter()
+    for args in calls:
+        fn(*args)
+    elapsed = time.perf_counter() - start
+    count = len(calls)
+    return (elapsed / count * 1e3, (db.reads - reads) / count, (db.writes - writes) / count,
+            (db.round_trips - round_trips) / count)
+
+
+def main(num_users, latency_ms, repeat=200):
+    users = DB.collection('users')
+    for i in range(num_users):
+        users.document(f"user{i}").set({'user_id': f"user{i}", 'email': f"user{i}@example.com", 'name': f"User {i}"})
+    for i in range(repeat * 2):
+        users.document(f"guest{i}").set({'user_id': f"guest{i}", 'email': '', 'name': ''})
+    store = RatingsStore(DB)
+    store.start()
+    DB.latency = latency_ms / 1000
+
+    logins = [(f"user{i % num_users}@example.com", None) for i in range(repeat)]
+    print(f"{num_users} users, {latency_ms} ms per round trip")
+    print(f"{'flow':>10} {'path':>8} {'ms/op':>8} {'reads':>6} {'writes':>7} {'RPCs':>5}")
+    rows = [
+        ('login', 'query', measure(DB, lambda email, _: query_login(DB, email, None), logins)),
+        ('login', 'index', measure(DB, lambda email, _: indexed_login(DB, store, email, None), logins)),
+        ('register', 'query', measure(DB, lambda email, user_id: query_login(DB, email, user_id),
+                                      [(f"new{i}@example.com", f"guest{i}") for i in range(repeat)])),
+        ('register', 'index', measure(DB, lambda email, user_id: indexed_login(DB, store, email, user_id),
+                                      [(f"new{i}@example.com", f"guest{i}") for i in range(repeat, repeat * 2)])),
+    ]
+    for flow, path, (ms, reads, writes, round_trips) in rows:
+        print(f"{flow:>10} {path:>8} {ms:>8.2f} {reads:>6.1f} {writes:>7.1f} {round_trips:>5.1f}")
+    store.stop()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 10000, float(args[1]) if len(args) > 1 else 5)
@@ -0,0 +1,50 @@
+# Benchmark the /search title trigram index against the linear substring scan.
+# Run from the repository root: python -m benchmarks.bench_search [sizes...]
+import random
+import sys
+import time
+
+from search_index import TitleSearchIndex
+
+WORDS = [
+    'learning', 'deep', 'neural', 'network', 'analysis', 'data', 'model', 'graph', 'quantum',
+    'energy', 'protein', 'climate', 'control', 'system', 'optimization', 'image', 'language',
+    'robust', 'sparse', 'distributed', 'federated', 'health', 'urban', 'water', 'soil', 'policy',
+    'learning-based', 'transformer', 'sensor', 'battery', 'genome', 'market', 'risk', 'fuzzy',
+]
+QUERIES = ['neural', 'deep learning', 'quantum', 'sparse graph', 'ing', 'xyz', 'data analysis', 'ba']
+
+
+def synthetic_titles(count, seed=0):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 10))).title() for _ in range(count)]
+
+
+def linear_scan(titles, query):
+    return [position for position, title in enumerate(titles) if query in title.lower()]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main(sizes):
+    print(f"{'articles':>10} {'query':>14} {'matches':>8} {'scan ms':>9} {'index ms':>9} {'speedup':>8}")
+    for size in sizes:
+        titles = synthetic_titles(size)
+        start = time.perf_counter()
+        index = TitleSearchIndex(titles)
+        print(f"{size:>10} {'(build)':>14} {'':>8} {'':>9} {(time.perf_counter() - start) * 1e3:>9.1f}")
+        repeat = max(1, 200000 // size)
+        for query in QUERIES:
+            scan_time, expected = timed(lambda: linear_scan(titles, query), repeat)
+            index_time, actual = timed(lambda: index.search(query), repeat)
+            assert actual == expected, f"index result differs from scan for {query!r}"
+            print(f"{size:>10} {query!r:>14} {len(actual):>8} {scan_time * 1e3:>9.2f} {index_time * 1e3:>9.2f} {scan_time / index_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,237 @@
+# End-to-end HTTP load test of the Flask app for capacity planning.
+# For each --workers count it starts that many benchmarks/loadtest_server.py processes (the real
+# app on synthetic data, Firestore faked in-process or the emulator), then for each --concurrency
+# level runs that many client threads replaying user journeys against them round-robin:
+#   guest      /subject_area signup, then the session below with the returned token
+#   returning  a JWT minted for a seeded user, then the session below
+#   session    both home-page recommendation calls, /search and two more pages by cursor,
+#              a rating, a favorite, and the favorites list
+# Reports throughput, p50/p95/p99 latency and errors per route, plus Firestore document
+# reads/writes per request when the workers run on the in-process fake.
+#
+# Run from the repository root:
+#   python -m benchmarks.loadtest --workers 1,2 --concurrency 4,16 --duration 20
+import argparse
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import numpy as np
+import requests
+
+from benchmarks.bench_search import QUERIES, WORDS
+
+BASE_PORT = 8100
+GUEST_SHARE = 0.3
+
+
+# Request latencies and outcomes per route label, shared by the client threads
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def call(self, session, label, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=30, **kwargs)
+            failed = response.status_code >= 500
+        except requests.RequestException:
+            response, failed = None, True
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[label].append(elapsed)
+            if failed:
+                self.errors[label] += 1
+        return response
+
+
+# A JWT token_required accepts, as /auth/google would issue it
+def mint_token(user_id, secret, lifetime=timedelta(hours=1)):
+    payload = {'user_id': user_id, 'email': f"{user_id}@example.com", 'name': user_id,
+               'exp': datetime.now(timezone.utc) + lifetime}
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+class Journeys:
+    def __init__(self, recorder, num_articles, num_users, secret):
+        self.recorder = recorder
+        self.num_articles = num_articles
+        self.num_users = num_users
+        self.secret = secret
+
+    def guest(self, session, url, rng):
+        response = self.recorder.call(session, 'POST /subject_area', 'POST', f"{url}/subject_area",
+                                      json={'subject_area': rng.choice(WORDS)})
+        if response is None or response.status_code != 201:
+            return
+        token, user = response.json()
+        self.session(session, url, rng, token['jwt_token'], user['user']['user_id'])
+
+    def returning(self, session, url, rng):
+        user_id = f"user{rng.randrange(self.num_users)}"
+        self.session(session, url, rng, mint_token(user_id, self.secret), user_id)
+
+    def session(self, session, url, rng, token, user_id):
+        call = self.recorder.call
+        headers = {'Authorization': f"Bearer {token}"}
+        call(session, 'POST /content-model/get-articles', 'POST', f"{url}/content-model/get-articles",
+             headers=headers, json={'user_id': user_id})
+        call(session, 'POST /collaborative-model/get-articles', 'POST', f"{url}/collaborative-model/get-articles",
+             headers=headers, json={'user_id': user_id})
+        params = {'query': rng.choice(QUERIES), 'sort_by': rng.choice(['title', 'year', 'cited_by'])}
+        for page in range(3):
+            response = call(session, 'GET /search', 'GET', f"{url}/search", headers=headers, params=params)
+            cursor = response.json().get('next_cursor') if response is not None and response.ok else None
+            if not cursor:
+                break
+            params = {'cursor': cursor}
+        article_id = rng.randint(1, self.num_articles)
+        call(session, 'POST /articles/rating', 'POST', f"{url}/articles/rating", headers=headers,
+             json={'article_id': article_id, 'user_id': user_id, 'article_rating': rng.randint(1, 5)})
+        call(session, 'POST /articles/favorite', 'POST', f"{url}/articles/favorite", headers=headers,
+             json={'article_id': str(article_id), 'user_id': user_id})
+        call(session, 'GET /articles/favorite/<user_id>', 'GET', f"{url}/articles/favorite/{user_id}", headers=headers)
+
+
+# Run journeys on `concurrency` threads for `duration` seconds; returns the elapsed seconds
+def run_load(journeys, urls, concurrency, duration):
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(index)
+        session = requests.Session()
+        url = urls[index % len(urls)]
+        while time.monotonic() < deadline:
+            if rng.random() < GUEST_SHARE:
+                journeys.guest(session, url, rng)
+            else:
+                journeys.returning(session, url, rng)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def start_workers(count, args):
+    workers, urls = [], []
+    for index in range(count):
+        port = BASE_PORT + index
+        command = [sys.executable, '-m', 'benchmarks.loadtest_server', '--port', str(port),
+                   '--articles', str(args.articles), '--users', str(args.users), '--density', str(args.density)]
+        if index == 0 and os.getenv('FIRESTORE_EMULATOR_HOST'):
+            command.append('--seed-db')
+        workers.append(subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        urls.append(f"http://127.0.0.1:{port}")
+    deadline = time.monotonic() + args.startup_timeout
+    for url, worker in zip(urls, workers):
+        while True:
+            if worker.poll() is not None:
+                stop_workers(workers)
+                raise RuntimeError(f"Worker {url} exited with {worker.returncode}")
+            try:
+                if requests.get(f"{url}/readyz", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.monotonic() > deadline:
+                stop_workers(workers)
+                raise TimeoutError(f"Worker {url} not ready after {args.startup_timeout}s")
+            time.sleep(0.5)
+    return workers, urls
+
+
+def stop_workers(workers):
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.wait()
+
+
+# Firestore reads/writes per route summed over the workers, or None on the emulator
+def firestore_ops(urls):
+    totals = defaultdict(lambda: np.zeros(3))
+    for url in urls:
+        try:
+            response = requests.get(f"{url}/loadtest/firestore-ops", timeout=5)
+        except requests.RequestException:
+            return None
+        if response.status_code != 200:
+            return None
+        for route, ops in response.json().items():
+            totals[route] += (ops['requests'], ops['reads'], ops['writes'])
+    return totals
+
+
+def report(workers, concurrency, elapsed, recorder, ops):
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    print(f"\n{workers} worker(s), {concurrency} concurrent clients: {total / elapsed:.1f} req/s over {elapsed:.0f}s")
+    print(f"{'route':>38} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'reads':>6} {'writes':>7}")
+    rows = {}
+    for label, latencies in sorted(recorder.latencies.items()):
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1e3, [50, 95, 99])
+        route = label.split(' ', 1)[1]
+        reads = writes = None
+        if ops is not None and route in ops and ops[route][0]:
+            reads, writes = ops[route][1] / ops[route][0], ops[route][2] / ops[route][0]
+        rows[label] = {'requests_per_second': len(latencies) / elapsed, 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+                       'errors': recorder.errors[label], 'reads_per_request': reads, 'writes_per_request': writes}
+        print(f"{label:>38} {len(latencies) / elapsed:>7.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {recorder.errors[label]:>7} "
+              f"{'-' if reads is None else f'{reads:.1f}':>6} {'-' if writes is None else f'{writes:.1f}':>7}")
+    return {'workers': workers, 'concurrency': concurrency, 'requests_per_second': total / elapsed, 'routes': rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end HTTP load test of the Flask app')
+    parser.add_argument('--workers', default='1', help='comma-separated worker counts')
+    parser.add_argument('--concurrency', default='1,4,16', help='comma-separated client thread counts')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per run')
+    parser.add_argument('--warmup', type=float, default=3, help='unrecorded seconds before each run')
+    parser.add_argument('--articles', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--density', type=float, default=0.005)
+    parser.add_argument('--startup-timeout', type=float, default=300)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    # The workers inherit the secret, so minted tokens verify
+    os.environ.setdefault('JWT_SECRET', secrets.token_hex(32))
+    os.environ.setdefault('JWT_EXP_DELTA_HOURS', '8')
+    secret = os.environ['JWT_SECRET']
+
+    results = []
+    for workers in (int(value) for value in args.workers.split(',')):
+        processes, urls = start_workers(workers, args)
+        try:
+            for concurrency in (int(value) for value in args.concurrency.split(',')):
+                run_load(Journeys(Recorder(), args.articles, args.users, secret), urls, concurrency, args.warmup)
+                before = firestore_ops(urls)
+                recorder = Recorder()
+                elapsed = run_load(Journeys(recorder, args.articles, args.users, secret), urls, concurrency, args.duration)
+                after = firestore_ops(urls)
+                ops = None
+                if before is not None and after is not None:
+                    ops = {route: after[route] - before.get(route, 0) for route in after}
+                results.append(report(workers, concurrency, elapsed, recorder, ops))
+        finally:
+            stop_workers(processes)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# One app.py worker for the load test (benchmarks/loadtest.py starts one per --workers).
+# Runs the real app on a synthetic catalog, ratings and tiny models, with Firestore either
+# an in-process fake_firestore seeded with the same users and ratings, or the Firestore
+# emulator when FIRESTORE_EMULATOR_HOST is set (seeded by the first worker with --seed-db).
+#
+# With the fake, every request's document reads and writes are attributed to its route and
+# served at GET /loadtest/firestore-ops (sync mode only: with FIRESTORE_MODE=async the calls run
+# on the client's event loop thread). The emulator offers no such counts.
+#
+# Run from the repository root:
+#   python -m benchmarks.loadtest_server --port 8001 [--articles 5000 --users 2000 --density 0.005]
+import argparse
+import os
+import sys
+import threading
+import types
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from benchmarks.synthetic import populate, synthetic_frame, synthetic_ratings, synthetic_users, write_tiny_models  # noqa: E402
+from fake_firestore import FakeAsyncFirestore, FakeFirestore  # noqa: E402
+
+# File names load_articles.py and load_models.py read from the working directory
+ARTICLES_FILE = 'articles_selected_with_doi.csv'
+MODEL_FILES = ('ContentBasedFilteringModel.npz', 'CollaborativeFilteringModel.npz')
+
+
+# Directory holding the synthetic CSV and model exports for these parameters, built once
+def dataset_dir(num_articles, num_users, seed=0):
+    path = os.path.join(REPOSITORY, 'benchmarks', '.loadtest', f"{num_articles}x{num_users}-{seed}")
+    if not os.path.exists(os.path.join(path, MODEL_FILES[1])):
+        os.makedirs(path, exist_ok=True)
+        synthetic_frame(num_articles, seed).to_csv(os.path.join(path, ARTICLES_FILE), index=False)
+        write_tiny_models(num_users, num_articles, *(os.path.join(path, name) for name in MODEL_FILES), seed=seed)
+    return path
+
+
+def seed_firestore(db, num_articles, num_users, density, seed=0):
+    frame = synthetic_frame(num_articles, seed)
+    # add_to_favorite checks the articles collection, not the local catalog
+    for article in frame.to_dict(orient='records'):
+        db.collection('articles').document(str(article['article_id'])).set(article)
+    populate(db, synthetic_users(num_users, seed), synthetic_ratings(num_users, frame['article_id'].to_numpy(), density, seed))
+
+
+# Attribute each request's fake Firestore reads and writes to its endpoint
+def count_firestore_ops(app, db):
+    from flask import jsonify, request
+
+    lock = threading.Lock()
+    ops = {}
+
+    @app.before_request
+    def reset_counts():
+        db.thread_counts()
+
+    @app.after_request
+    def record_counts(response):
+        reads, writes = db.thread_counts()
+        with lock:
+            route = ops.setdefault(str(request.url_rule) if request.url_rule else request.path, [0, 0, 0])
+            route[0] += 1
+            route[1] += reads
+            route[2] += writes
+        return response
+
+    @app.route("/loadtest/firestore-ops", methods=["GET"])
+    def get_firestore_ops():
+        with lock:
+            return jsonify({route: {'requests': n, 'reads': reads, 'writes': writes} for route, (n, reads, writes) in ops.items()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve app.py on synthetic data for the load test')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--articles', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--density', type=float, default=0.005)
+    parser.add_argument('--seed-db', action='store_true', help='seed the Firestore emulator')
+    args = parser.parse_args()
+
+    os.environ['MODEL_BACKEND'] = 'numpy'
+    os.environ['STARTUP_BLOCKING'] = '1'
+    db = None
+    if os.getenv('FIRESTORE_EMULATOR_HOST'):
+        import firebase  # reads ./serviceaccount.json from the repository root
+        if args.seed_db:
+            seed_firestore(firebase.db, args.articles, args.users, args.density)
+    else:
+        db = FakeFirestore()
+        seed_firestore(db, args.articles, args.users, args.density)
+        sys.modules['firebase'] = types.SimpleNamespace(db=db, async_client=lambda: FakeAsyncFirestore(db))
+
+    os.chdir(dataset_dir(args.articles, args.users))
+    from app import app
+    if db is not None:
+        count_firestore_ops(app, db)
+    app.run(host='127.0.0.1', port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Synthetic catalog, users, ratings and models for running the engines offline.
+# Everything is seeded, so the same parameters always give the same data.
+import json
+import numpy as np
+
+from benchmarks.bench_catalog_memory import synthetic_frame
+from benchmarks.bench_search import WORDS
+from numpy_models import NumpyModel
+
+
+# Ratings of num_users users over the articles with the given ids: density * users * articles
+# distinct (user, article) pairs with ratings 1-5. Article popularity follows a Zipf-like
+# curve, like real citation-driven traffic. Returns a list of (user_id, article_id, rating).
+def synthetic_ratings(num_users, article_ids, density, seed=0):
+    rng = np.random.default_rng(seed)
+    article_ids = np.asarray(article_ids)
+    count = min(int(round(density * num_users * len(article_ids))), num_users * len(article_ids))
+    popularity = 1.0 / np.arange(1, len(article_ids) + 1) ** 0.8
+    popularity = rng.permutation(popularity / popularity.sum())
+    pairs = set()
+    while len(pairs) < count:
+        users = rng.integers(0, num_users, count - len(pairs))
+        articles = rng.choice(len(article_ids), count - len(pairs), p=popularity)
+        pairs.update(zip(users.tolist(), articles.tolist()))
+    pairs = sorted(pairs)
+    ratings = rng.integers(1, 6, len(pairs))
+    return [(f"user{user}", article_ids[article].item(), int(rating)) for (user, article), rating in zip(pairs, ratings)]
+
+
+# User documents shaped like the ones /subject_area and /auth/google write
+def synthetic_users(num_users, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        f"user{i}": {
+            'user_id': f"user{i}",
+            'subject_area': WORDS[rng.integers(len(WORDS))],
+            'email': f"user{i}@example.com",
+            'name': f"User {i}",
+            'rated_articles': [],
+            'favorite_articles': [],
+        }
+        for i in range(num_users)
+    }
+
+
+# Write users and ratings into a Firestore client (fake_firestore.FakeFirestore offline)
+def populate(db, users, ratings):
+    for user_id, user in users.items():
+        db.collection('users').document(user_id).set(user)
+    for user_id, article_id, rating in ratings:
+        db.collection('ratings').document(f"{user_id}_{article_id}").set({
+            'user_id': user_id,
+            'article_id': article_id,
+            'article_rating': rating,
+        })
+
+
+def _layer(name, class_name, inbound, config=None, weights=()):
+    return {'name': name, 'class_name': class_name, 'config': config or {}, 'inbound': inbound,
+            'num_weights': len(weights)}, {f"{name}/{i}": weight for i, weight in enumerate(weights)}
+
+
+# (architecture, weights) in the format export_models.py writes
+def _model(layers, inputs, outputs, input_shapes):
+    weights = {}
+    specs = []
+    for spec, layer_weights in layers:
+        specs.append(spec)
+        weights.update(layer_weights)
+    return {'layers': specs, 'inputs': inputs, 'outputs': outputs, 'input_shapes': input_shapes}, weights
+
+
+# Randomly initialized stand-ins for the two Keras models, with the same inputs and outputs:
+# the content model maps a user's ratings over the catalog to a score per article, and the
+# collaborative model maps (user index, article index) pairs to a rating in [0, 1] through
+# the user_embedding/article_embedding -> Dense(relu) -> Dense(sigmoid) graph that
+# collaborative_scorer.CollaborativeScorer expects. Returns (architecture, weights) per model.
+def tiny_model_exports(num_users, num_articles, hidden=32, embedding_dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def weights(*shape):
+        return (rng.standard_normal(shape) * 0.1).astype(np.float32)
+
+    content = _model([
+        _layer('input', 'InputLayer', []),
+        _layer('hidden', 'Dense', ['input'], {'activation': 'relu'}, [weights(num_articles, hidden), weights(hidden)]),
+        _layer('output', 'Dense', ['hidden'], {'activation': 'sigmoid'}, [weights(hidden, num_articles), weights(num_articles)]),
+    ], ['input'], ['output'], [[None, num_articles]])
+    collaborative = _model([
+        _layer('user', 'InputLayer', []),
+        _layer('article', 'InputLayer', []),
+        _layer('user_embedding', 'Embedding', ['user'], weights=[weights(num_users, embedding_dim)]),
+        _layer('article_embedding', 'Embedding', ['article'], weights=[weights(num_articles, embedding_dim)]),
+        _layer('user_flatten', 'Flatten', ['user_embedding']),
+        _layer('article_flatten', 'Flatten', ['article_embedding']),
+        _layer('concatenate', 'Concatenate', ['user_flatten', 'article_flatten']),
+        _layer('hidden', 'Dense', ['concatenate'], {'activation': 'relu'}, [weights(2 * embedding_dim, hidden), weights(hidden)]),
+        _layer('output', 'Dense', ['hidden'], {'activation': 'sigmoid'}, [weights(hidden, 1), weights(1)]),
+    ], ['user', 'article'], ['output'], [[None, 1], [None, 1]])
+    return content, collaborative
+
+
+
+def tiny_models(num_users, num_articles, **kwargs):
+    return tuple(NumpyModel(architecture, weights) for architecture, weights in tiny_model_exports(num_users, num_articles, **kwargs))
+
+
+# Write the tiny models as .npz files that MODEL_BACKEND=numpy loads
+def write_tiny_models(num_users, num_articles, content_path, collaborative_path, **kwargs):
+    for path, (architecture, weights) in zip((content_path, collaborative_path), tiny_model_exports(num_users, num_articles, **kwargs)):
+        np.savez(path, architecture=np.array(json.dumps(architecture)), **weights)
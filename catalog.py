@@ -0,0 +1,256 @@
+import sys
+import threading
+import numpy as np
+import pandas as pd
+
+from shared_store import StringColumn, encode_strings
+from fast_json import dumps
+
+
+# Low-cardinality string column stored as integer codes into a list of categories
+class CategoricalColumn:
+    def __init__(self, values):
+        categorical = pd.Categorical(values)
+        self.codes = categorical.codes.astype(np.int32)
+        self.categories = np.array([sys.intern(value) if isinstance(value, str) else value
+                                    for value in categorical.categories], dtype=object)
+
+    def __getitem__(self, position):
+        code = self.codes[position]
+        return self.categories[code] if code >= 0 else float('nan')
+
+    def decode(self):
+        values = self.categories[np.maximum(self.codes, 0)] if len(self.categories) else \
+            np.empty(len(self.codes), dtype=object)
+        values[self.codes < 0] = float('nan')
+        return values
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + sum(sys.getsizeof(value) for value in self.categories)
+
+
+# article_id -> first position for numeric ids, by binary search over the ids in sorted order
+class SortedIdIndex:
+    def __init__(self, ids, order):
+        self.order = order
+        self.sorted_ids = ids[order]
+
+    @classmethod
+    def build(cls, ids):
+        return cls(ids, np.argsort(ids, kind='stable'))
+
+    def get(self, article_id, default=None):
+        if isinstance(article_id, (bool, np.bool_)) or not isinstance(article_id, (int, np.integer)):
+            return default
+        i = np.searchsorted(self.sorted_ids, article_id)
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == article_id:
+            return int(self.order[i])
+        return default
+
+
+# Column-oriented article catalog.
+# Numeric columns are typed NumPy arrays, repetitive strings are categorical and the rest are
+# interned strings; rows are only materialized as dicts when building a response.
+# load_frame / load_store swap the contents in place, so modules holding a reference see the
+# new catalog. Loaded from the shared store, the columns are views into the mapped file.
+# Rows served as JSON are encoded once per projection and kept as fragments until the next
+# load, so article lists are built by concatenating bytes. The fragments belong to the state
+# they were encoded from and are swapped with it, so a request that read the old catalog can
+# never store its fragment in the new one's cache.
+class ArticleCatalog:
+    # String columns with fewer distinct values than this share of rows are stored as categorical
+    CATEGORICAL_RATIO = 0.5
+    # Distinct fields= projections whose fragments are kept at once
+    MAX_PROJECTIONS = 16
+
+    def __init__(self, fragment_cache_size=50000):
+        # (column names, columns, article_id -> position, size,
+        #  fragments: projection (tuple of names or None) -> {position: JSON bytes})
+        self._state = ([], {}, {}, 0, {})
+        self.fragment_cache_size = fragment_cache_size
+        self._fragments_lock = threading.Lock()
+
+    def load_frame(self, df):
+        columns = {}
+        for name in df.columns:
+            series = df[name]
+            if series.dtype != object:
+                columns[name] = series.to_numpy()
+            elif series.nunique(dropna=True) < self.CATEGORICAL_RATIO * len(series):
+                columns[name] = CategoricalColumn(series.to_numpy())
+            else:
+                columns[name] = np.array([sys.intern(value) if isinstance(value, str) else value
+                                          for value in series.to_numpy()], dtype=object)
+        self._state = (list(df.columns), columns, self._build_positions(columns), len(df), {})
+
+    @classmethod
+    def _build_positions(cls, columns):
+        if 'article_id' not in columns:
+            return {}
+        ids = cls._values(columns['article_id'])
+        if ids.dtype.kind in 'iu':
+            return SortedIdIndex.build(ids)
+        positions = {}
+        for position, article_id in enumerate(ids):
+            positions.setdefault(article_id, position)
+        return positions
+
+    # Arrays and metadata describing the catalog, for shared_store.write_store
+    def to_store(self, prefix='catalog'):
+        names, columns, positions, size, _ = self._state
+        arrays = {}
+        kinds = {}
+        for name in names:
+            column = columns[name]
+            if isinstance(column, CategoricalColumn):
+                kinds[name] = 'categorical'
+                arrays[f"{prefix}/{name}/codes"] = column.codes
+                column = column.categories
+                name = f"{name}/categories"
+            elif isinstance(column, StringColumn) or column.dtype == object:
+                kinds[name] = 'string'
+            else:
+                kinds[name] = 'numeric'
+                arrays[f"{prefix}/{name}"] = column
+                continue
+            for part, array in encode_strings(self._values(column)).items():
+                arrays[f"{prefix}/{name}/{part}"] = array
+        if isinstance(positions, SortedIdIndex):
+            arrays[f"{prefix}/@id_order"] = positions.order
+        return arrays, {'names': names, 'kinds': kinds, 'size': size}
+
+    # Use the columns of a mapped shared store (see to_store)
+    def load_store(self, store, prefix='catalog'):
+        metadata = store.metadata[prefix]
+        columns = {}
+        for name in metadata['names']:
+            kind = metadata['kinds'][name]
+            if kind == 'numeric':
+                columns[name] = store[f"{prefix}/{name}"]
+            elif kind == 'string':
+                columns[name] = store.strings(f"{prefix}/{name}")
+            else:
+                column = CategoricalColumn.__new__(CategoricalColumn)
+                column.codes = store[f"{prefix}/{name}/codes"]
+                column.categories = store.strings(f"{prefix}/{name}/categories").decode()
+                columns[name] = column
+        if f"{prefix}/@id_order" in store:
+            positions = SortedIdIndex(self._values(columns['article_id']), store[f"{prefix}/@id_order"])
+        else:
+            positions = self._build_positions(columns)
+        self._state = (metadata['names'], columns, positions, metadata['size'], {})
+
+    @staticmethod
+    def _values(column):
+        if isinstance(column, (CategoricalColumn, StringColumn)):
+            return column.decode()
+        return column
+
+    def __len__(self):
+        return self._state[3]
+
+    @property
+    def names(self):
+        return self._state[0]
+
+    # Position of an article, or None. Route parameters arrive as strings while
+    # the CSV ids are integers, so both are tried.
+    def position(self, article_id):
+        positions = self._state[2]
+        position = positions.get(article_id)
+        if position is None and isinstance(article_id, str) and article_id.lstrip('-').isdigit():
+            position = positions.get(int(article_id))
+        return position
+
+    # Values of a column as an array (decoded for string columns), for all rows or just `positions`
+    def column(self, name, positions=None):
+        columns = self._state[1]
+        if name not in columns:
+            return np.full(len(self) if positions is None else len(positions), None, dtype=object)
+        column = columns[name]
+        if positions is None:
+            return self._values(column)
+        if isinstance(column, StringColumn):
+            return column.take(positions)
+        if isinstance(column, CategoricalColumn):
+            return np.array([column[position] for position in positions], dtype=object)
+        return column[np.asarray(positions, dtype=np.int64)]
+
+    # Positions (ascending) of every row whose article_id is in article_ids
+    def positions_of(self, article_ids):
+        return np.flatnonzero(np.isin(self.column('article_id'), np.asarray(article_ids)))
+
+    # Positions sorted by a numeric column (stable, missing values last)
+    def sort_positions(self, positions, name, descending=False):
+        positions = np.asarray(positions, dtype=np.int64)
+        keys = pd.to_numeric(pd.Series(self.column(name, positions)), errors='coerce').to_numpy(dtype=float)
+        keys = np.where(np.isnan(keys), np.inf, -keys if descending else keys)
+        return positions[np.argsort(keys, kind='stable')]
+
+    # One row as a dict, with every column or only `fields`
+    def row(self, position, fields=None):
+        return self._row(self._state, position, fields)
+
+    @staticmethod
+    def _row(state, position, fields):
+        names, columns = state[:2]
+        row = {}
+        for name in names if fields is None else fields:
+            value = columns[name][position]
+            row[name] = value.item() if isinstance(value, np.generic) else value
+        return row
+
+    def rows(self, positions):
+        return [self.row(position) for position in positions]
+
+    # One row as JSON bytes (missing values as null), from the fragment cache.
+    # `fields` is a sorted tuple of column names, or None for every column.
+    def row_json(self, position, fields=None):
+        return self._row_json(self._state, position, fields)
+
+    def _row_json(self, state, position, fields):
+        position = int(position)
+        projections = state[4]
+        fragment = projections.get(fields, {}).get(position)
+        if fragment is None:
+            row = self._row(state, position, fields)
+            fragment = dumps({name: None if value != value else value for name, value in row.items()})
+            with self._fragments_lock:
+                fragments = projections.get(fields)
+                if fragments is None:
+                    if len(projections) >= self.MAX_PROJECTIONS:
+                        projections.clear()
+                    fragments = projections[fields] = {}
+                # Dropping a full projection is cheaper than tracking recency on every hit
+                if len(fragments) >= self.fragment_cache_size:
+                    fragments.clear()
+                fragments[position] = fragment
+        return fragment
+
+    # Rows as a JSON array, concatenated from the fragment cache of a single catalog state
+    def rows_json(self, positions, fields=None):
+        state = self._state
+        return b'[' + b','.join([self._row_json(state, position, fields) for position in positions]) + b']'
+
+    def __getitem__(self, position):
+        return self.row(position)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self.row(position)
+
+    # Approximate memory held by the columns, in bytes
+    @property
+    def nbytes(self):
+        total = 0
+        for column in self._state[1].values():
+            if isinstance(column, (CategoricalColumn, StringColumn)):
+                total += column.nbytes
+            elif column.dtype == object:
+                # Interned strings are shared, so count each object once
+                unique = {id(value): value for value in column}
+                total += column.nbytes + sum(sys.getsizeof(value) for value in unique.values())
+            else:
+                total += column.nbytes
+        return total
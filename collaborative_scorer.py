@@ -0,0 +1,80 @@
+import numpy as np
+
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+# NumPy scorer for the collaborative model.
+# The network is concat(user_embedding, article_embedding) -> Dense(relu) -> Dense(sigmoid).
+# The first Dense kernel is split into its user and article halves, so each side's
+# contribution is computed once at load time and a request only needs
+# relu(article_hidden[candidates] + user_hidden[user]) @ output_kernel.
+class CollaborativeScorer:
+    def __init__(self, user_embeddings, article_embeddings, hidden_kernel, hidden_bias, output_kernel, output_bias):
+        embedding_dim = user_embeddings.shape[1]
+        self.num_users = user_embeddings.shape[0]
+        self.num_articles = article_embeddings.shape[0]
+        self.user_hidden = (user_embeddings @ hidden_kernel[:embedding_dim]).astype(np.float32)
+        self.article_hidden = (article_embeddings @ hidden_kernel[embedding_dim:] + hidden_bias).astype(np.float32)
+        self.output_kernel = output_kernel.reshape(-1).astype(np.float32)
+        self.output_bias = float(np.asarray(output_bias).reshape(-1)[0])
+
+    # Build the scorer from a loaded Keras CollaborativeFilteringModel
+    @classmethod
+    def from_keras_model(cls, model):
+        dense_layers = [layer for layer in model.layers if layer.__class__.__name__ == 'Dense']
+        hidden_kernel, hidden_bias = dense_layers[0].get_weights()
+        output_kernel, output_bias = dense_layers[1].get_weights()
+        return cls(
+            model.get_layer('user_embedding').get_weights()[0],
+            model.get_layer('article_embedding').get_weights()[0],
+            hidden_kernel, hidden_bias, output_kernel, output_bias,
+        )
+
+    def to_store(self, prefix='scorer'):
+        arrays = {
+            f"{prefix}/user_hidden": self.user_hidden,
+            f"{prefix}/article_hidden": self.article_hidden,
+            f"{prefix}/output_kernel": self.output_kernel,
+        }
+        return arrays, {'output_bias': self.output_bias}
+
+    # Scorer whose precomputed matrices are views into a mapped shared store
+    @classmethod
+    def from_store(cls, store, prefix='scorer'):
+        scorer = cls.__new__(cls)
+        scorer.user_hidden = store[f"{prefix}/user_hidden"]
+        scorer.article_hidden = store[f"{prefix}/article_hidden"]
+        scorer.output_kernel = store[f"{prefix}/output_kernel"]
+        scorer.output_bias = store.metadata[prefix]['output_bias']
+        scorer.num_users = scorer.user_hidden.shape[0]
+        scorer.num_articles = scorer.article_hidden.shape[0]
+        return scorer
+
+    # Predicted ratings (same scale as model.predict) for one user over the given articles
+    def score(self, user_index, article_indices):
+        hidden = self.article_hidden[article_indices] + self.user_hidden[user_index]
+        return _sigmoid(_relu(hidden) @ self.output_kernel + self.output_bias)
+
+    # Positions into article_indices of the k best scored articles, best first
+    def top_k(self, user_index, article_indices, k):
+        scores = self.score(user_index, article_indices)
+        if k >= len(scores):
+            return np.argsort(scores)[::-1]
+        top = np.argpartition(scores, -k)[-k:]
+        return top[np.argsort(scores[top])[::-1]]
+
+    # Compare against model.predict on random (user, article) pairs; returns the max abs difference
+    def check_parity(self, model, num_samples=256, seed=0):
+        rng = np.random.default_rng(seed)
+        users = rng.integers(0, self.num_users, num_samples)
+        articles = rng.integers(0, self.num_articles, num_samples)
+        expected = model.predict([users, articles], verbose=0).flatten()
+        hidden = self.article_hidden[articles] + self.user_hidden[users]
+        actual = _sigmoid(_relu(hidden) @ self.output_kernel + self.output_bias)
+        return float(np.max(np.abs(expected - actual)))
@@ -2,43 +2,95 @@ import csv
 from flask import Blueprint,request, jsonify
 from app import app
 from middleware import token_required
-import uuid
 from firebase import db
-from load_articles import ARTICLES
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+import load_articles
+from load_articles import get_articles_by_ids, get_article_items_by_ids, find_article_position, parse_fields, articles_json
+from load_ratings import RATINGS
+from rating_queue import RATING_QUEUE, QueueFull
+from recommendation_cache import RECOMMENDATION_CACHE
+from search_index import encode_cursor, decode_cursor
+from metrics import span
+from fast_json import json_response, dumps_object
+from etags import catalog_etag, user_articles_etag, not_modified, tagged, CATALOG_CACHE_CONTROL, USER_CACHE_CONTROL
+
+# Function to read the fields= projection of the request (e.g. fields=article_id,title,year,cited_by
+# for a list view); returns (fields or None, error response or None)
+def requested_fields():
+    try:
+        return parse_fields(request.args.get('fields')), None
+    except ValueError as e:
+        return None, (jsonify({"error": str(e)}), 400)
+
+# The functions below parse and validate the requests of the favorite and rating views, and
+# build their writes and responses. The async views in controller_async.py use them too, so
+# both modes only differ in how they read and write Firestore.
+
+# Function to read a favorite add request; returns (article_id, user_id, error response or None)
+def add_favorite_request():
+    data = request.get_json()
+    article_id = data.get('article_id')
+    user_id = data.get('user_id')
+    if not article_id or not user_id:
+        return None, None, (jsonify({"error": "Provide rating, article_id, and user_id!"}), 400)
+    return article_id, user_id, None
+
+# Function to read a favorite remove request; returns (article_id, user_id, error response or None)
+def remove_favorite_request():
+    data = request.get_json()
+    article_id = data.get('article_id')
+    user_id = data.get('user_id')
+    if not article_id or not user_id:
+        return None, None, (jsonify({"error": "Provide article_id and user_id!"}), 400)
+    return article_id, user_id, None
+
+# Function to build the user update adding a favorite from the article and user documents;
+# returns (update or None, error response or None)
+def favorite_add_update(article_doc, user_doc, article_id):
+    if not article_doc.exists:
+        return None, (jsonify({"error": "Article not found"}), 404)
+    if not user_doc.exists:
+        return None, (jsonify({"error": "User not found"}), 404)
+    favorite_articles = user_doc.to_dict().get("favorite_articles", [])
+    if article_id in favorite_articles:
+        return None, (jsonify({"message": "Article already in the favorites"}), 409)
+    favorite_articles.append(article_id)
+    return {"favorite_articles": favorite_articles, "articles_version": firestore.Increment(1)}, None
+
+# Function to build the user update removing a favorite; returns (update or None, error response or None)
+def favorite_remove_update(user_doc, article_id):
+    if not user_doc.exists:
+        return None, (jsonify({"error": "User not found"}), 404)
+    favorite_articles = user_doc.to_dict().get("favorite_articles", [])
+    if article_id not in favorite_articles:
+        return None, (jsonify({"message": "Article not found in the favorite list"}), 404)
+    favorite_articles.remove(article_id)
+    return {"favorite_articles": favorite_articles, "articles_version": firestore.Increment(1)}, None
+
+# Function to answer a written favorite change
+def favorite_changed(user_id, added):
+    RECOMMENDATION_CACHE.invalidate_user(user_id)
+    if added:
+        return jsonify({"message": "Added to favorites successfully"}), 201
+    return jsonify({"message": "Removed from favorites successfully"}), 200
 
 # add favorite (one article)
 @app.route("/articles/favorite",methods=["POST"])
 @token_required
 def add_to_favorite():
     try:
-        data = request.get_json()
-        article_id = data.get('article_id')
-        user_id = data.get('user_id')
+        article_id, user_id, error = add_favorite_request()
+        if error is not None:
+            return error
 
-        if not article_id or not user_id:
-            return jsonify({"error": "Provide rating, article_id, and user_id!"}), 400
-        
-        # Check if the article exists
-        article_ref = db.collection("articles").document(article_id).get()
-        if not article_ref.exists:
-            return jsonify({"error": "Article not found"}), 404
-        # Check if the user exists
-        user_ref = db.collection("users").document(user_id).get()
-        if not user_ref.exists:
-            return jsonify({"error": "User not found"}), 404
-        
-        # Update user's document in the "users" collection "favorite_articles" field
+        # Check the article and the user, and add to the user's favorite_articles
         user_ref = db.collection("users").document(user_id)
-        user_data = user_ref.get().to_dict()
-        favorite_articles = user_data.get("favorite_articles", [])
-        if article_id in favorite_articles:
-            return jsonify({"message": "Article already in the favorites"}), 409
-        favorite_articles.append(article_id)
-        user_ref.update({
-            "favorite_articles": favorite_articles,
-        })
-
-        return jsonify({"message": "Added to favorites successfully"}), 201
+        update, error = favorite_add_update(db.collection("articles").document(article_id).get(), user_ref.get(), article_id)
+        if error is not None:
+            return error
+        user_ref.update(update)
+        return favorite_changed(user_id, added=True)
 
     except Exception as e:
         print(f"Error internal: {e}")
@@ -49,117 +101,209 @@ def add_to_favorite():
 @token_required
 def remove_from_favorite():
     try:
-        data = request.get_json()
-        article_id = data.get('article_id')
-        user_id = data.get('user_id')
-
-        if not article_id or not user_id:
-            return jsonify({"error": "Provide article_id and user_id!"}), 400
-
-        # Check if the user exists
-        user_ref = db.collection("users").document(user_id).get()
-        if not user_ref.exists:
-            return jsonify({"error": "User not found"}), 404
-
-        # Update the user's favorite_articles list
-        user_data = user_ref.to_dict()
-        favorite_articles = user_data.get("favorite_articles", [])
-        if article_id in favorite_articles:
-            favorite_articles.remove(article_id)
-            db.collection("users").document(user_id).update({
-                "favorite_articles": favorite_articles
-            })
-            return jsonify({"message": "Removed from favorites successfully"}), 200
-        else:
-            return jsonify({"message": "Article not found in the favorite list"}), 404
+        article_id, user_id, error = remove_favorite_request()
+        if error is not None:
+            return error
+
+        # Check the user and remove from the user's favorite_articles
+        user_ref = db.collection("users").document(user_id)
+        update, error = favorite_remove_update(user_ref.get(), article_id)
+        if error is not None:
+            return error
+        user_ref.update(update)
+        return favorite_changed(user_id, added=False)
 
     except Exception as e:
         print(f"Error during rating deletion: {e}")
         return jsonify({"error": "Internal Server Error"}), 500
 
+# Function to check the user document of an article list request and answer what needs no
+# article reads: 404, 304 or an empty list. Returns (article ids, etag, response or None).
+def user_articles_lookup(user_id, field, doc):
+    if not doc.exists:
+        return None, None, ("User does not exist!", 404)
+    user = doc.to_dict()
+    # The list only changes when the user writes to it (or the catalog reloads)
+    etag = user_articles_etag(user_id, field, user)
+    response = not_modified(etag, USER_CACHE_CONTROL)
+    if response is not None:
+        return None, etag, response
+    articles_ids = user.get(field, [])
+    if not articles_ids:
+        return None, etag, (tagged(jsonify([]), etag, USER_CACHE_CONTROL), 200)
+    return articles_ids, etag, None
+
+# Function to answer an article list request with the articles (catalog positions or dicts)
+def user_articles_response(articles, fields, etag):
+    with span('serialize'):
+        return tagged(json_response(articles_json(articles, fields)), etag, USER_CACHE_CONTROL), 200
+
+# Function to list the articles whose ids are stored in a field of the user's document
+def get_user_articles(user_id, field):
+    if not user_id:
+        return "User ID must be provided and cannot be undefined", 400
+    fields, error = requested_fields()
+    if error is not None:
+        return error
+    articles_ids, etag, response = user_articles_lookup(user_id, field, db.collection("users").document(user_id).get())
+    if response is not None:
+        return response
+    # Fetch all articles in articles_ids from the local catalog
+    return user_articles_response(get_article_items_by_ids(articles_ids), fields, etag)
+
 # get all articles favorited by user_id
 @app.route("/articles/favorite/<user_id>",methods=["GET"])
 @token_required
 def get_favorite_articles(user_id):
     try:
-        if not user_id:
-            return "User ID must be provided and cannot be undefined", 400
-        
-        # Fetch user document
-        doc_ref = db.collection("users").document(user_id)
-        doc = doc_ref.get()
-        articles_ids = []
-        if doc.exists:
-            articles_ids = doc.to_dict().get("favorite_articles", [])
-        else:
-            return "User does not exist!", 404
-        
-        if not articles_ids:
-            return jsonify([]), 200
-        
-        # Fetch all articles in articles_ids
-        articles_ref = db.collection("articles")
-        articles = []
-        for article_id in articles_ids:
-            article_doc = articles_ref.document(article_id).get()
-            if article_doc.exists:
-                articles.append(article_doc.to_dict())
-        
-        return jsonify(articles), 200
+        return get_user_articles(user_id, "favorite_articles")
 
     except Exception as e:
         print(f"Error fetching favorited articles: {e}")
         return "Internal Server Error", 500
     
+# Function to query Firestore for a user's rating of an article
+def rating_query(client, user_id, article_id):
+    return client.collection("ratings").where("user_id", "==", user_id).where("article_id", "==", article_id)
+
+# Function to get the id of the user's existing rating document for an article, or None.
+# Until the ratings store has loaded, a miss there proves nothing, so Firestore is asked.
+def find_rating_doc_id(user_id, article_id):
+    if RATINGS.ratings_loaded():
+        return RATINGS.find_rating_id(user_id, article_id)
+    return min((doc.id for doc in rating_query(db, user_id, article_id).get()), default=None)
+
+# Function to get the rating document id for (user, article).
+# Ratings written before ids were deterministic keep their original random id.
+def rating_doc_id(user_id, article_id):
+    return find_rating_doc_id(user_id, article_id) or f"{user_id}_{article_id}"
+
+# Function to check that a user exists through the users listener's store. A miss is confirmed
+# with Firestore: the store is empty until it loads and lags users other workers just created.
+def user_exists(user_id):
+    if RATINGS.get_user(user_id) is not None:
+        return True
+    return db.collection("users").document(user_id).get().exists
+
+# Function to read a rating request; returns (article_id, user_id, rating, error response or None)
+def submit_rating_request():
+    data = request.get_json()
+    rating = data.get('article_rating')
+    article_id = data.get('article_id')
+    user_id = data.get('user_id')
+    if not rating or not article_id or not user_id:
+        return None, None, None, (jsonify({"error": "Provide rating, article_id, and user_id!"}), 400)
+    # Check if the article exists in the local catalog
+    if find_article_position(article_id) is None:
+        return None, None, None, (jsonify({"error": "Article not found"}), 404)
+    return article_id, user_id, int(rating), None
+
+# Function to read a rating delete request; returns (article_id, user_id, error response or None)
+def delete_rating_request():
+    data = request.get_json()
+    article_id = data.get('article_id')
+    user_id = data.get('user_id')
+    if not article_id or not user_id:
+        return None, None, (jsonify({"error": "Provide article_id and user_id!"}), 400)
+    return article_id, user_id, None
+
+# Function to add the writes of a rating to a batch of `client`: the rating document and the
+# user's rated_articles, so the batch fails as a whole if the user does not exist
+def add_rating_writes(batch, client, rating_id, user_id, article_id, rating):
+    batch.set(client.collection("ratings").document(rating_id), {
+        "article_id": article_id,
+        "user_id": user_id,
+        "article_rating": rating,
+    })
+    batch.update(client.collection("users").document(user_id), {
+        "rated_articles": firestore.ArrayUnion([article_id]),
+        "articles_version": firestore.Increment(1),
+    })
+
+# Function to check the user and rating documents of a rating delete; returns an error response or None
+def rating_delete_error(user_doc, rating_doc, article_id):
+    if user_doc is None or not user_doc.exists:
+        return jsonify({"error": "User not found"}), 404
+    if rating_doc is None or not rating_doc.exists:
+        return jsonify({"error": "Rating not found"}), 404
+    if article_id not in user_doc.to_dict().get("rated_articles", []):
+        return jsonify({"message": "Article not found in the rating list"}), 404
+    return None
+
+# Function to add the writes of a rating delete to a batch: the user's rated_articles and the rating
+def add_rating_delete_writes(batch, user_ref, rating_ref, article_id):
+    batch.update(user_ref, {
+        "rated_articles": firestore.ArrayRemove([article_id]),
+        "articles_version": firestore.Increment(1),
+    })
+    batch.delete(rating_ref)
+
+# Function to answer a rating request for a user that does not exist
+def rating_user_not_found():
+    return jsonify({"error": "User not found"}), 404
+
+# Function to answer a written (or queued) rating change
+def rating_changed(user_id, submitted):
+    RECOMMENDATION_CACHE.invalidate_user(user_id)
+    if submitted:
+        return jsonify({"message": "Rating submitted successfully"}), 201
+    return jsonify({"message": "Rating deleted successfully"}), 200
+
+# Function to queue a validated rating in write-behind mode (RATING_QUEUE set) and acknowledge
+# once the write is logged; user_found comes from user_exists
+def queue_rating(user_id, article_id, rating, rating_id, user_found):
+    if not user_found:
+        return rating_user_not_found()
+    try:
+        RATING_QUEUE.submit({
+            "op": "set",
+            "rating_id": rating_id,
+            "article_id": article_id,
+            "user_id": user_id,
+            "article_rating": rating,
+        })
+    except QueueFull as e:
+        return jsonify({"error": f"{e}, try again later"}), 503
+    return rating_changed(user_id, submitted=True)
+
+# Function to queue a rating delete in write-behind mode; rating_id is None if there is none.
+# The ratings store already reflects queued writes.
+def queue_rating_delete(user_id, article_id, rating_id, user_found):
+    if not user_found:
+        return rating_user_not_found()
+    if rating_id is None:
+        return jsonify({"error": "Rating not found"}), 404
+    try:
+        RATING_QUEUE.submit({
+            "op": "delete",
+            "rating_id": rating_id,
+            "article_id": article_id,
+            "user_id": user_id,
+        })
+    except QueueFull as e:
+        return jsonify({"error": f"{e}, try again later"}), 503
+    return rating_changed(user_id, submitted=False)
+
 # give rating (one article)
 @app.route("/articles/rating",methods=["POST"])
 @token_required
 def submit_rating():
     try:
-        data = request.get_json()
-        rating = data.get('article_rating')
-        article_id = data.get('article_id')
-        user_id = data.get('user_id')
-
-        if not rating or not article_id or not user_id:
-            return jsonify({"error": "Provide rating, article_id, and user_id!"}), 400
-        
-        # Check if the article exists
-        article_ref = db.collection("articles").document(article_id).get()
-        if not article_ref.exists:
-            return jsonify({"error": "Article not found"}), 404
-        # Check if the user exists
-        user_ref = db.collection("users").document(user_id).get()
-        if not user_ref.exists:
-            return jsonify({"error": "User not found"}), 404
-        
-        # check if user doc has email in it, if no, return 403
-        
-        # Check if the user has already rated the article
-        user_ratings_ref = db.collection("ratings").where("user_id", "==", user_id).where("article_id", "==", article_id).get()
-        if user_ratings_ref:
-            # If the user has already rated the article, update the existing rating
-            rating_id = user_ratings_ref[0].id
-            db.collection("ratings").document(rating_id).update({
-                "article_rating": int(rating),
-            })
-        else:
-            rating_id = str(uuid.uuid1())
-            db.collection("ratings").document(rating_id).set({
-                "article_id": article_id,
-                "user_id": user_id,
-                "article_rating": int(rating),
-            })
-            # Update or create user's document in the "users" collection
-            user_ref = db.collection("users").document(user_id)
-            user_data = user_ref.get().to_dict()
-            rated_articles = user_data.get("rated_articles", [])
-            rated_articles.append(article_id)
-            user_ref.update({
-                "rated_articles": rated_articles,
-            })
-
-        return jsonify({"message": "Rating submitted successfully"}), 201
+        article_id, user_id, rating, error = submit_rating_request()
+        if error is not None:
+            return error
+
+        if RATING_QUEUE is not None:
+            return queue_rating(user_id, article_id, rating, rating_doc_id(user_id, article_id), user_exists(user_id))
+
+        # Write the rating and add it to the user's rated_articles in one atomic batch
+        batch = db.batch()
+        add_rating_writes(batch, db, rating_doc_id(user_id, article_id), user_id, article_id, rating)
+        try:
+            batch.commit()
+        except NotFound:
+            return rating_user_not_found()
+        return rating_changed(user_id, submitted=True)
 
     except Exception as e:
         print(f"Error internal: {e}")
@@ -170,43 +314,26 @@ def submit_rating():
 @token_required
 def delete_rating():
     try:
-        data = request.get_json()
-        article_id = data.get('article_id')
-        user_id = data.get('user_id')
-
-        if not article_id or not user_id:
-            return jsonify({"error": "Provide article_id and user_id!"}), 400
-
-        # Check if the user exists
-        user_ref = db.collection("users").document(user_id).get()
-        if not user_ref.exists:
-            return jsonify({"error": "User not found"}), 404
-
-        # Check if the rating exists
-        ratings_ref = db.collection("ratings").where("user_id", "==", user_id).where("article_id", "==", article_id).stream()
-        rating_doc = None
-        for doc in ratings_ref:
-            rating_doc = doc
-            break
-        
-        if not rating_doc:
-            return jsonify({"error": "Rating not found"}), 404
+        article_id, user_id, error = delete_rating_request()
+        if error is not None:
+            return error
 
-        
+        if RATING_QUEUE is not None:
+            return queue_rating_delete(user_id, article_id, find_rating_doc_id(user_id, article_id), user_exists(user_id))
 
-        # Update the user's rated_articles array
-        user_data = user_ref.to_dict()
-        rated_articles = user_data.get("rated_articles", [])
-        if article_id in rated_articles:
-            rated_articles.remove(article_id)
-            db.collection("users").document(user_id).update({
-                "rated_articles": rated_articles
-            })
-            # Delete the rating document
-            db.collection("ratings").document(rating_doc.id).delete()
-            return jsonify({"message": "Rating deleted successfully"}), 200
-        else:
-            return jsonify({"message": "Article not found in the rating list"}), 404
+        # Read the user and the rating in one round trip
+        user_ref = db.collection("users").document(user_id)
+        rating_ref = db.collection("ratings").document(rating_doc_id(user_id, article_id))
+        docs = {doc.reference.path: doc for doc in db.get_all([user_ref, rating_ref])}
+        error = rating_delete_error(docs.get(user_ref.path), docs.get(rating_ref.path), article_id)
+        if error is not None:
+            return error
+
+        # Remove from the user's rated_articles and delete the rating in one atomic batch
+        batch = db.batch()
+        add_rating_delete_writes(batch, user_ref, rating_ref, article_id)
+        batch.commit()
+        return rating_changed(user_id, submitted=False)
 
     except Exception as e:
         print(f"Error during rating deletion: {e}")
@@ -217,30 +344,7 @@ def delete_rating():
 @token_required
 def get_rated_articles(user_id):
     try:
-        if not user_id:
-            return "User ID must be provided and cannot be undefined", 400
-        
-        # Fetch user document
-        doc_ref = db.collection("users").document(user_id)
-        doc = doc_ref.get()
-        articles_ids = []
-        if doc.exists:
-            articles_ids = doc.to_dict().get("rated_articles", [])
-        else:
-            return "User does not exist!", 404
-        
-        if not articles_ids:
-            return jsonify([]), 200
-        
-        # Fetch all articles in articles_ids
-        articles_ref = db.collection("articles")
-        articles = []
-        for article_id in articles_ids:
-            article_doc = articles_ref.document(article_id).get()
-            if article_doc.exists:
-                articles.append(article_doc.to_dict())
-        
-        return jsonify(articles), 200
+        return get_user_articles(user_id, "rated_articles")
 
     except Exception as e:
         print(f"Error fetching rated articles: {e}")
@@ -254,11 +358,18 @@ def get_an_article(article_id):
     try:
         if not article_id:
             return "Article ID must be provided and cannot be undefined", 400
-        # print(article_id)
-        doc_ref = db.collection("articles").document(article_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            return jsonify(doc.to_dict()), 200
+        # Catalog articles only change with the catalog; ones read from Firestore are not tagged
+        etag = None
+        if find_article_position(article_id) is not None:
+            etag = catalog_etag()
+            response = not_modified(etag, CATALOG_CACHE_CONTROL)
+            if response is not None:
+                return response
+        articles = get_articles_by_ids([article_id])
+        if articles:
+            if etag is None:
+                return jsonify(articles[0]), 200
+            return tagged(jsonify(articles[0]), etag, CATALOG_CACHE_CONTROL), 200
         else:
             return "Article does not exist!", 404
 
@@ -269,45 +380,52 @@ def get_an_article(article_id):
 @token_required
 def search_articles():
     try:
+        # Results only change when the catalog reloads
+        etag = catalog_etag()
+        response = not_modified(etag, CATALOG_CACHE_CONTROL)
+        if response is not None:
+            return response
+
         query = request.args.get('query', '').lower()
         sort_by = request.args.get('sort_by', 'title').lower()
         filter_by_categories = request.args.getlist('categories')  # expecting list of categories
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
+        cursor = request.args.get('cursor')
+        fields, error = requested_fields()
+        if error is not None:
+            return error
+
+        # A cursor from a previous response resumes the walk where that page ended.
+        # It carries its sort key, which must match sort_by when that is given too.
+        after = 0
+        if cursor:
+            try:
+                cursor_sort_by, after = decode_cursor(cursor, load_articles.SORT_ORDERS)
+            except ValueError:
+                return jsonify({"error": "Invalid cursor"}), 400
+            requested_sort_by = sort_by if sort_by in load_articles.SORT_ORDERS.orders else 'title'
+            if 'sort_by' in request.args and requested_sort_by != cursor_sort_by:
+                return jsonify({"error": "Cursor does not match sort_by"}), 400
+            sort_by = cursor_sort_by
 
         # Convert filter_by_categories to lowercase for case insensitive matching
         filter_by_categories = [cat.lower() for cat in filter_by_categories]
 
-        # Search articles by title
-        filtered_articles = [article for article in ARTICLES if query in article.get('title', '').lower()]
-
-        # Filter by categories
-        if filter_by_categories:
-            filtered_articles = [
-                article for article in filtered_articles if any(
-                    cat in article.get('index_keywords', '').lower() for cat in filter_by_categories
-                )
-            ]
-
-        # Sort articles
-        if sort_by == 'year':
-            filtered_articles.sort(key=lambda x: int(x['year']), reverse=True)
-        elif sort_by == 'cited_by':
-            filtered_articles.sort(key=lambda x: int(x['cited_by']), reverse=True)
-        else:  # Default is to sort by title
-            filtered_articles.sort(key=lambda x: x['title'].lower())
-
-        # Pagination
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_articles = filtered_articles[start:end]
-
-        return jsonify({
-            'total_results': len(filtered_articles),
-            'page': page,
-            'per_page': per_page,
-            'articles': paginated_articles
-        }), 200
+        # Title match, category filter, sort and pagination over the catalog
+        start = 0 if cursor else (page - 1) * per_page
+        with span('search.match'):
+            positions, paginated_positions, sort_by, next_after = load_articles.search_catalog(
+                query, filter_by_categories, sort_by, start, per_page, after
+            )
+
+        with span('serialize'):
+            return tagged(json_response(dumps_object({
+                'total_results': len(positions),
+                'page': page,
+                'per_page': per_page,
+                'next_cursor': encode_cursor(sort_by, next_after) if next_after is not None else None
+            }, {'articles': articles_json(paginated_positions, fields)})), etag, CATALOG_CACHE_CONTROL), 200
 
     except Exception as e:
         print(f"Error during search articles: {e}")
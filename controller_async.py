@@ -0,0 +1,249 @@
+from flask import jsonify
+from google.api_core.exceptions import NotFound
+from app import app
+from middleware import token_required
+import firebase
+import controller_article
+import controller_auth
+import controller_ml_model
+from async_firestore import AsyncFirestore
+from controller_article import rating_query, requested_fields
+from load_ratings import RATINGS
+from load_articles import find_catalog_articles
+from rating_queue import RATING_QUEUE
+from metrics import span
+
+# FIRESTORE_MODE=async: the routes below replace their sync counterparts in
+# controller_article.py, controller_auth.py and controller_ml_model.py. They talk to Firestore
+# through the AsyncClient and issue independent reads concurrently. Request parsing, validation,
+# writes and responses come from the plain functions of those modules, so only the awaited
+# Firestore calls live here.
+FIRESTORE_ASYNC = AsyncFirestore(firebase.async_client)
+
+
+# Function to register an async handler in place of the sync view of the same endpoint
+def replaces(endpoint):
+    def register(f):
+        app.view_functions[endpoint] = f
+        return f
+    return register
+
+
+# Function to get the id of the user's existing rating document for an article, or None, like
+# controller_article.find_rating_doc_id but querying Firestore through the AsyncClient
+async def find_rating_doc_id(user_id, article_id):
+    if RATINGS.ratings_loaded():
+        return RATINGS.find_rating_id(user_id, article_id)
+    docs = await FIRESTORE_ASYNC.run(rating_query(FIRESTORE_ASYNC.client, user_id, article_id).get())
+    return min((doc.id for doc in docs), default=None)
+
+# Function to check that a user exists, like controller_article.user_exists
+async def user_exists(user_id):
+    if RATINGS.get_user(user_id) is not None:
+        return True
+    user_doc = await FIRESTORE_ASYNC.run(FIRESTORE_ASYNC.client.collection("users").document(user_id).get())
+    return user_doc.exists
+
+# Function to get the rating document id for (user, article), see controller_article.rating_doc_id
+async def rating_doc_id(user_id, article_id):
+    return await find_rating_doc_id(user_id, article_id) or f"{user_id}_{article_id}"
+
+
+# Function to get articles by id in the given order, as catalog positions or the article
+# dicts of the ones missing from the catalog, read from Firestore in one batched read
+async def get_article_items_by_ids(article_ids):
+    found, missing = find_catalog_articles(article_ids)
+    if missing:
+        article_refs = [FIRESTORE_ASYNC.client.collection('articles').document(article_id) for article_id in missing]
+        for doc in await FIRESTORE_ASYNC.get_all(article_refs):
+            if doc.exists:
+                found[doc.id] = doc.to_dict()
+    return [found[str(article_id)] for article_id in article_ids if str(article_id) in found]
+
+
+# add favorite (one article)
+@replaces('add_to_favorite')
+@token_required
+async def add_to_favorite():
+    try:
+        article_id, user_id, error = controller_article.add_favorite_request()
+        if error is not None:
+            return error
+
+        # Check the article and read the user concurrently
+        db = FIRESTORE_ASYNC.client
+        user_ref = db.collection("users").document(user_id)
+        article_doc, user_doc = await FIRESTORE_ASYNC.gather(
+            db.collection("articles").document(article_id).get(),
+            user_ref.get(),
+        )
+        update, error = controller_article.favorite_add_update(article_doc, user_doc, article_id)
+        if error is not None:
+            return error
+        await FIRESTORE_ASYNC.run(user_ref.update(update))
+        return controller_article.favorite_changed(user_id, added=True)
+
+    except Exception as e:
+        print(f"Error internal: {e}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+# delete favorite (one article)
+@replaces('remove_from_favorite')
+@token_required
+async def remove_from_favorite():
+    try:
+        article_id, user_id, error = controller_article.remove_favorite_request()
+        if error is not None:
+            return error
+
+        user_ref = FIRESTORE_ASYNC.client.collection("users").document(user_id)
+        update, error = controller_article.favorite_remove_update(await FIRESTORE_ASYNC.run(user_ref.get()), article_id)
+        if error is not None:
+            return error
+        await FIRESTORE_ASYNC.run(user_ref.update(update))
+        return controller_article.favorite_changed(user_id, added=False)
+
+    except Exception as e:
+        print(f"Error during rating deletion: {e}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+# Function to list the articles whose ids are stored in a field of the user's document
+async def get_user_articles(user_id, field):
+    if not user_id:
+        return "User ID must be provided and cannot be undefined", 400
+    fields, error = requested_fields()
+    if error is not None:
+        return error
+    doc = await FIRESTORE_ASYNC.run(FIRESTORE_ASYNC.client.collection("users").document(user_id).get())
+    articles_ids, etag, response = controller_article.user_articles_lookup(user_id, field, doc)
+    if response is not None:
+        return response
+    return controller_article.user_articles_response(await get_article_items_by_ids(articles_ids), fields, etag)
+
+# get all articles favorited by user_id
+@replaces('get_favorite_articles')
+@token_required
+async def get_favorite_articles(user_id):
+    try:
+        return await get_user_articles(user_id, "favorite_articles")
+
+    except Exception as e:
+        print(f"Error fetching favorited articles: {e}")
+        return "Internal Server Error", 500
+
+# give rating (one article)
+@replaces('submit_rating')
+@token_required
+async def submit_rating():
+    try:
+        article_id, user_id, rating, error = controller_article.submit_rating_request()
+        if error is not None:
+            return error
+
+        rating_id = await rating_doc_id(user_id, article_id)
+        if RATING_QUEUE is not None:
+            return controller_article.queue_rating(user_id, article_id, rating, rating_id, await user_exists(user_id))
+
+        # Write the rating and add it to the user's rated_articles in one atomic batch
+        db = FIRESTORE_ASYNC.client
+        batch = db.batch()
+        controller_article.add_rating_writes(batch, db, rating_id, user_id, article_id, rating)
+        try:
+            await FIRESTORE_ASYNC.run(batch.commit())
+        except NotFound:
+            return controller_article.rating_user_not_found()
+        return controller_article.rating_changed(user_id, submitted=True)
+
+    except Exception as e:
+        print(f"Error internal: {e}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+# delete rating (one article)
+@replaces('delete_rating')
+@token_required
+async def delete_rating():
+    try:
+        article_id, user_id, error = controller_article.delete_rating_request()
+        if error is not None:
+            return error
+
+        if RATING_QUEUE is not None:
+            return controller_article.queue_rating_delete(user_id, article_id, await find_rating_doc_id(user_id, article_id),
+                                                          await user_exists(user_id))
+
+        # Read the user and the rating concurrently
+        db = FIRESTORE_ASYNC.client
+        user_ref = db.collection("users").document(user_id)
+        rating_ref = db.collection("ratings").document(await rating_doc_id(user_id, article_id))
+        user_doc, rating_doc = await FIRESTORE_ASYNC.gather(user_ref.get(), rating_ref.get())
+        error = controller_article.rating_delete_error(user_doc, rating_doc, article_id)
+        if error is not None:
+            return error
+
+        # Remove from the user's rated_articles and delete the rating in one atomic batch
+        batch = db.batch()
+        controller_article.add_rating_delete_writes(batch, user_ref, rating_ref, article_id)
+        await FIRESTORE_ASYNC.run(batch.commit())
+        return controller_article.rating_changed(user_id, submitted=False)
+
+    except Exception as e:
+        print(f"Error during rating deletion: {e}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+# get all articles rated by user_id
+@replaces('get_rated_articles')
+@token_required
+async def get_rated_articles(user_id):
+    try:
+        return await get_user_articles(user_id, "rated_articles")
+
+    except Exception as e:
+        print(f"Error fetching rated articles: {e}")
+        return "Internal Server Error", 500
+
+@replaces('submit_subject_area')
+async def submit_subject_area():
+    try:
+        subject_area, user_id, error = controller_auth.subject_area_request()
+        if error is not None:
+            return error
+        db = FIRESTORE_ASYNC.client
+
+        # if unauthenticated, push new user without email and name (guest), and return it to frontend
+        if not user_id:
+            new_user = controller_auth.new_guest_user(subject_area)
+            await FIRESTORE_ASYNC.run(db.collection('users').document(new_user['user_id']).set(new_user))
+            return controller_auth.guest_created(new_user)
+        else:
+            user_ref = db.collection("users").document(user_id)
+            user = await FIRESTORE_ASYNC.run(user_ref.get())
+            if not user.exists:
+                return controller_auth.subject_area_user_not_found()
+            await FIRESTORE_ASYNC.run(user_ref.update({
+                'subject_area':subject_area,
+            }))
+            return controller_auth.subject_area_updated(user_id, user, subject_area)
+
+    except Exception as e:
+        return "Internal Server Error", 500
+
+# to get 'Recommendation for you' in home page
+@replaces('getArticles_content')
+@token_required
+async def getArticles_content():
+    try:
+        user_id, state, response = controller_ml_model.content_request()
+        if response is not None:
+            return response
+        with span('firestore.get_user'):
+            user_doc = await FIRESTORE_ASYNC.run(FIRESTORE_ASYNC.client.collection("users").document(user_id).get())
+        return controller_ml_model.content_response(user_id, user_doc, state)
+    except Exception as e:
+        print(f"Error internal: {e}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+# calls, in-flight and peak concurrent Firestore calls of this worker
+@app.route("/firestore/async-stats",methods=["GET"])
+@token_required
+def get_firestore_async_stats():
+    return jsonify(FIRESTORE_ASYNC.stats()), 200
@@ -1,11 +1,12 @@
 from flask import request, jsonify
 from app import app
-from middleware import token_required
+from middleware import token_required, TOKEN_CACHE, JWT_SECRET
 import uuid
 from firebase import db
+from recommendation_cache import RECOMMENDATION_CACHE
+from load_ratings import RATINGS
 from datetime import datetime, timedelta
-from google.oauth2 import id_token
-from google.auth.transport import requests
+from google_certs import GOOGLE_CERTS
 import jwt
 import os
 from dotenv import load_dotenv
@@ -13,53 +14,98 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+# Function to read a subject area request; returns (subject_area, user_id, error response or None).
+# The functions below are shared with the async view in controller_async.py.
+def subject_area_request():
+    data = request.get_json()
+    subject_area = data.get('subject_area').lower()
+    if not subject_area:
+        return None, None, ("Subject area must be provided and cannot be undefined", 400)
+    return subject_area, data.get('user_id'), None
+
+# Function to build the document of a guest account (no email and name) for a new session
+def new_guest_user(subject_area):
+    return {
+        'user_id':str(uuid.uuid4()),
+        'subject_area':subject_area,
+        'email':'',
+        'name':'',
+        'rated_articles':[],
+        'createdAt':datetime.now().isoformat()
+    }
+
+# Function to answer a created guest account with its JWT
+def guest_created(new_user):
+    # Backend Issues JWT: generates a custom JWT containing user ID and other necessary claims.
+    payload = {
+        'user_id': new_user['user_id'],
+        'email': "",
+        'name': "",
+        'exp': datetime.now()- timedelta(hours=7)+ timedelta(hours=int(os.getenv('JWT_EXP_DELTA_HOURS')))
+    }
+    jwt_token = jwt.encode(payload, JWT_SECRET, algorithm="HS256")
+    return jsonify({"jwt_token":jwt_token},{"user":new_user}), 201
+
+# Function to answer a subject area request for a user that does not exist
+def subject_area_user_not_found():
+    return jsonify({"error": "User not found!"}), 404
+
+# Function to answer an updated subject area with the user document as updated
+def subject_area_updated(user_id, user_doc, subject_area):
+    RECOMMENDATION_CACHE.invalidate_user(user_id)
+    user = user_doc.to_dict()
+    user['subject_area'] = subject_area
+    return jsonify(user), 201
+
 @app.route("/subject_area",methods=['POST'])
 def submit_subject_area():
     try:
-        data = request.get_json()
-        subject_area = data.get('subject_area').lower()
-        if not subject_area:
-            return "Subject area must be provided and cannot be undefined", 400
-
-        user_id = data.get('user_id')
+        subject_area, user_id, error = subject_area_request()
+        if error is not None:
+            return error
 
         # check if session_id is authenticated
         # if unauthenticated, push new user without email and name (guest), and return it to frontend
         if not user_id:
-            # create a guest account
-            user_id = str(uuid.uuid4())
-            new_user = {
-                'user_id':user_id,
-                'subject_area':subject_area,
-                'email':'',
-                'name':'',
-                'rated_articles':[],
-                'createdAt':datetime.now().isoformat()
-            }
-            db.collection('users').document(user_id).set(new_user)
-            # Backend Issues JWT: generates a custom JWT containing user ID and other necessary claims.
-            payload = {
-                'user_id': user_id,
-                'email': "",
-                'name': "",
-                'exp': datetime.now()- timedelta(hours=7)+ timedelta(hours=int(os.getenv('JWT_EXP_DELTA_HOURS')))
-            }
-            jwt_token = jwt.encode(payload, os.getenv('JWT_SECRET'), algorithm="HS256")
-            return jsonify({"jwt_token":jwt_token},{"user":new_user}), 201
+            new_user = new_guest_user(subject_area)
+            db.collection('users').document(new_user['user_id']).set(new_user)
+            return guest_created(new_user)
         else:
-            user = db.collection("users").document(user_id).get()
+            user_ref = db.collection("users").document(user_id)
+            user = user_ref.get()
             if not user.exists:
-                return jsonify({"error": "User not found!"}), 404
-            
-            db.collection('users').document(user_id).update({
+                return subject_area_user_not_found()
+            user_ref.update({
                 'subject_area':subject_area,
             })
-            user = db.collection("users").document(user_id).get().to_dict()
-            return jsonify(user), 201
+            return subject_area_updated(user_id, user, subject_area)
 
     except Exception as e:
         return "Internal Server Error", 500
 
+# hit/miss/eviction counters of the verified-token cache
+@app.route("/auth/token-cache-stats",methods=["GET"])
+@token_required
+def get_token_cache_stats():
+    return jsonify(TOKEN_CACHE.stats()), 200
+
+# Function to find a user by email through the users listener's email index (no Firestore read).
+# A miss is confirmed with the query before the caller registers the email: the index lags
+# registrations made moments ago by other workers, and trusting it would create a duplicate.
+def find_user_by_email(email):
+    if RATINGS.users_loaded():
+        found_user = RATINGS.find_user_by_email(email)
+        if found_user is not None:
+            return found_user
+    user_ref = db.collection("users").where("email", "==", email).get()
+    return (user_ref[0].id, user_ref[0].to_dict()) if user_ref else None
+
+# fetch and hit counters of the Google signing certificate cache
+@app.route("/auth/google-certs-stats",methods=["GET"])
+@token_required
+def get_google_certs_stats():
+    return jsonify(GOOGLE_CERTS.stats()), 200
+
 @app.route("/auth/google",methods=['POST'])
 def auth_google():
     try:
@@ -70,12 +116,9 @@ def auth_google():
         if not id_token_str:
             return "ID token must be provided and cannot be undefined", 400
 
-        # Verify the ID token with Google
+        # Verify the ID token against Google's cached signing certificates
         try:
-            id_info = id_token.verify_oauth2_token(id_token_str, requests.Request(), os.getenv('WEB_CLIENT_ID'))
-
-            if id_info['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-                raise ValueError('Wrong issuer.')
+            id_info = GOOGLE_CERTS.verify(id_token_str, os.getenv('WEB_CLIENT_ID'))
 
             email = id_info.get('email')
             name = id_info.get('name', '')
@@ -86,8 +129,8 @@ def auth_google():
         # Check if the user exists in database, and create if not
         # if not authenticated, push new user without email and name (guest), and return it to frontend
         # update the guest account
-        user_ref = db.collection("users").where("email", "==", email).get()
-        if not user_ref:
+        found_user = find_user_by_email(email)
+        if found_user is None:
             # register scenario
             # update current guest to be registered account with email and name
             if not user_id:
@@ -98,11 +141,17 @@ def auth_google():
                     'email':email,
                     'name':name,
                 }
+            # The guest document normally comes from the users listener; read it only if
+            # it was created too recently to have arrived yet
+            user = RATINGS.get_user(user_id)
+            if user is None:
+                user = db.collection("users").document(user_id).get().to_dict() or {}
             db.collection('users').document(user_id).update(update_user)
-            user = db.collection("users").document(user_id).get().to_dict()
+            RATINGS.apply_local_user(user_id, update_user)
+            user.update(update_user)
         else:
             # login scenario
-            user = user_ref[0].to_dict()
+            user = found_user[1]
         
         # Generate a custom JWT
         payload = {
@@ -111,7 +160,7 @@ def auth_google():
             'name': name,
             'exp': datetime.now()- timedelta(hours=7)+ timedelta(hours=int(os.getenv('JWT_EXP_DELTA_HOURS')))
         }
-        jwt_token = jwt.encode(payload, os.getenv('JWT_SECRET'), algorithm="HS256")
+        jwt_token = jwt.encode(payload, JWT_SECRET, algorithm="HS256")
         
         # Send the JWT back to the frontend
         return jsonify({'jwt_token': jwt_token, 'user': user}), 200
@@ -0,0 +1,39 @@
+import time
+from flask import Response, jsonify, request
+from app import app
+from startup import STARTUP
+import metrics
+
+# liveness: the process is up and serving requests
+@app.route("/healthz",methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+# readiness: catalog, models and indexes are loaded, so the load balancer may route traffic
+@app.route("/readyz",methods=["GET"])
+def readyz():
+    ready = STARTUP.ready()
+    return jsonify({"ready": ready, "stages": STARTUP.status()}), 200 if ready else 503
+
+# Prometheus scrape endpoint: request latencies, per-stage spans and Firestore operations
+@app.route("/metrics",methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+if metrics.METRICS_ENABLED:
+    @app.before_request
+    def begin_request_metrics():
+        request.metrics_token = metrics.begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+        request.metrics_start = time.perf_counter()
+
+    # Also report the request's stages in a Server-Timing header, for one slow request at a time
+    @app.after_request
+    def end_request_metrics(response):
+        token = getattr(request, 'metrics_token', None)
+        if token is None:
+            return response
+        current = metrics.end_request(token, request.method, response.status_code, time.perf_counter() - request.metrics_start)
+        timings = [f"{stage};dur={duration * 1000:.2f}" for stage, duration in current.spans]
+        timings.append(f"firestore;desc=\"{current.reads} reads, {current.writes} writes\"")
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
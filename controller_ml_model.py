@@ -1,28 +1,88 @@
+import os
 from flask import request, jsonify
 from app import app
 from middleware import token_required
-from operate_content_model import recommend_for_user
-from operate_collaborative_model import recommend_articles
+from operate_content_model import recommend_positions_for_user, similar_article_positions, CONTENT_SCHEDULER, \
+    SIMILARITY_NEIGHBORS
+from load_articles import find_article_position, articles_json
+from operate_collaborative_model import recommend_article_positions
+from controller_article import requested_fields
+from fast_json import json_response
+from recommendation_cache import RECOMMENDATION_CACHE
 from firebase import db
+import load_articles
+import load_models
+from metrics import span
+from startup import STARTUP
+
+# Startup stages each recommendation endpoint reads from; until they are ready it answers 503
+CONTENT_STAGES = ('catalog', 'ratings', 'models', 'user_article_matrix')
+COLLABORATIVE_STAGES = ('catalog', 'ratings', 'models')
+SIMILAR_STAGES = ('similarity_index',)
+# Seconds a client is asked to wait (Retry-After) before trying again
+STARTUP_RETRY_AFTER = int(os.getenv('STARTUP_RETRY_AFTER', 5))
+
+# Function to build the recommendation cache key; model or catalog reloads change it.
+# Cached recommendations are catalog positions, encoded per request with its fields= projection.
+def recommendation_cache_key(user_id, model_name):
+    return (user_id, model_name, load_models.MODEL_VERSION, load_articles.CATALOG_VERSION)
+
+# Function to answer 503 with Retry-After while any of the given startup stages is not ready;
+# returns None once they all are
+def not_ready(stages):
+    pending = STARTUP.pending(stages)
+    if not pending:
+        return None
+    response = jsonify({"error": "Recommendations are still loading, try again later", "stages": pending})
+    response.headers['Retry-After'] = str(STARTUP_RETRY_AFTER)
+    return response, 503
+
+
+# Function to read a content recommendation request and answer it if that needs no user
+# document (errors, cache hits). Returns (user_id, state for content_response, response or None).
+# Shared with the async view in controller_async.py.
+def content_request():
+    error = not_ready(CONTENT_STAGES)
+    if error is not None:
+        return None, None, error
+    data = request.get_json()
+    user_id = data.get("user_id")
+    if not user_id:
+        return None, None, (jsonify({"error": "Provide user_id!"}), 400)
+    fields, error = requested_fields()
+    if error is not None:
+        return None, None, error
+    cache_key = recommendation_cache_key(user_id, 'content')
+    generation = RECOMMENDATION_CACHE.generation(user_id)
+    recommended_articles = RECOMMENDATION_CACHE.get(cache_key)
+    if recommended_articles is not None:
+        with span('serialize'):
+            return None, None, json_response(articles_json(recommended_articles, fields))
+    return user_id, (fields, cache_key, generation), None
+
+# Function to answer a content recommendation request from the user's document
+def content_response(user_id, user_doc, state):
+    fields, cache_key, generation = state
+    if not user_doc.exists:
+        return jsonify({"error": "User not found!"}), 404
+    subject_area = user_doc.to_dict()['subject_area']
+    recommended_articles = recommend_positions_for_user(user_id, subject_area)
+    if recommended_articles:
+        RECOMMENDATION_CACHE.put(cache_key, recommended_articles, generation)
+    with span('serialize'):
+        return json_response(articles_json(recommended_articles, fields))
 
 # to get 'Recommendation for you' in home page
 @app.route("/content-model/get-articles",methods=["POST"])
 @token_required
 def getArticles_content():
     try:
-        data = request.get_json()
-        user_id = data.get("user_id")
-        if not user_id:
-            return jsonify({"error": "Provide user_id!"}), 400
-        user_ref = db.collection("users").document(user_id).get()
-        if not user_ref:
-            return jsonify({"error": "User not found!"}), 404
-        else :
-            user = user_ref.to_dict()
-        subject_area = user['subject_area']
-        recommended_articles = recommend_for_user(user_id, subject_area)
-        # print("recommended_articles =======> ",recommended_articles)
-        return jsonify(recommended_articles)
+        user_id, state, response = content_request()
+        if response is not None:
+            return response
+        with span('firestore.get_user'):
+            user_doc = db.collection("users").document(user_id).get()
+        return content_response(user_id, user_doc, state)
     except Exception as e:
         print(f"Error internal: {e}")
         return jsonify({"error": "Internal Server Error"}), 500
@@ -32,15 +92,66 @@ def getArticles_content():
 @token_required
 def getArticles_collaborative():
     try:
+        error = not_ready(COLLABORATIVE_STAGES)
+        if error is not None:
+            return error
         data = request.get_json()
         user_id = data.get('user_id')
 
         if not user_id:
             return jsonify({"error": "Provide user_id!"}), 400
+        fields, error = requested_fields()
+        if error is not None:
+            return error
         
-        recommended_articles = recommend_articles(user_id)
-        # print("recommended_articles =======> ",len(recommended_articles))
-        return jsonify(recommended_articles)
+        cache_key = recommendation_cache_key(user_id, 'collaborative')
+        generation = RECOMMENDATION_CACHE.generation(user_id)
+        recommended_articles = RECOMMENDATION_CACHE.get(cache_key)
+        if recommended_articles is None:
+            recommended_articles = recommend_article_positions(user_id)
+            # print("recommended_articles =======> ",len(recommended_articles))
+            if recommended_articles:
+                RECOMMENDATION_CACHE.put(cache_key, recommended_articles, generation)
+        with span('serialize'):
+            return json_response(articles_json(recommended_articles, fields))
     except Exception as e:
         print(f"Error internal: {e}")
         return jsonify({"error": "Internal Server Error"}), 500
+
+# to get 'More like this' on the article page.
+# ?limit= is 1 to SIMILARITY_NEIGHBORS (20), the neighbors the similarity index keeps per article
+@app.route("/articles/<article_id>/similar",methods=["GET"])
+@token_required
+def getArticles_similar(article_id):
+    try:
+        error = not_ready(SIMILAR_STAGES)
+        if error is not None:
+            return error
+        limit = request.args.get('limit', '10')
+        limit = int(limit) if limit.isdecimal() else None
+        if limit is None or not 1 <= limit <= SIMILARITY_NEIGHBORS:
+            return jsonify({"error": f"limit must be an integer from 1 to {SIMILARITY_NEIGHBORS}"}), 400
+        fields, error = requested_fields()
+        if error is not None:
+            return error
+        position = find_article_position(article_id)
+        if position is None:
+            return jsonify({"error": "Article not found"}), 404
+        similar_articles = similar_article_positions(position, limit)
+        with span('serialize'):
+            return json_response(articles_json(similar_articles, fields))
+    except Exception as e:
+        print(f"Error internal: {e}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+# hit/miss/eviction counters of the recommendation cache
+@app.route("/recommendations/cache-stats",methods=["GET"])
+@token_required
+def get_recommendation_cache_stats():
+    return jsonify(RECOMMENDATION_CACHE.stats()), 200
+
+# batch size and queue delay of the content-model inference scheduler
+@app.route("/inference/stats",methods=["GET"])
+@token_required
+def get_inference_stats():
+    return jsonify(CONTENT_SCHEDULER.stats()), 200
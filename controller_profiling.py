@@ -0,0 +1,87 @@
+import os
+import jwt
+from flask import jsonify, request, send_from_directory
+from app import app
+import profiling
+
+# On-demand profiling of single requests. A request carrying
+#   X-Profile: <JWT signed with PROFILE_SECRET, e.g. {'profiler': 'cprofile', 'exp': ...}>
+# runs under cProfile ('cprofile') or the stack sampler ('sample', the default, with
+# 'interval_ms', clamped to profiling.MIN/MAX_SAMPLE_INTERVAL_MS). The profile is stored in
+# PROFILE_DIR with the route, method, path, status and query parameter names; bodies and
+# parameter values are never stored, as they can hold id tokens and passwords. Its id comes
+# back in the X-Profile-Id response header. An invalid token is ignored, so the
+# request is served normally either way. The sampler suits slow requests; cProfile sees
+# every call of a short one at the cost of slowing it down.
+
+@app.before_request
+def start_request_profile():
+    token = request.headers.get('X-Profile')
+    # The admin routes below carry the same token but are not profiled themselves
+    if not token or request.endpoint in ('get_profiles', 'get_profile'):
+        return
+    try:
+        claims = profiling.verify_profile_token(token)
+    except jwt.InvalidTokenError as e:
+        print(f"Ignoring X-Profile header: {e}")
+        return
+    profile = profiling.RequestProfile(claims.get('profiler', 'sample'), profiling.sample_interval_ms(claims.get('interval_ms', 1)))
+    if profile.start():
+        request.profile = profile
+
+@app.after_request
+def tag_request_profile(response):
+    profile = getattr(request, 'profile', None)
+    if profile is not None:
+        request.profile_status = response.status_code
+        response.headers['X-Profile-Id'] = profile.id
+    return response
+
+# Stopped on teardown, which runs even when the view raised and after_request was skipped,
+# so a sampler thread or an enabled cProfile never outlives its request
+@app.teardown_request
+def stop_request_profile(error):
+    profile = getattr(request, 'profile', None)
+    if profile is None:
+        return
+    request.profile = None
+    try:
+        profile.stop({
+            'route': request.url_rule.rule if request.url_rule else None,
+            'method': request.method,
+            'path': request.path,
+            'arg_names': sorted(request.args.keys()),
+            'status': getattr(request, 'profile_status', 500),
+            'error': type(error).__name__ if error is not None else None,
+        })
+    except Exception as e:
+        print(f"Error storing request profile: {e}")
+
+# Function to check the admin X-Profile token of the /admin/profiles routes
+def admin_error():
+    try:
+        profiling.verify_profile_token(request.headers.get('X-Profile', ''))
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Admin profile token required"}), 403
+    return None
+
+# stored request profiles, newest first
+@app.route("/admin/profiles",methods=["GET"])
+def get_profiles():
+    error = admin_error()
+    if error is not None:
+        return error
+    return jsonify(profiling.list_profiles()), 200
+
+# one stored profile: the .pstats or .folded file, or its metadata with ?format=json
+@app.route("/admin/profiles/<profile_id>",methods=["GET"])
+def get_profile(profile_id):
+    error = admin_error()
+    if error is not None:
+        return error
+    profile = next((profile for profile in profiling.list_profiles() if profile['id'] == profile_id), None)
+    if profile is None:
+        return jsonify({"error": "Profile not found"}), 404
+    if request.args.get('format') == 'json':
+        return jsonify(profile), 200
+    return send_from_directory(os.path.abspath(profiling.PROFILE_DIR), profile['file'], as_attachment=True)
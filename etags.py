@@ -0,0 +1,88 @@
+import hashlib
+import os
+from flask import current_app, request
+from dotenv import load_dotenv
+
+import load_articles
+# Load environment variables from .env file
+load_dotenv()
+
+# Strong ETags for responses that only change when the catalog reloads (/articles/<id>,
+# /search) or when a user's favorite/rated lists are written. A request whose If-None-Match
+# already holds the tag is answered 304 before any search or serialization runs.
+#
+# Catalog tags hash the catalog fingerprint (the same in every worker serving the same
+# catalog) with the path and query string. Per-user tags hash the user's articles_version, a
+# counter in the user document that every write to favorite_articles / rated_articles
+# increments, so all workers agree on it. Until the catalog is loaded (or while it reloads)
+# nothing is tagged and responses are sent with no-store.
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 300))
+# The routes require a token, and a shared cache would serve its copy without checking one,
+# so catalog responses are private unless CATALOG_CACHE_PUBLIC=1: set it only behind a CDN
+# that authenticates requests itself (the content is the same for every user).
+CATALOG_CACHE_PUBLIC = os.getenv('CATALOG_CACHE_PUBLIC') == '1'
+CATALOG_CACHE_CONTROL = f"{'public' if CATALOG_CACHE_PUBLIC else 'private'}, max-age={CATALOG_CACHE_MAX_AGE}"
+# Per-user lists are revalidated on every use and never stored by shared caches
+USER_CACHE_CONTROL = 'private, no-cache'
+USER_VERSION_FIELD = 'articles_version'
+# Compressed bodies get "<tag>-<coding>" (see controller_compression.py), as a strong ETag
+# must differ between representations
+CONTENT_CODINGS = ('br', 'gzip')
+
+
+# Function to build an ETag value (unquoted) from anything with a stable repr
+def make_etag(*parts):
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=12).hexdigest()
+
+# Function to note the catalog a tag is built on; None while it is not (fully) loaded
+def _fingerprint():
+    request.etag_fingerprint = load_articles.CATALOG_FINGERPRINT
+    return request.etag_fingerprint
+
+# Function to build the ETag of a catalog-backed GET from its path and query string, or None
+def catalog_etag():
+    fingerprint = _fingerprint()
+    if fingerprint is None:
+        return None
+    return make_etag(fingerprint, request.path, sorted(request.args.items(multi=True)))
+
+# Function to build the ETag of a user's article list from the user document, or None
+def user_articles_etag(user_id, field, user):
+    fingerprint = _fingerprint()
+    if fingerprint is None:
+        return None
+    return make_etag(fingerprint, field, user_id, user.get(USER_VERSION_FIELD, 0), request.args.get('fields'))
+
+# Function to tag an ETag with the content coding of a compressed body
+def coded_etag(etag, coding):
+    return f"{etag}-{coding}"
+
+# Function to get the representation of `etag` the client already holds, or None
+def cached_etag(etag):
+    for candidate in (etag,) + tuple(coded_etag(etag, coding) for coding in CONTENT_CODINGS):
+        if request.if_none_match.contains_weak(candidate):
+            return candidate
+    return None
+
+# Function to answer 304 if the client holds the current representation; returns None otherwise
+def not_modified(etag, cache_control):
+    if etag is None:
+        return None
+    etag = cached_etag(etag)
+    if etag is None:
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+# Function to add the ETag and Cache-Control headers to a 200 response. Without a tag, or if
+# the catalog reloaded while the response was built, it must not be stored at all.
+def tagged(response, etag, cache_control):
+    if etag is None or load_articles.CATALOG_FINGERPRINT != getattr(request, 'etag_fingerprint', None):
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,100 @@
+# Export the Keras models to .npz files that numpy_models.NumpyModel can serve without TensorFlow.
+# Run after training: python export_models.py
+# Each export is checked against model.predict on random inputs before it is written.
+import json
+import sys
+import numpy as np
+import tensorflow as tf
+
+from numpy_models import NumpyModel
+
+MODELS = {
+    'ContentBasedFilteringModel.keras': 'ContentBasedFilteringModel.npz',
+    'CollaborativeFilteringModel.keras': 'CollaborativeFilteringModel.npz',
+}
+# Max abs difference from model.predict tolerated for an export
+TOLERANCE = 1e-4
+CONFIG_KEYS = ('activation', 'use_bias', 'axis', 'normalize', 'epsilon', 'center', 'scale')
+
+
+# Function to collect the names of the layers feeding a layer from its Keras 3 config
+def inbound_layer_names(node):
+    if isinstance(node, dict):
+        if 'keras_history' in node.get('config', {}):
+            return [node['config']['keras_history'][0]]
+        return [name for value in node.values() for name in inbound_layer_names(value)]
+    if isinstance(node, list):
+        return [name for value in node for name in inbound_layer_names(value)]
+    return []
+
+
+# Function to describe the model graph and collect its weights
+def describe_model(model):
+    config = model.get_config()
+    sequential = 'input_layers' not in config
+    layers = []
+    weights = {}
+    previous = 'input'
+    if sequential:
+        layers.append({'name': 'input', 'class_name': 'InputLayer', 'config': {}, 'inbound': [], 'num_weights': 0})
+    for layer in model.layers:
+        if sequential:
+            inbound = [previous]
+            previous = layer.name
+        else:
+            layer_config = next(spec for spec in config['layers'] if spec['name'] == layer.name)
+            inbound = inbound_layer_names(layer_config['inbound_nodes'])
+        layer_weights = layer.get_weights()
+        for i, weight in enumerate(layer_weights):
+            weights[f"{layer.name}/{i}"] = weight
+        layers.append({
+            'name': layer.name,
+            'class_name': layer.__class__.__name__,
+            'config': {key: value for key, value in layer.get_config().items() if key in CONFIG_KEYS},
+            'inbound': inbound,
+            'num_weights': len(layer_weights),
+        })
+    model_inputs = model.inputs if isinstance(model.inputs, list) else [model.inputs]
+    architecture = {
+        'layers': layers,
+        'inputs': ['input'] if sequential else [spec[0] for spec in config['input_layers']],
+        'outputs': [previous] if sequential else [spec[0] for spec in config['output_layers']],
+        'input_shapes': [[None] + list(tensor.shape[1:]) for tensor in model_inputs],
+    }
+    return architecture, weights
+
+
+# Function to build random inputs matching the model's inputs (integer ids for embeddings)
+def sample_inputs(numpy_model, num_samples=64, seed=0):
+    rng = np.random.default_rng(seed)
+    inputs = []
+    for name, shape in zip(numpy_model.input_names, numpy_model.input_shapes):
+        consumers = [layer for layer in numpy_model.layers if name in numpy_model._inbound[layer.name]]
+        if consumers and consumers[0].__class__.__name__ == 'Embedding':
+            inputs.append(rng.integers(0, consumers[0].weights[0].shape[0], (num_samples,) + tuple(shape[1:])))
+        else:
+            inputs.append(rng.random((num_samples,) + tuple(shape[1:])).astype(np.float32))
+    return inputs if len(inputs) > 1 else inputs[0]
+
+
+def export_model(model_path, export_path):
+    model = tf.keras.models.load_model(model_path)
+    architecture, weights = describe_model(model)
+    numpy_model = NumpyModel(architecture, weights)
+    inputs = sample_inputs(numpy_model)
+    error = float(np.max(np.abs(model.predict(inputs, verbose=0) - numpy_model.predict(inputs))))
+    if error > TOLERANCE:
+        raise ValueError(f"{model_path}: NumPy output differs from predict by {error}")
+    np.savez(export_path, architecture=np.array(json.dumps(architecture)), **weights)
+    print(f"Exported {model_path} -> {export_path} (max abs error {error:.2e})")
+
+
+if __name__ == '__main__':
+    failed = False
+    for model_path, export_path in MODELS.items():
+        try:
+            export_model(model_path, export_path)
+        except Exception as e:
+            print(f"Error exporting {model_path}: {e}")
+            failed = True
+    sys.exit(1 if failed else 0)
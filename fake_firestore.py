@@ -0,0 +1,370 @@
+import asyncio
+import copy
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+try:
+    from google.api_core.exceptions import NotFound
+except ImportError:
+    class NotFound(Exception):
+        pass
+
+# In-memory stand-in for the parts of the Firestore client this app uses,
+# so stores and engines can be exercised offline without a Firebase project.
+
+
+# Apply Firestore field transforms (ArrayUnion / ArrayRemove / Increment) against the current document
+def _apply_transforms(current, data):
+    resolved = {}
+    for field, value in data.items():
+        transform = type(value).__name__
+        if transform in ('ArrayUnion', 'ArrayRemove'):
+            existing = list(current.get(field) or [])
+            if transform == 'ArrayUnion':
+                value = existing + [item for item in value.values if item not in existing]
+            else:
+                value = [item for item in existing if item not in value.values]
+        elif transform == 'Increment':
+            value = (current.get(field) or 0) + value.value
+        resolved[field] = copy.deepcopy(value)
+    return resolved
+
+
+class FakeChangeType:
+    def __init__(self, name):
+        self.name = name
+
+
+ADDED = FakeChangeType('ADDED')
+MODIFIED = FakeChangeType('MODIFIED')
+REMOVED = FakeChangeType('REMOVED')
+
+
+class FakeDocumentChange:
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeWatch:
+    def __init__(self, collection, callback):
+        self._collection = collection
+        self._callback = callback
+
+    def unsubscribe(self):
+        self._collection._unsubscribe(self)
+
+
+class FakeDocumentReference:
+    def __init__(self, collection, doc_id):
+        self._collection = collection
+        self.id = doc_id
+        self.path = f"{collection.id}/{doc_id}"
+
+    def get(self):
+        self._collection._client._round_trip()
+        return self._collection._read(self.id)
+
+    def set(self, data, merge=False):
+        self._collection._client._round_trip()
+        self._collection._write(self.id, data, merge=merge)
+
+    def update(self, data):
+        self._collection._client._round_trip()
+        self._collection._write(self.id, data, merge=True, must_exist=True)
+
+    def delete(self):
+        self._collection._client._round_trip()
+        self._collection._delete(self.id)
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=()):
+        self._collection = collection
+        self._filters = tuple(filters)
+
+    def where(self, field, op, value):
+        if op != '==':
+            raise NotImplementedError(f"Unsupported operator: {op}")
+        return FakeQuery(self._collection, self._filters + ((field, value),))
+
+    def stream(self):
+        self._collection._client._round_trip()
+        return iter(self._matching())
+
+    def _matching(self):
+        client = self._collection._client
+        with client._lock:
+            items = [
+                (doc_id, data) for doc_id, data in self._collection._docs.items()
+                if all(data.get(field) == value for field, value in self._filters)
+            ]
+            # Firestore bills one read per returned document, and at least one per query
+            client._count(reads=max(len(items), 1))
+        return [FakeDocumentSnapshot(self._collection.document(doc_id), copy.deepcopy(data)) for doc_id, data in items]
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, name):
+        super().__init__(self)
+        self._client = client
+        self.id = name
+        self._docs = {}
+        self._watches = []
+
+    def document(self, doc_id=None):
+        return FakeDocumentReference(self, doc_id or uuid.uuid4().hex)
+
+    def on_snapshot(self, callback):
+        watch = FakeWatch(self, callback)
+        with self._client._lock:
+            self._watches.append(watch)
+            snapshots = list(self._snapshots())
+        changes = [FakeDocumentChange(ADDED, snapshot) for snapshot in snapshots]
+        callback(snapshots, changes, datetime.now(timezone.utc))
+        return watch
+
+    def _unsubscribe(self, watch):
+        with self._client._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _snapshots(self):
+        with self._client._lock:
+            items = list(self._docs.items())
+            self._client._count(reads=len(items))
+        return [FakeDocumentSnapshot(self.document(doc_id), copy.deepcopy(data)) for doc_id, data in items]
+
+    def _read(self, doc_id):
+        with self._client._lock:
+            self._client._count(reads=1)
+            data = copy.deepcopy(self._docs.get(doc_id))
+        return FakeDocumentSnapshot(self.document(doc_id), data)
+
+    def _write(self, doc_id, data, merge=False, must_exist=False):
+        with self._client._lock:
+            self._client._count(writes=1)
+            current = self._docs.get(doc_id)
+            if must_exist and current is None:
+                raise NotFound(f"No document to update: {self.id}/{doc_id}")
+            existed = current is not None
+            updated = dict(current) if merge and current else {}
+            updated.update(_apply_transforms(current or {}, data))
+            self._docs[doc_id] = updated
+        self._notify(MODIFIED if existed else ADDED, doc_id, updated)
+
+    def _delete(self, doc_id):
+        with self._client._lock:
+            self._client._count(writes=1)
+            current = self._docs.pop(doc_id, None)
+        if current is not None:
+            self._notify(REMOVED, doc_id, current)
+
+    def _notify(self, change_type, doc_id, data):
+        with self._client._lock:
+            watches = list(self._watches)
+        if not watches:
+            return
+        snapshot = FakeDocumentSnapshot(self.document(doc_id), copy.deepcopy(data))
+        for watch in watches:
+            watch._callback([snapshot], [FakeDocumentChange(change_type, snapshot)], datetime.now(timezone.utc))
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append((reference, 'set', data, merge))
+
+    def update(self, reference, data):
+        self._writes.append((reference, 'update', data, True))
+
+    def delete(self, reference):
+        self._writes.append((reference, 'delete', None, False))
+
+    # All writes apply or none do, like a Firestore batch commit
+    def commit(self):
+        self._client._round_trip()
+        self._apply()
+
+    def _apply(self):
+        with self._client._lock:
+            self._client.commits += 1
+            for reference, operation, _, _ in self._writes:
+                if operation == 'update' and reference.id not in reference._collection._docs:
+                    raise NotFound(f"No document to update: {reference.path}")
+            for reference, operation, data, merge in self._writes:
+                if operation == 'delete':
+                    reference.delete()
+                else:
+                    reference._collection._write(reference.id, data, merge=merge)
+        self._writes = []
+
+
+# latency: seconds slept per simulated RPC (document get/set/update/delete, query, batch
+# commit, get_all), to approximate the network round trips of the real client
+class FakeFirestore:
+    def __init__(self, latency=0):
+        self._lock = threading.RLock()
+        self._collections = {}
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+        self.round_trips = 0
+        self._thread_counts = threading.local()
+
+    # Called with self._lock held
+    def _count(self, reads=0, writes=0):
+        self.reads += reads
+        self.writes += writes
+        counts = self._thread_counts
+        counts.reads = getattr(counts, 'reads', 0) + reads
+        counts.writes = getattr(counts, 'writes', 0) + writes
+
+    # (reads, writes) made by the calling thread since its previous call, to attribute
+    # operations to the request a worker thread is serving
+    def thread_counts(self):
+        counts = self._thread_counts
+        reads, writes = getattr(counts, 'reads', 0), getattr(counts, 'writes', 0)
+        counts.reads = counts.writes = 0
+        return reads, writes
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollectionReference(self, name)
+            return self._collections[name]
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references):
+        self._round_trip()
+        for reference in references:
+            yield reference._collection._read(reference.id)
+
+
+# Async counterparts of the classes above, mirroring firestore.AsyncClient: document reads and
+# writes, query get/stream and batch commits are coroutines and get_all is an async generator.
+# They share the sync client's documents and counters; the simulated latency is awaited, so
+# reads gathered concurrently overlap.
+class FakeAsyncDocumentReference:
+    def __init__(self, client, reference):
+        self._client = client
+        self._reference = reference
+        self.id = reference.id
+        self.path = reference.path
+
+    async def get(self):
+        await self._client._round_trip()
+        return self._reference._collection._read(self.id)
+
+    async def set(self, data, merge=False):
+        await self._client._round_trip()
+        self._reference._collection._write(self.id, data, merge=merge)
+
+    async def update(self, data):
+        await self._client._round_trip()
+        self._reference._collection._write(self.id, data, merge=True, must_exist=True)
+
+    async def delete(self):
+        await self._client._round_trip()
+        self._reference._collection._delete(self.id)
+
+
+class FakeAsyncQuery:
+    def __init__(self, client, query):
+        self._client = client
+        self._query = query
+
+    def where(self, field, op, value):
+        return FakeAsyncQuery(self._client, self._query.where(field, op, value))
+
+    async def stream(self):
+        await self._client._round_trip()
+        for snapshot in self._query._matching():
+            yield snapshot
+
+    async def get(self):
+        await self._client._round_trip()
+        return self._query._matching()
+
+
+class FakeAsyncCollectionReference(FakeAsyncQuery):
+    def __init__(self, client, collection):
+        super().__init__(client, collection)
+        self.id = collection.id
+
+    def document(self, doc_id=None):
+        return FakeAsyncDocumentReference(self._client, self._query.document(doc_id))
+
+
+class FakeAsyncWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._batch = FakeWriteBatch(client._sync)
+
+    def set(self, reference, data, merge=False):
+        self._batch.set(reference._reference, data, merge=merge)
+
+    def update(self, reference, data):
+        self._batch.update(reference._reference, data)
+
+    def delete(self, reference):
+        self._batch.delete(reference._reference)
+
+    async def commit(self):
+        await self._client._round_trip()
+        self._batch._apply()
+
+
+class FakeAsyncFirestore:
+    def __init__(self, sync_client):
+        self._sync = sync_client
+
+    async def _round_trip(self):
+        with self._sync._lock:
+            self._sync.round_trips += 1
+        if self._sync.latency:
+            await asyncio.sleep(self._sync.latency)
+
+    def collection(self, name):
+        return FakeAsyncCollectionReference(self, self._sync.collection(name))
+
+    def batch(self):
+        return FakeAsyncWriteBatch(self)
+
+    async def get_all(self, references):
+        await self._round_trip()
+        for reference in references:
+            yield reference._reference._collection._read(reference.id)
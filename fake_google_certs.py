@@ -0,0 +1,105 @@
+import datetime
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt as google_jwt
+
+# Local stand-in for Google's ID-token certificate endpoint, so /auth/google can be exercised
+# offline: point GOOGLE_CERTS_URL at FakeGoogleCerts.url and sign in with mint_id_token().
+# Serves {'key id': PEM certificate} with Cache-Control max-age and an ETag like Google does,
+# and counts the requests it receives. Setting `failing` makes it answer 503.
+
+
+def _self_signed_certificate(key):
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'fake-google-certs')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=30))
+        .sign(key, hashes.SHA256())
+    )
+
+
+class FakeGoogleCerts:
+    def __init__(self, max_age=3600, host='127.0.0.1', port=0):
+        self.max_age = max_age
+        self.requests = 0
+        self.not_modified = 0
+        self.failing = False
+        self.keys = {}
+        self._pems = {}
+        self.rotate()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                if fake.failing:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps(fake.certs()).encode('utf-8')
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    fake.not_modified += 1
+                    self.send_response(304)
+                else:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                    self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', f"public, max-age={fake.max_age}, must-revalidate, no-transform")
+                self.send_header('ETag', etag)
+                self.end_headers()
+                if self.command == 'GET' and etag != self.headers.get('If-None-Match'):
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}/oauth2/v1/certs"
+        threading.Thread(target=self.server.serve_forever, name='fake-google-certs', daemon=True).start()
+
+    # Add a new signing key, which becomes the one mint_id_token uses
+    def rotate(self):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.kid = uuid.uuid4().hex
+        self.keys[self.kid] = key
+        self._pems[self.kid] = _self_signed_certificate(key).public_bytes(serialization.Encoding.PEM).decode('utf-8')
+        return self.kid
+
+    def certs(self):
+        return dict(self._pems)
+
+    # A signed Google-style ID token for the given audience (WEB_CLIENT_ID)
+    def mint_id_token(self, audience, email='user@example.com', name='Test User', lifetime=3600, **claims):
+        key = self.keys[self.kid]
+        pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        signer = crypt.RSASigner.from_string(pem, key_id=self.kid)
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com',
+            'aud': audience,
+            'sub': uuid.uuid4().hex,
+            'email': email,
+            'name': name,
+            'iat': now,
+            'exp': now + lifetime,
+        }
+        payload.update(claims)
+        return google_jwt.encode(signer, payload).decode('utf-8')
+
+    def close(self):
+        self.server.shutdown()
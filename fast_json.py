@@ -0,0 +1,42 @@
+import json
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+# orjson encodes several times faster than the json module; without it the same bytes (keys
+# sorted, compact separators) come from json.dumps.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+# Function to encode a value as compact JSON bytes with sorted keys (what jsonify produced)
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value, default=DefaultJSONProvider.default, option=ORJSON_OPTIONS)
+    return json.dumps(value, default=DefaultJSONProvider.default, sort_keys=True, separators=(',', ':')).encode()
+
+
+# Function to encode a dict whose `raw` members are already encoded JSON, e.g. a page envelope
+# around an article list built from cached fragments
+def dumps_object(value, raw):
+    members = [dumps(str(key)) + b':' + (raw[key] if key in raw else dumps(item))
+               for key, item in sorted(dict(value, **raw).items())]
+    return b'{' + b','.join(members) + b'}'
+
+
+# Function to wrap encoded JSON in a response, like jsonify does for a value
+def json_response(body, status=200):
+    return current_app.response_class(body + b'\n', status=status, mimetype='application/json')
+
+
+# jsonify through orjson (installed by app.py when orjson is available)
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def response(self, *args, **kwargs):
+        return json_response(dumps(self._prepare_response_obj(args, kwargs)))
@@ -1,7 +1,15 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+from metrics import instrument_firestore, instrument_async_firestore
 
 cred = credentials.Certificate('./serviceaccount.json')
 firebase_admin.initialize_app(cred)
 
-db = firestore.client()
+# Document reads and writes are counted per request for /metrics
+db = instrument_firestore(firestore.client())
+
+# Async client for FIRESTORE_MODE=async; async_firestore.AsyncFirestore creates it on the
+# event loop that will use it. Counted for /metrics like db.
+def async_client():
+    from firebase_admin import firestore_async
+    return instrument_async_firestore(firestore_async.client())
@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import threading
+import time
+import cachecontrol
+import jwt as pyjwt
+import requests as http
+from google.auth import exceptions, jwt as google_jwt
+from google.auth.transport import requests
+from dotenv import load_dotenv
+
+from startup import STARTUP
+# Load environment variables from .env file
+load_dotenv()
+
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+GOOGLE_ISSUERS = ['accounts.google.com', 'https://accounts.google.com']
+
+
+# Seconds the response may be cached for according to its Cache-Control and Age headers
+def _freshness(headers):
+    match = re.search(r'max-age=(\d+)', headers.get('Cache-Control', ''))
+    if not match:
+        return 0
+    return max(int(match.group(1)) - int(headers.get('Age', 0) or 0), 0)
+
+
+# Google's ID-token signing certificates, kept in memory so verifying a sign-in is CPU-only.
+# Fetches go through one long-lived session with an HTTP cache that honours Cache-Control,
+# and a background thread revalidates the certificates shortly before they expire.
+# A token signed with an unknown key id triggers at most one refetch per min_refetch seconds,
+# which picks up Google's key rotation without letting bad tokens hammer the endpoint.
+# If a refetch fails, the certificates already held keep being used until one succeeds.
+class GoogleCertCache:
+    def __init__(self, certs_url=GOOGLE_CERTS_URL, refresh_margin=300, retry_interval=30, min_refetch=60, timeout=10):
+        self.certs_url = certs_url
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.min_refetch = min_refetch
+        self.request = requests.Request(session=cachecontrol.CacheControl(http.Session()))
+        self.fetches = 0
+        self.failed_fetches = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._certs = None  # {'key id': PEM certificate} or a PyJWKSet
+        self._expires_at = 0
+        self._last_fetch = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='google-certs-refresh', daemon=True)
+            self._thread.start()
+
+    # revalidate=True bypasses the HTTP cache (a conditional request, usually a 304)
+    def fetch(self, revalidate=False):
+        headers = {'Cache-Control': 'no-cache'} if revalidate else None
+        with self._lock:
+            self.fetches += 1
+            self._last_fetch = time.monotonic()
+        try:
+            response = self.request(self.certs_url, method='GET', headers=headers, timeout=self.timeout)
+            if response.status != 200:
+                raise exceptions.TransportError(f"Could not fetch certificates at {self.certs_url}")
+        except Exception:
+            with self._lock:
+                self.failed_fetches += 1
+            raise
+        certs = json.loads(response.data.decode('utf-8'))
+        if 'keys' in certs:
+            certs = pyjwt.PyJWKSet.from_dict(certs)
+        with self._lock:
+            self._certs = certs
+            self._expires_at = time.monotonic() + _freshness(response.headers)
+        return certs
+
+    def _run(self):
+        while True:
+            try:
+                self.fetch(revalidate=True)
+                delay = max(self._expires_at - time.monotonic() - self.refresh_margin, self.retry_interval)
+            except Exception as e:
+                print(f"Error refreshing Google certificates: {e}")
+                delay = self.retry_interval
+            time.sleep(delay)
+
+    def certs(self):
+        with self._lock:
+            if self._certs is not None and time.monotonic() < self._expires_at:
+                self.hits += 1
+                return self._certs
+            self.misses += 1
+            stale = self._certs
+        try:
+            return self.fetch()
+        except Exception as e:
+            if stale is None:
+                raise
+            print(f"Error fetching Google certificates, using the expired ones: {e}")
+            return stale
+
+    @staticmethod
+    def _has_key(certs, kid):
+        if isinstance(certs, pyjwt.PyJWKSet):
+            return any(key.key_id == kid for key in certs.keys)
+        return kid in certs
+
+    # Verify a Google ID token like id_token.verify_oauth2_token; raises ValueError if invalid
+    def verify(self, token, audience, clock_skew_in_seconds=0):
+        try:
+            kid = pyjwt.get_unverified_header(token).get('kid')
+        except pyjwt.InvalidTokenError as e:
+            raise ValueError(f"Malformed token: {e}")
+        certs = self.certs()
+        if kid and not self._has_key(certs, kid) and time.monotonic() - self._last_fetch >= self.min_refetch:
+            try:
+                certs = self.fetch(revalidate=True)
+            except Exception as e:
+                print(f"Error refetching Google certificates for key {kid}: {e}")
+        if isinstance(certs, pyjwt.PyJWKSet):
+            signing_key = next((key for key in certs.keys if kid and key.key_id == kid), None)
+            if signing_key is None:
+                raise ValueError(f"Unable to find a signing key that matches: {kid}")
+            try:
+                id_info = pyjwt.decode(token, signing_key.key, algorithms=[signing_key.algorithm_name],
+                                       audience=audience, leeway=clock_skew_in_seconds)
+            except pyjwt.InvalidTokenError as e:
+                raise ValueError(str(e))
+        else:
+            id_info = google_jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=clock_skew_in_seconds)
+        if id_info.get('iss') not in GOOGLE_ISSUERS:
+            raise ValueError('Wrong issuer.')
+        return id_info
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'fetches': self.fetches,
+                'failed_fetches': self.failed_fetches,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'expires_in_seconds': max(self._expires_at - time.monotonic(), 0),
+            }
+
+
+GOOGLE_CERTS = GoogleCertCache()
+
+# Fetch the certificates in the background; sign-ins fetch them on demand until then
+STARTUP.stage('google_certs', GOOGLE_CERTS.start)
@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+import numpy as np
+
+
+# Micro-batching front for a model's predict.
+# Concurrent callers' rows are gathered for up to max_wait seconds (or until max_batch rows)
+# and run through one batched forward pass; each caller gets back its own rows.
+# predict() mirrors Keras' model.predict, so a scheduler can be passed wherever a model is.
+# A caller waits at most `timeout` seconds for its rows; rows it gave up on are not predicted.
+class InferenceScheduler:
+    def __init__(self, predict_batch, max_wait=0.005, max_batch=32, name='inference', timeout=30.0):
+        self.predict_batch = predict_batch
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.name = name
+        self.timeout = timeout
+        self.batches = 0
+        self.rows = 0
+        self.batch_sizes = {}  # batch size -> number of batches
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def predict(self, inputs, verbose=0):
+        inputs = np.asarray(inputs)
+        self._ensure_started()
+        futures = []
+        for row in inputs:
+            future = Future()
+            self._queue.put((time.monotonic(), row, future))
+            futures.append(future)
+        deadline = time.monotonic() + self.timeout
+        try:
+            return np.stack([future.result(timeout=max(deadline - time.monotonic(), 0)) for future in futures])
+        except TimeoutError:
+            for future in futures:
+                future.cancel()
+            raise TimeoutError(f"{self.name} prediction did not finish within {self.timeout}s") from None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"{self.name}-scheduler", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            requests = [self._queue.get()]
+            deadline = requests[0][0] + self.max_wait
+            while len(requests) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    requests.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._run_batch(requests)
+
+    def _run_batch(self, requests):
+        # Skip rows whose caller timed out; the rest can no longer be cancelled
+        requests = [request for request in requests if request[2].set_running_or_notify_cancel()]
+        if not requests:
+            return
+        started = time.monotonic()
+        try:
+            outputs = self.predict_batch(np.stack([row for _, row, _ in requests]))
+            if len(outputs) != len(requests):
+                # Which row is missing is unknown, so no output can be trusted to be the caller's
+                raise ValueError(f"{self.name} returned {len(outputs)} rows for a batch of {len(requests)}")
+        except Exception as e:
+            for _, _, future in requests:
+                future.set_exception(e)
+            return
+        for (_, _, future), output in zip(requests, outputs):
+            future.set_result(output)
+        with self._lock:
+            self.batches += 1
+            self.rows += len(requests)
+            self.batch_sizes[len(requests)] = self.batch_sizes.get(len(requests), 0) + 1
+            for enqueued, _, _ in requests:
+                delay = started - enqueued
+                self.queue_delay_total += delay
+                self.queue_delay_max = max(self.queue_delay_max, delay)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_wait_ms': self.max_wait * 1000,
+                'max_batch': self.max_batch,
+                'batches': self.batches,
+                'rows': self.rows,
+                'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'mean_queue_delay_ms': self.queue_delay_total / self.rows * 1000 if self.rows else 0.0,
+                'max_queue_delay_ms': self.queue_delay_max * 1000,
+            }
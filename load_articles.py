@@ -1,25 +1,143 @@
 from firebase import db
+import hashlib
+import os
 import pandas as pd
+from catalog import ArticleCatalog
+from fast_json import dumps
+from search_index import TitleSearchIndex, SortOrders
+from startup import STARTUP
+import shared_store
 
-# Global variable to store articles
-ARTICLES = []
+# Global columnar catalog of articles (reloaded in place so imported references stay valid).
+# ARTICLES[position] materializes one article as a dict, ARTICLES.rows_json encodes a list.
+ARTICLES = ArticleCatalog(fragment_cache_size=int(os.getenv('ARTICLE_FRAGMENT_CACHE_SIZE', 50000)))
+# Trigram index over article titles for /search
+TITLE_INDEX = TitleSearchIndex([])
+# Precomputed /search sort orders
+SORT_ORDERS = SortOrders([], [], [])
+# Bumped every time the catalog is (re)loaded
+CATALOG_VERSION = 0
+# Identifies the catalog's contents across workers and restarts: the shared store build id,
+# or a hash of the CSV
+CATALOG_FINGERPRINT = None
 
 
 # Function to fetch articles once FROM LOCAL CSV and store in global variable
 def initialize_articles():
-    global ARTICLES
+    global TITLE_INDEX, SORT_ORDERS, CATALOG_VERSION, CATALOG_FINGERPRINT
+    # Nothing is tagged for caching while the catalog is being swapped
+    CATALOG_FINGERPRINT = None
+    store = shared_store.SHARED_STORE
+    if store is not None and 'catalog' in store.metadata:
+        # Columns and search indexes are views into the memory-mapped store
+        ARTICLES.load_store(store)
+        TITLE_INDEX = TitleSearchIndex.from_store(store)
+        SORT_ORDERS = SortOrders.from_store(store)
+        CATALOG_VERSION += 1
+        CATALOG_FINGERPRINT = f"store:{store.build_id}"
+        return
     try:
         # Load articles from a local CSV file
+        with open('articles_selected_with_doi.csv', 'rb') as f:
+            fingerprint = hashlib.sha1(f.read()).hexdigest()
         df_articles = pd.read_csv('articles_selected_with_doi.csv')
 
-        # Convert the DataFrame to a list of dictionaries
-        ARTICLES = df_articles.to_dict(orient='records')
+        # Store the DataFrame's columns in the catalog
+        ARTICLES.load_frame(df_articles)
     except Exception as e:
         print(f"Error fetching articles: {e}")
-        ARTICLES = []
+        raise
+    titles = ARTICLES.column('title')
+    TITLE_INDEX = TitleSearchIndex(titles)
+    SORT_ORDERS = SortOrders(titles, ARTICLES.column('year'), ARTICLES.column('cited_by'))
+    CATALOG_VERSION += 1
+    CATALOG_FINGERPRINT = f"csv:{fingerprint}"
 
-# Call this function when the app starts
-initialize_articles()
+# Function to find an article's position in ARTICLES
+def find_article_position(article_id):
+    return ARTICLES.position(article_id)
+
+# Function to search the catalog for /search: titles containing the (lowercase) query,
+# optionally only articles whose index_keywords mention one of the (lowercase) categories,
+# then one page in the precomputed sort_by order (title if unknown), from start or after a cursor.
+# Returns (all matching positions, page positions, sort key used, cursor position or None)
+def search_catalog(query, categories=(), sort_by='title', start=0, per_page=20, after=0):
+    # Search articles by title through the trigram index
+    positions = TITLE_INDEX.search(query)
+
+    # Filter by categories
+    if categories:
+        keywords = ARTICLES.column('index_keywords', positions)
+        positions = [
+            position for position, keyword in zip(positions, keywords) if isinstance(keyword, str) and any(
+                cat in keyword.lower() for cat in categories
+            )
+        ]
+
+    # Sort and paginate by walking the precomputed order
+    if sort_by not in SORT_ORDERS.orders:
+        sort_by = 'title'
+    paginated_positions, next_after = [], None
+    if start >= 0:
+        paginated_positions, next_after = SORT_ORDERS.page(sort_by, positions, start, per_page, after)
+    return positions, paginated_positions, sort_by, next_after
+
+# Function to split article ids into the catalog positions of those found in the local catalog
+# (keyed by str(article_id)) and the distinct ids missing from it
+def find_catalog_articles(article_ids):
+    found = {}
+    missing = []
+    for article_id in article_ids:
+        key = str(article_id)
+        if key in found:
+            continue
+        position = find_article_position(article_id)
+        if position is not None:
+            found[key] = position
+        elif key not in missing:
+            missing.append(key)
+    return found, missing
+
+# Function to get articles by id in the given order, as catalog positions or, for ids missing
+# from the catalog, the article dicts read from Firestore with a single batched read.
+# Ids found in neither are skipped.
+def get_article_items_by_ids(article_ids):
+    found, missing = find_catalog_articles(article_ids)
+    if missing:
+        article_refs = [db.collection('articles').document(article_id) for article_id in missing]
+        for doc in db.get_all(article_refs):
+            if doc.exists:
+                found[doc.id] = doc.to_dict()
+    return [found[str(article_id)] for article_id in article_ids if str(article_id) in found]
+
+# Function to get articles by id as dicts, in the given order (see get_article_items_by_ids)
+def get_articles_by_ids(article_ids):
+    return [item if isinstance(item, dict) else ARTICLES[item] for item in get_article_items_by_ids(article_ids)]
+
+# Function to parse a fields= projection ("article_id,title,year") into a sorted tuple of
+# catalog columns, or None for whole articles. Raises ValueError naming unknown fields.
+def parse_fields(value):
+    if not value:
+        return None
+    fields = tuple(sorted({field.strip() for field in value.split(',') if field.strip()}))
+    unknown = [field for field in fields if field not in ARTICLES.names]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields or None
+
+# Function to encode articles (catalog positions or dicts, see get_article_items_by_ids) as a
+# JSON array. Catalog articles come from the cached fragments, dicts are encoded on the spot.
+def articles_json(items, fields=None):
+    parts = []
+    for item in items:
+        if isinstance(item, dict):
+            parts.append(dumps(item if fields is None else {field: item.get(field) for field in fields}))
+        else:
+            parts.append(ARTICLES.row_json(item, fields))
+    return b'[' + b','.join(parts) + b']'
+
+# Load the catalog in the background when the app starts
+STARTUP.stage('catalog', initialize_articles, depends=['shared_store'])
 
 # # Function to fetch articles once and store in global variable
 # def initialize_articles():
@@ -1,31 +1,73 @@
 from firebase import db
+import os
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
-import tensorflow as tf
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from dotenv import load_dotenv
+from startup import STARTUP
+import shared_store
+# Load environment variables from .env file
+load_dotenv()
+
+# 'keras' loads the .keras files with TensorFlow; 'numpy' serves the .npz exports
+# written by export_models.py and never imports TensorFlow
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'keras')
+MODEL_FILES = {
+    'keras': ('ContentBasedFilteringModel.keras', 'CollaborativeFilteringModel.keras'),
+    'numpy': ('ContentBasedFilteringModel.npz', 'CollaborativeFilteringModel.npz'),
+}
 
 # Variables to hold the models
 MODEL_CONTENT = None
 MODEL_COLLABORATIVE = None
+# Changes whenever the model files change, so cached results from older models miss
+MODEL_VERSION = None
 
 def load_models():
-    content_model_path = 'ContentBasedFilteringModel.keras'
-    collaborative_model_path = 'CollaborativeFilteringModel.keras'
+    content_model_path, collaborative_model_path = MODEL_FILES[MODEL_BACKEND]
+    store = shared_store.SHARED_STORE
     try:
-        # Load the .keras model
-        content_model = tf.keras.models.load_model(content_model_path)
-        collaborative_model = tf.keras.models.load_model(collaborative_model_path)        
+        if MODEL_BACKEND == 'numpy' and store is not None and 'models' in store.metadata:
+            # Weights are views into the memory-mapped store, shared by every worker
+            from numpy_models import NumpyModel
+            return tuple(
+                NumpyModel(store.metadata['models'][name], store.group(f"models/{name}"))
+                for name in ('content', 'collaborative')
+            )
+        if MODEL_BACKEND == 'numpy':
+            from numpy_models import NumpyModel
+            load_model = NumpyModel.load
+        else:
+            import tensorflow as tf
+            load_model = tf.keras.models.load_model
+        # Load the models
+        content_model = load_model(content_model_path)
+        collaborative_model = load_model(collaborative_model_path)
         # Assign the loaded model to the global variable
         MODEL_CONTENT = content_model
         MODEL_COLLABORATIVE = collaborative_model
-        print("Content model loaded successfully")
+        print(f"Models loaded successfully ({MODEL_BACKEND})")
         return MODEL_CONTENT,MODEL_COLLABORATIVE
     except Exception as e:
         print(f"Error loading content model: {e}")
 
-try:
-    MODEL_CONTENT,MODEL_COLLABORATIVE = load_models()
-except Exception as e:
-    print(f"Error loading models: {e}")
\ No newline at end of file
+# Function to derive the model version from the shared store build or the model files' modification times
+def model_version():
+    store = shared_store.SHARED_STORE
+    if MODEL_BACKEND == 'numpy' and store is not None and 'models' in store.metadata:
+        return f"store-{store.build_id}"
+    return '-'.join(str(int(os.path.getmtime(path))) if os.path.exists(path) else '0' for path in MODEL_FILES[MODEL_BACKEND])
+
+# Function to load the models into the global variables
+def initialize_models():
+    global MODEL_CONTENT, MODEL_COLLABORATIVE, MODEL_VERSION
+    models = load_models()
+    if models is None:
+        raise RuntimeError("Models could not be loaded")
+    MODEL_CONTENT,MODEL_COLLABORATIVE = models
+    MODEL_VERSION = model_version()
+
+# Load the models in the background when the app starts
+STARTUP.stage('models', initialize_models, depends=['shared_store'])
@@ -0,0 +1,218 @@
+from firebase import db
+import threading
+import numpy as np
+import pandas as pd
+from startup import STARTUP
+
+
+# Process-wide copy of the `ratings` and `users` collections.
+# Loaded once from the initial snapshot and kept current by Firestore
+# listeners, so recommenders never stream the collections per request.
+class RatingsStore:
+    def __init__(self, db, timeout=30):
+        self.db = db
+        self.timeout = timeout
+        self.version = 0
+        self._lock = threading.RLock()
+        self._ratings = {}  # rating doc id -> (user_id, article_id, article_rating)
+        self._rating_ids = {}  # (user_id, article_id) -> rating doc id
+        self._users = {}  # user doc id -> user document
+        self._user_emails = {}  # email -> set of user doc ids
+        self._views = {}
+        self._watches = []
+        self._subscribers = []
+        self._ratings_ready = threading.Event()
+        self._users_ready = threading.Event()
+
+    # Subscribe to both collections and block until their first snapshot arrived
+    def start(self):
+        self._watches.append(self.db.collection('ratings').on_snapshot(self._on_ratings_snapshot))
+        self._watches.append(self.db.collection('users').on_snapshot(self._on_users_snapshot))
+        if not (self._ratings_ready.wait(self.timeout) and self._users_ready.wait(self.timeout)):
+            raise TimeoutError("Initial ratings/users snapshot not received")
+
+    def stop(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+    # Register callback(old_rating, new_rating) for every rating change, where a rating is
+    # (user_id, article_id, article_rating) and None marks an insert or a removal.
+    # Existing ratings are replayed as inserts so the subscriber starts in sync.
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+            for rating in self._ratings.values():
+                callback(None, rating)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _on_ratings_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                self._apply_rating(doc.id, None if change.type.name == 'REMOVED' else doc.to_dict())
+            self._changed()
+        self._ratings_ready.set()
+
+    # Apply a rating write made by this process before Firestore confirms it, so the
+    # recommenders see it immediately. data=None applies a delete. The listener's later
+    # echo of the same write is then a no-op.
+    def apply_local(self, doc_id, data):
+        with self._lock:
+            self._apply_rating(doc_id, data)
+            self._changed()
+
+    # Updates are applied in place so a rating keeps its position, and with it the order
+    # the collaborative model encodes users in
+    def _apply_rating(self, doc_id, data):
+        old = self._ratings.get(doc_id)
+        if old is not None and self._rating_ids.get(old[:2]) == doc_id:
+            del self._rating_ids[old[:2]]
+        new = None if data is None else self._parse_rating(doc_id, data)
+        if new is not None:
+            self._ratings[doc_id] = new
+            self._rating_ids[new[:2]] = doc_id
+        elif old is not None:
+            del self._ratings[doc_id]
+        if old != new:
+            for callback in self._subscribers:
+                callback(old, new)
+
+    def _on_users_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                self._set_user(doc.id, None if change.type.name == 'REMOVED' else doc.to_dict())
+            self._changed()
+        self._users_ready.set()
+
+    def _set_user(self, doc_id, user):
+        old = self._users.get(doc_id)
+        if old is not None and old.get('email') in self._user_emails:
+            ids = self._user_emails[old['email']]
+            ids.discard(doc_id)
+            if not ids:
+                del self._user_emails[old['email']]
+        if user is None:
+            self._users.pop(doc_id, None)
+        else:
+            self._users[doc_id] = user
+            if user.get('email'):
+                self._user_emails.setdefault(user['email'], set()).add(doc_id)
+
+    # Apply an update this process made to a user document before the listener echoes it
+    def apply_local_user(self, doc_id, data):
+        with self._lock:
+            user = self._users.get(doc_id)
+            if user is not None:
+                self._set_user(doc_id, {**user, **data})
+                self._changed()
+
+    @staticmethod
+    def _parse_rating(doc_id, data):
+        try:
+            return data['user_id'], int(data['article_id']), int(data['article_rating'])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Skipping malformed rating {doc_id}: {e}")
+            return None
+
+    def _changed(self):
+        self.version += 1
+        self._views = {}
+
+    def _cached(self, name, build):
+        with self._lock:
+            if name not in self._views:
+                self._views[name] = build()
+            return self._views[name]
+
+    # Compact column view of all ratings: user codes into `user_ids`,
+    # article ids and ratings as typed arrays
+    def ratings_arrays(self):
+        return self._cached('arrays', self._build_arrays)
+
+    def _build_arrays(self):
+        user_ids = []
+        user_codes = {}
+        codes = np.empty(len(self._ratings), dtype=np.int32)
+        article_ids = np.empty(len(self._ratings), dtype=np.int64)
+        ratings = np.empty(len(self._ratings), dtype=np.int16)
+        for i, (user_id, article_id, rating) in enumerate(self._ratings.values()):
+            code = user_codes.get(user_id)
+            if code is None:
+                code = user_codes[user_id] = len(user_ids)
+                user_ids.append(user_id)
+            codes[i] = code
+            article_ids[i] = article_id
+            ratings[i] = rating
+        return {
+            'user_ids': user_ids,
+            'user_codes': codes,
+            'article_ids': article_ids,
+            'article_ratings': ratings,
+        }
+
+    # Ratings as a DataFrame (user_id, article_id, article_rating).
+    # Shared between callers until the next change, so treat it as read-only.
+    def ratings_frame(self):
+        return self._cached('ratings_frame', self._build_ratings_frame)
+
+    def _build_ratings_frame(self):
+        arrays = self.ratings_arrays()
+        return pd.DataFrame({
+            'user_id': np.array(arrays['user_ids'], dtype=object)[arrays['user_codes']],
+            'article_id': arrays['article_ids'],
+            'article_rating': arrays['article_ratings'].astype(int),
+        })
+
+    # Users as a DataFrame without the rated_articles lists. Read-only as above.
+    def users_frame(self):
+        return self._cached('users_frame', self._build_users_frame)
+
+    def _build_users_frame(self):
+        return pd.DataFrame([
+            {key: value for key, value in user.items() if key != 'rated_articles'}
+            for user in self._users.values()
+        ])
+
+    # Document id of the user's rating for an article, or None if not rated
+    def find_rating_id(self, user_id, article_id):
+        try:
+            key = (user_id, int(article_id))
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            return self._rating_ids.get(key)
+
+    # True once the first ratings snapshot arrived, i.e. find_rating_id is authoritative
+    def ratings_loaded(self):
+        return self._ratings_ready.is_set()
+
+    # True once the first users snapshot arrived, i.e. the email index is usable
+    def users_loaded(self):
+        return self._users_ready.is_set()
+
+    # (user doc id, user document) of the user with this email, or None. Like the
+    # `where('email', '==', email)` query it replaces, the lowest doc id wins if several match.
+    def find_user_by_email(self, email):
+        with self._lock:
+            ids = self._user_emails.get(email)
+            if not ids:
+                return None
+            user_id = min(ids)
+            return user_id, dict(self._users[user_id])
+
+    def get_user(self, user_id):
+        with self._lock:
+            user = self._users.get(user_id)
+            return dict(user) if user is not None else None
+
+
+RATINGS = RatingsStore(db)
+
+# Load ratings and users in the background when the app starts
+STARTUP.stage('ratings', RATINGS.start)
@@ -0,0 +1,320 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+# Load environment variables from .env file
+load_dotenv()
+
+# Request, per-stage and Firestore-operation metrics, served in the Prometheus text format at
+# /metrics (controller_health.py). Recording is a perf_counter() call, a bisect and a locked
+# increment, cheap enough to leave on in production; METRICS_ENABLED=0 turns it off.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000, 5000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+# Prometheus histogram with a fixed label set, e.g. Histogram('x', 'help', ['route'])
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for label_values, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                labels = _labels(self.label_names, label_values, [f'le="{_number(bound)}"'])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Request latency by route, method and status.', ['route', 'method', 'status'])
+STAGE_DURATION = Histogram(
+    'request_stage_duration_seconds', 'Time spent in one stage of a request.', ['route', 'stage'])
+FIRESTORE_READS = Histogram(
+    'firestore_document_reads_per_request', 'Firestore documents read per request (route "background" '
+    'for listeners and the rating queue).', ['route'], COUNT_BUCKETS)
+FIRESTORE_WRITES = Histogram(
+    'firestore_document_writes_per_request', 'Firestore documents written per request (route "background" '
+    'for listeners and the rating queue).', ['route'], COUNT_BUCKETS)
+HISTOGRAMS = [REQUEST_DURATION, STAGE_DURATION, FIRESTORE_READS, FIRESTORE_WRITES]
+
+
+# Stages and Firestore operations of the request being served
+class RequestMetrics:
+    def __init__(self, route):
+        self.route = route
+        self.reads = 0
+        self.writes = 0
+        self.spans = []  # (stage, seconds), in completion order
+
+CURRENT_REQUEST = ContextVar('request_metrics', default=None)
+
+
+def begin_request(route):
+    return CURRENT_REQUEST.set(RequestMetrics(route))
+
+
+# Record the finished request and return its metrics
+def end_request(token, method, status, duration):
+    current = CURRENT_REQUEST.get()
+    CURRENT_REQUEST.reset(token)
+    REQUEST_DURATION.observe(duration, current.route, method, str(status))
+    FIRESTORE_READS.observe(current.reads, current.route)
+    FIRESTORE_WRITES.observe(current.writes, current.route)
+    return current
+
+
+# Time a stage of the current request, e.g. `with span('collaborative.score'):`.
+# Outside a request the duration is recorded under route "background".
+@contextmanager
+def span(stage):
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        current = CURRENT_REQUEST.get()
+        if current is not None:
+            current.spans.append((stage, duration))
+        STAGE_DURATION.observe(duration, current.route if current is not None else 'background', stage)
+
+
+def _count(reads=0, writes=0):
+    current = CURRENT_REQUEST.get()
+    if current is not None:
+        current.reads += reads
+        current.writes += writes
+    elif METRICS_ENABLED:
+        FIRESTORE_READS.observe(reads, 'background')
+        FIRESTORE_WRITES.observe(writes, 'background')
+
+
+def render():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Proxies around the Firestore client that count document reads and writes against the
+# current request, as Firestore bills them: one read per document returned (at least one per
+# query), one write per set/update/delete. Everything else is passed through unchanged.
+class _Proxy:
+    def __init__(self, wrapped):
+        self._wrapped = wrapped
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+
+def _unwrap(reference):
+    return reference._wrapped if isinstance(reference, _Proxy) else reference
+
+
+class CountingDocumentReference(_Proxy):
+    def get(self, *args, **kwargs):
+        snapshot = self._wrapped.get(*args, **kwargs)
+        _count(reads=1)
+        return snapshot
+
+    def set(self, *args, **kwargs):
+        result = self._wrapped.set(*args, **kwargs)
+        _count(writes=1)
+        return result
+
+    def update(self, *args, **kwargs):
+        result = self._wrapped.update(*args, **kwargs)
+        _count(writes=1)
+        return result
+
+    def delete(self, *args, **kwargs):
+        result = self._wrapped.delete(*args, **kwargs)
+        _count(writes=1)
+        return result
+
+
+class CountingQuery(_Proxy):
+    def where(self, *args, **kwargs):
+        return CountingQuery(self._wrapped.where(*args, **kwargs))
+
+    def stream(self, *args, **kwargs):
+        count = 0
+        for snapshot in self._wrapped.stream(*args, **kwargs):
+            count += 1
+            yield snapshot
+        _count(reads=max(count, 1))
+
+    def get(self, *args, **kwargs):
+        snapshots = self._wrapped.get(*args, **kwargs)
+        _count(reads=max(len(snapshots), 1))
+        return snapshots
+
+
+class CountingCollectionReference(CountingQuery):
+    def document(self, *args, **kwargs):
+        return CountingDocumentReference(self._wrapped.document(*args, **kwargs))
+
+    # Listener snapshots are billed per changed document and arrive outside any request
+    def on_snapshot(self, callback):
+        def counted(docs, changes, read_time):
+            _count(reads=len(changes))
+            return callback(docs, changes, read_time)
+        return self._wrapped.on_snapshot(counted)
+
+
+class CountingWriteBatch(_Proxy):
+    def __init__(self, wrapped):
+        super().__init__(wrapped)
+        self._writes = 0
+
+    def set(self, reference, *args, **kwargs):
+        self._writes += 1
+        return self._wrapped.set(_unwrap(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        self._writes += 1
+        return self._wrapped.update(_unwrap(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self._writes += 1
+        return self._wrapped.delete(_unwrap(reference), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        result = self._wrapped.commit(*args, **kwargs)
+        _count(writes=self._writes)
+        return result
+
+
+class CountingFirestore(_Proxy):
+    def collection(self, *args, **kwargs):
+        return CountingCollectionReference(self._wrapped.collection(*args, **kwargs))
+
+    def batch(self, *args, **kwargs):
+        return CountingWriteBatch(self._wrapped.batch(*args, **kwargs))
+
+    def get_all(self, references, *args, **kwargs):
+        count = 0
+        for snapshot in self._wrapped.get_all([_unwrap(reference) for reference in references], *args, **kwargs):
+            count += 1
+            yield snapshot
+        _count(reads=count)
+
+
+# Function to wrap a Firestore client so its operations are counted (a no-op when disabled)
+def instrument_firestore(client):
+    return CountingFirestore(client) if METRICS_ENABLED else client
+
+
+# The same proxies for firestore.AsyncClient. Its calls run on the AsyncFirestore loop
+# thread, in a copy of the calling request's context, so they count against that request.
+class CountingAsyncDocumentReference(_Proxy):
+    async def get(self, *args, **kwargs):
+        snapshot = await self._wrapped.get(*args, **kwargs)
+        _count(reads=1)
+        return snapshot
+
+    async def set(self, *args, **kwargs):
+        result = await self._wrapped.set(*args, **kwargs)
+        _count(writes=1)
+        return result
+
+    async def update(self, *args, **kwargs):
+        result = await self._wrapped.update(*args, **kwargs)
+        _count(writes=1)
+        return result
+
+    async def delete(self, *args, **kwargs):
+        result = await self._wrapped.delete(*args, **kwargs)
+        _count(writes=1)
+        return result
+
+
+class CountingAsyncQuery(_Proxy):
+    def where(self, *args, **kwargs):
+        return CountingAsyncQuery(self._wrapped.where(*args, **kwargs))
+
+    async def stream(self, *args, **kwargs):
+        count = 0
+        async for snapshot in self._wrapped.stream(*args, **kwargs):
+            count += 1
+            yield snapshot
+        _count(reads=max(count, 1))
+
+    async def get(self, *args, **kwargs):
+        snapshots = await self._wrapped.get(*args, **kwargs)
+        _count(reads=max(len(snapshots), 1))
+        return snapshots
+
+
+class CountingAsyncCollectionReference(CountingAsyncQuery):
+    def document(self, *args, **kwargs):
+        return CountingAsyncDocumentReference(self._wrapped.document(*args, **kwargs))
+
+
+class CountingAsyncWriteBatch(CountingWriteBatch):
+    async def commit(self, *args, **kwargs):
+        result = await self._wrapped.commit(*args, **kwargs)
+        _count(writes=self._writes)
+        return result
+
+
+class CountingAsyncFirestore(_Proxy):
+    def collection(self, *args, **kwargs):
+        return CountingAsyncCollectionReference(self._wrapped.collection(*args, **kwargs))
+
+    def batch(self, *args, **kwargs):
+        return CountingAsyncWriteBatch(self._wrapped.batch(*args, **kwargs))
+
+    async def get_all(self, references, *args, **kwargs):
+        count = 0
+        async for snapshot in self._wrapped.get_all([_unwrap(reference) for reference in references], *args, **kwargs):
+            count += 1
+            yield snapshot
+        _count(reads=count)
+
+
+# Function to wrap a Firestore AsyncClient so its operations are counted (a no-op when disabled)
+def instrument_async_firestore(client):
+    return CountingAsyncFirestore(client) if METRICS_ENABLED else client
@@ -1,27 +1,123 @@
 from flask import request, jsonify
+import hashlib
+import inspect
 import jwt
 import os
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 from functools import wraps
 # Load environment variables from .env file
 load_dotenv()
 
+JWT_SECRET = os.getenv('JWT_SECRET')
+
+
+# Bounded LRU cache of verified token payloads, keyed by the token's SHA-256.
+# An entry never outlives the token's exp claim, so once a token expires the next request
+# verifies it again and gets the same error as without the cache. Tokens that fail
+# verification are never cached.
+class TokenCache:
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # token hash -> (expires_at, payload)
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    # Verified payload of the token, or None if it has to be verified
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            # jwt.decode rejects a token once exp <= now (in whole seconds)
+            if entry[0] <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token, payload):
+        expires_at = time.time() + self.ttl
+        if 'exp' in payload:
+            expires_at = min(expires_at, int(payload['exp']))
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+TOKEN_CACHE = TokenCache(
+    max_entries=int(os.getenv('JWT_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('JWT_CACHE_TTL', 300)),
+)
+
+# Function to verify the request's bearer token and attach its payload to request.user.
+# Returns an error response, or None if the token is valid.
+def authenticate():
+    token = request.headers.get('Authorization')
+    if not token:
+        return jsonify({'message': 'JWT token is missing!'}), 403
+    try:
+        token = token.split(" ")[1]  # Split "Bearer <JWT_TOKEN>"
+        data = TOKEN_CACHE.get(token)
+        if data is None:
+            data = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+            TOKEN_CACHE.put(token, data)
+        request.user = dict(data)  # Attach decoded user info to the request
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token is expired, your session has terminated!"}), 401
+    except jwt.DecodeError:
+        return jsonify({"error": "Failed to decode token"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid token"}), 401
+    return None
+
 def token_required(f):
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_async(*args, **kwargs):
+            error = authenticate()
+            if error is not None:
+                return error
+            return await f(*args, **kwargs)
+
+        return decorated_async
+
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'message': 'JWT token is missing!'}), 403
-        try:
-            token = token.split(" ")[1]  # Split "Bearer <JWT_TOKEN>"
-            data = jwt.decode(token, os.getenv('JWT_SECRET'), algorithms=["HS256"])
-            request.user = data  # Attach decoded user info to the request
-        except jwt.ExpiredSignatureError:
-            return jsonify({"error": "Token is expired, your session has terminated!"}), 401
-        except jwt.DecodeError:
-            return jsonify({"error": "Failed to decode token"}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({"error": "Invalid token"}), 401
+        error = authenticate()
+        if error is not None:
+            return error
         return f(*args, **kwargs)
 
-    return decorated
\ No newline at end of file
+    return decorated
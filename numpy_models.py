@@ -0,0 +1,169 @@
+import abc
+import json
+import numpy as np
+
+# Pure NumPy inference for the exported Keras models (see export_models.py).
+# Only the layer types our models use are implemented; loading anything else fails loudly
+# so a changed architecture is not silently served with wrong outputs.
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+    'tanh': np.tanh,
+    'softplus': lambda x: np.logaddexp(x, 0),
+    'elu': lambda x: np.where(x > 0, x, np.expm1(np.minimum(x, 0))),
+}
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS['softmax'] = _softmax
+
+
+def _activation(name):
+    if name not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation: {name}")
+    return ACTIVATIONS[name]
+
+
+class Layer(abc.ABC):
+    def __init__(self, name, config, weights):
+        self.name = name
+        self.config = config
+        self.weights = weights
+
+    def get_weights(self):
+        return list(self.weights)
+
+    @abc.abstractmethod
+    def __call__(self, inputs):
+        ...
+
+
+# Model inputs are fed straight into predict's values, so this only runs if an input is rewired
+class InputLayer(Layer):
+    def __call__(self, inputs):
+        return inputs
+
+
+class Dense(Layer):
+    def __call__(self, inputs):
+        outputs = inputs @ self.weights[0]
+        if self.config.get('use_bias', True):
+            outputs = outputs + self.weights[1]
+        return _activation(self.config.get('activation', 'linear'))(outputs)
+
+
+class Embedding(Layer):
+    def __call__(self, inputs):
+        return self.weights[0][np.asarray(inputs).astype(np.int64)]
+
+
+class Flatten(Layer):
+    def __call__(self, inputs):
+        return inputs.reshape(len(inputs), -1)
+
+
+class Dropout(Layer):
+    def __call__(self, inputs):
+        return inputs
+
+
+class Activation(Layer):
+    def __call__(self, inputs):
+        return _activation(self.config['activation'])(inputs)
+
+
+class Concatenate(Layer):
+    def __call__(self, inputs):
+        return np.concatenate(inputs, axis=self.config.get('axis', -1))
+
+
+class Add(Layer):
+    def __call__(self, inputs):
+        return sum(inputs[1:], inputs[0])
+
+
+class Multiply(Layer):
+    def __call__(self, inputs):
+        outputs = inputs[0]
+        for other in inputs[1:]:
+            outputs = outputs * other
+        return outputs
+
+
+class Dot(Layer):
+    def __call__(self, inputs):
+        left, right = inputs
+        if self.config.get('normalize'):
+            left = left / np.linalg.norm(left, axis=-1, keepdims=True)
+            right = right / np.linalg.norm(right, axis=-1, keepdims=True)
+        return np.sum(left * right, axis=-1, keepdims=True)
+
+
+class BatchNormalization(Layer):
+    def __call__(self, inputs):
+        names = []
+        if self.config.get('scale', True):
+            names.append('gamma')
+        if self.config.get('center', True):
+            names.append('beta')
+        params = dict(zip(names, self.weights))
+        mean, variance = self.weights[len(names)], self.weights[len(names) + 1]
+        outputs = (inputs - mean) / np.sqrt(variance + self.config.get('epsilon', 1e-3))
+        return outputs * params.get('gamma', 1.0) + params.get('beta', 0.0)
+
+
+LAYER_TYPES = {cls.__name__: cls for cls in (
+    InputLayer, Dense, Embedding, Flatten, Dropout, Activation, Concatenate, Add, Multiply, Dot, BatchNormalization,
+)}
+
+
+# A Keras model graph evaluated with NumPy.
+# Exposes predict, input_shape, layers and get_layer like the Keras model it was exported from.
+class NumpyModel:
+    def __init__(self, architecture, weights):
+        self.layers = []
+        self._inbound = {}
+        for spec in architecture['layers']:
+            if spec['class_name'] not in LAYER_TYPES:
+                raise ValueError(f"Unsupported layer type: {spec['class_name']}")
+            layer_weights = [weights[f"{spec['name']}/{i}"] for i in range(spec['num_weights'])]
+            self.layers.append(LAYER_TYPES[spec['class_name']](spec['name'], spec['config'], layer_weights))
+            self._inbound[spec['name']] = spec['inbound']
+        self.input_names = architecture['inputs']
+        self.output_names = architecture['outputs']
+        self.input_shapes = [tuple(shape) for shape in architecture['input_shapes']]
+        self.input_shape = self.input_shapes[0] if len(self.input_names) == 1 else self.input_shapes
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            architecture = json.loads(str(data['architecture']))
+            weights = {key: data[key] for key in data.files if key != 'architecture'}
+        return cls(architecture, weights)
+
+    def get_layer(self, name):
+        for layer in self.layers:
+            if layer.name == name:
+                return layer
+        raise ValueError(f"No such layer: {name}")
+
+    def predict(self, inputs, verbose=0):
+        if len(self.input_names) == 1 and not isinstance(inputs, (list, tuple)):
+            inputs = [inputs]
+        values = {}
+        for name, value in zip(self.input_names, inputs):
+            value = np.asarray(value, dtype=np.float32)
+            values[name] = value.reshape(-1, 1) if value.ndim == 1 else value
+        for layer in self.layers:
+            if layer.name in values:
+                continue
+            args = [values[name] for name in self._inbound[layer.name]]
+            values[layer.name] = layer(args if len(args) > 1 else args[0])
+        outputs = [values[name].astype(np.float32) for name in self.output_names]
+        return outputs[0] if len(outputs) == 1 else outputs
@@ -5,12 +5,43 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
 from load_articles import ARTICLES
-from load_models import MODEL_COLLABORATIVE
+from load_ratings import RATINGS
+import load_models
+from collaborative_scorer import CollaborativeScorer
+from startup import STARTUP
+import shared_store
+from metrics import span
+
+# Max abs difference from MODEL_COLLABORATIVE.predict tolerated for the NumPy scorer
+SCORER_TOLERANCE = 1e-4
+
+# Extract the embedding and dense weights once so requests skip Keras entirely
+COLLABORATIVE_SCORER = None
+
+def initialize_collaborative_scorer():
+    global COLLABORATIVE_SCORER
+    try:
+        store = shared_store.SHARED_STORE
+        if store is not None and 'scorer' in store.metadata:
+            scorer = CollaborativeScorer.from_store(store)
+        else:
+            scorer = CollaborativeScorer.from_keras_model(load_models.MODEL_COLLABORATIVE)
+        parity_error = scorer.check_parity(load_models.MODEL_COLLABORATIVE)
+        if parity_error > SCORER_TOLERANCE:
+            print(f"Collaborative scorer differs from model.predict by {parity_error}, falling back to predict")
+            COLLABORATIVE_SCORER = None
+        else:
+            COLLABORATIVE_SCORER = scorer
+    except Exception as e:
+        print(f"Error building collaborative scorer: {e}")
+        COLLABORATIVE_SCORER = None
+
+STARTUP.stage('collaborative_scorer', initialize_collaborative_scorer, depends=['models'])
 
 
 # Function to create article encoding
 def create_articles_encoding():
-    article_ids = [article['article_id'] for article in ARTICLES]
+    article_ids = ARTICLES.column('article_id').tolist()
     article2article_encoded = {article_id: idx for idx, article_id in enumerate(article_ids)}
     return article2article_encoded, len(article_ids)
 
@@ -87,72 +118,71 @@ def fetch_and_create_users_encoding():
 #         print(f"Error recommending articles: {e}")
 #         return []
 
-def recommend_articles(user_id, num_recommendations=12):
+# Function to recommend articles as catalog positions, for responses built from JSON fragments
+def recommend_article_positions(user_id, num_recommendations=12):
     try:
-        df_article = pd.DataFrame(ARTICLES)
-        ratings_ref = db.collection("ratings").stream()
-        df_rating = pd.DataFrame([doc.to_dict() for doc in ratings_ref])
-        df_rating['article_id']=df_rating['article_id'].astype(int)
-        df_rating['article_rating']=df_rating['article_rating'].astype(int)
-        users_ref = db.collection("users").stream()
-        df_user = pd.DataFrame([{key: value for key, value in doc.to_dict().items() if key != 'rated_articles'} for doc in users_ref])
-
-        # Merge ratings with articles and users for better context
-        merged_df = pd.merge(df_rating, df_article, on='article_id')
-        merged_df = pd.merge(merged_df, df_user, on='user_id')
-        # print("merged_df ===>",merged_df)
-        # Encode user_id and article_id
-        user_ids = merged_df['user_id'].unique().tolist()
-        article_ids = merged_df['article_id'].unique().tolist()
-
-        user2user_encoded = {x: i for i, x in enumerate(user_ids)}
-        article2article_encoded = {x: i for i, x in enumerate(article_ids)}
-
+        with span('collaborative.ratings'):
+            ratings = RATINGS.ratings_arrays()
+            rating_user_ids = np.array(ratings['user_ids'], dtype=object)
+            rating_article_ids = ratings['article_ids']
+            df_user = RATINGS.users_frame()
+            known_users = df_user['user_id'].to_numpy() if 'user_id' in df_user else []
+
+            # Keep ratings of catalog articles by known users (what merging the frames used to do)
+            keep = np.isin(rating_article_ids, ARTICLES.column('article_id'))
+            keep &= np.isin(rating_user_ids, known_users)[ratings['user_codes']]
+        with span('collaborative.encode'):
+            # Encode user_id and article_id in order of first appearance
+            user_codes = ratings['user_codes'][keep]
+            user_ids = rating_user_ids[pd.unique(user_codes)].tolist()
+            article_ids = pd.unique(rating_article_ids[keep])
+
+            user2user_encoded = {x: i for i, x in enumerate(user_ids)}
+            article2article_encoded = {x: i for i, x in enumerate(article_ids.tolist())}
 
-        
-        
-        # print("user_id ====>",user_id)
-        # user2user_encoded, users = fetch_and_create_users_encoding()
-        # if user_id not in user2user_encoded:
-        #     return "User ID not found in the database."
         if user_id in user2user_encoded:
             # User is found in the database
-            user_encoded = user2user_encoded[user_id]
-            user_ratings = df_rating[df_rating['user_id'] == user_id]
-            rated_article_ids = user_ratings['article_id'].tolist()
-            rated_article_indices = [article2article_encoded[article_id] for article_id in rated_article_ids]
-            # Generate article IDs for prediction
-            article_ids = np.array(list(article2article_encoded.keys()))
-            article_indices = np.array(list(article2article_encoded.values()))
-            # print("user2user_encoded ====>",user2user_encoded)
-            # print("article_ids ===>", article_ids)
-            # print("rated_article_indices ===>", article_indices)
-            # Filter out already rated articles
-            mask = np.isin(article_indices, rated_article_indices, invert=True)
-            article_ids = article_ids[mask]
-            article_indices = article_indices[mask]
-            # print("mask ===>", mask)
-
-
-            user_array = np.full(len(article_ids), user_encoded)
-            prediction_input = [user_array, article_indices]
-
-            # print("prediction_input ===>", prediction_input)
-
-            # Get model predictions
-            ratings_pred = MODEL_COLLABORATIVE.predict(prediction_input).flatten()
-
-            # Sort predictions and get top recommendations
-            top_indices = ratings_pred.argsort()[-num_recommendations:][::-1]
+            with span('collaborative.candidates'):
+                user_encoded = user2user_encoded[user_id]
+                user_mask = rating_user_ids[ratings['user_codes']] == user_id
+                rated_article_indices = [article2article_encoded[article_id] for article_id in rating_article_ids[user_mask].tolist()
+                                         if article_id in article2article_encoded]
+                # Generate article IDs for prediction and filter out already rated articles
+                article_indices = np.arange(len(article_ids))
+                mask = np.isin(article_indices, rated_article_indices, invert=True)
+                article_ids = article_ids[mask]
+                article_indices = article_indices[mask]
+
+            with span('collaborative.score'):
+                if COLLABORATIVE_SCORER is not None:
+                    # Score every candidate with one vectorized pass and take the top k
+                    top_indices = COLLABORATIVE_SCORER.top_k(user_encoded, article_indices, num_recommendations)
+                else:
+                    user_array = np.full(len(article_ids), user_encoded)
+                    prediction_input = [user_array, article_indices]
+
+                    # Get model predictions
+                    ratings_pred = load_models.MODEL_COLLABORATIVE.predict(prediction_input).flatten()
+
+                    # Sort predictions and get top recommendations
+                    top_indices = ratings_pred.argsort()[-num_recommendations:][::-1]
             top_article_ids = article_ids[top_indices]
-            top_articles = df_article[df_article['article_id'].isin(top_article_ids)].sort_values(by='cited_by', ascending=False)
         else:
             # User not found, recommend top-rated articles overall
-            avg_ratings = df_rating.groupby('article_id')['article_rating'].mean().sort_values(ascending=False)
-            top_article_ids = avg_ratings.index[:num_recommendations+1].tolist()
-            top_articles = df_article[df_article['article_id'].isin(top_article_ids)].sort_values(by='cited_by', ascending=False)
-
-        return top_articles.to_dict(orient='records')
+            with span('collaborative.top_rated'):
+                rated_ids, inverse = np.unique(rating_article_ids, return_inverse=True)
+                sums = np.bincount(inverse, weights=ratings['article_ratings'], minlength=len(rated_ids))
+                counts = np.bincount(inverse, minlength=len(rated_ids))
+                avg_order = np.argsort(-(sums / np.maximum(counts, 1)), kind='stable')
+                top_article_ids = rated_ids[avg_order[:num_recommendations+1]]
+
+        # Sort recommended articles by 'cited_by' in descending order
+        with span('collaborative.sort'):
+            return ARTICLES.sort_positions(ARTICLES.positions_of(top_article_ids), 'cited_by', descending=True).tolist()
     except Exception as e:
         print(f"Error recommending articles: {e}")
-        return []
\ No newline at end of file
+        return []
+
+# Function to recommend articles as dictionaries
+def recommend_articles(user_id, num_recommendations=12):
+    return ARTICLES.rows(recommend_article_positions(user_id, num_recommendations))
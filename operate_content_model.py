@@ -1,87 +1,134 @@
 from firebase import db
+import os
 import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
-from load_articles import ARTICLES
-from load_models import MODEL_CONTENT
+from load_articles import ARTICLES, find_article_position
+from load_ratings import RATINGS
+import load_models
+from similarity_index import SimilarityIndex, documents_fingerprint, keyword_documents
+from user_article_matrix import UserArticleMatrix
+from inference_scheduler import InferenceScheduler
+from startup import STARTUP
+import shared_store
+from metrics import span
 
+# Optional .npz file to persist the similarity index between restarts
+SIMILARITY_INDEX_PATH = os.getenv('SIMILARITY_INDEX_PATH')
+SIMILARITY_NEIGHBORS = 20
 
-# Function to fetch index_keywords from articles collection
+
+# Function to fetch index_keywords from articles collection.
+# Returns one document per article so rows line up with ARTICLES positions.
 def fetch_index_keywords():
     try:
-        index_keywords_list = []
-
-        for article in ARTICLES:
-            index_keywords = article.get('index_keywords', [])
-            if isinstance(index_keywords, list):
-                # Flatten nested lists and convert non-string elements to strings
-                index_keywords_list.extend([str(keyword) for sublist in index_keywords for keyword in sublist])
-            elif isinstance(index_keywords, str):
-                # If index_keywords is already a string, append it directly
-                index_keywords_list.append(index_keywords)
-
-        return index_keywords_list
-
+        return keyword_documents(ARTICLES.column('index_keywords'))
     except Exception as e:
         print(f"Error fetching index_keywords: {e}")
         return []
 
-# Fetch index keywords and create TF-IDF matrix and cosine similarity matrix
-try:
-    index_keywords = fetch_index_keywords()
-    tfidf_vectorizer = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf_vectorizer.fit_transform(index_keywords)
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
-except Exception as e:
-    print(f"Error in tfidf: {e}")
+# Function to load the similarity index from disk, or build it from the TF-IDF matrix
+def load_similarity_index(index_keywords, tfidf_matrix):
+    fingerprint = documents_fingerprint(index_keywords)
+    if SIMILARITY_INDEX_PATH and os.path.exists(SIMILARITY_INDEX_PATH):
+        try:
+            index = SimilarityIndex.load(SIMILARITY_INDEX_PATH)
+            if index.fingerprint == fingerprint:
+                return index
+        except Exception as e:
+            print(f"Error loading similarity index: {e}")
+    index = SimilarityIndex.build(tfidf_matrix, k=SIMILARITY_NEIGHBORS, fingerprint=fingerprint)
+    if SIMILARITY_INDEX_PATH:
+        index.save(SIMILARITY_INDEX_PATH)
+    return index
+
+# Fetch index keywords and create TF-IDF matrix and top-k similarity index
+SIMILARITY_INDEX = None
+
+def initialize_similarity_index():
+    global SIMILARITY_INDEX
+    try:
+        index_keywords = fetch_index_keywords()
+        store = shared_store.SHARED_STORE
+        if store is not None and 'similarity' in store.metadata:
+            # Neighbor rows are views into the memory-mapped store
+            index = SimilarityIndex.from_store(store)
+            if index.fingerprint == documents_fingerprint(index_keywords):
+                SIMILARITY_INDEX = index
+                return
+            print("Similarity index in the shared store does not match the catalog, rebuilding")
+        tfidf_vectorizer = TfidfVectorizer(stop_words='english')
+        tfidf_matrix = tfidf_vectorizer.fit_transform(index_keywords)
+        SIMILARITY_INDEX = load_similarity_index(index_keywords, tfidf_matrix)
+    except Exception as e:
+        print(f"Error in tfidf: {e}")
+        raise
+
+STARTUP.stage('similarity_index', initialize_similarity_index, depends=['catalog'])
 
 
+# Function to get the catalog positions of the articles most similar to the one at `position`
+def similar_article_positions(position, num_recommendations=10):
+    article_indices, _ = SIMILARITY_INDEX.similar(position, num_recommendations)
+    return [int(index) for index in article_indices]
+
 # Function to get article recommendations based on article id
-def get_recommendations_legacy(article_id, cosine_sim):
+def get_recommendations_legacy(article_id, num_recommendations=10):
     try:
-        articles_df = pd.DataFrame(ARTICLES)
-
-        if articles_df.empty:
+        if not ARTICLES:
             return "No articles found in the database."
 
-        if 'article_id' not in articles_df.columns:
-            return "The articles DataFrame does not contain 'article_id' column."
-
-        idx = articles_df[articles_df['article_id'] == article_id].index[0]
-        sim_scores = list(enumerate(cosine_sim[idx]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        sim_scores = sim_scores[1:11]
+        idx = find_article_position(article_id)
+        if idx is None:
+            return "Article ID not found in the database."
 
-        article_indices = [i[0] for i in sim_scores]
-        recommended_articles = articles_df.iloc[article_indices]
+        return ARTICLES.rows(similar_article_positions(idx, num_recommendations))
 
-        return recommended_articles.to_dict(orient='records')
-
-    except IndexError:
-        return "Article ID not found in the database."
     except Exception as e:
         print(f"Error getting recommendations: {e}")
         return []
 
-# Function to get user ratings from Firestore
+# Function to get user ratings from the in-memory ratings store
 def fetch_ratings():
     try:
-        ratings_ref = db.collection('ratings')
-        docs = ratings_ref.stream()
-        ratings = []
-
-        for doc in docs:
-            data = doc.to_dict()
-            ratings.append(data)
-
-        return ratings
+        return RATINGS.ratings_frame().to_dict(orient='records')
 
     except Exception as e:
         print(f"Error fetching ratings: {e}")
         return []
 
+# Function to get the content model's expected input width from the model itself
+def content_model_width(model):
+    try:
+        return int(model.input_shape[-1])
+    except Exception as e:
+        print(f"Error reading content model input shape: {e}")
+        return len(ARTICLES)
+
+# Sparse user x article ratings, kept current by the ratings store
+USER_ARTICLE_MATRIX = None
+
+def initialize_user_article_matrix():
+    global USER_ARTICLE_MATRIX
+    matrix = UserArticleMatrix(find_article_position, content_model_width(load_models.MODEL_CONTENT))
+    RATINGS.subscribe(matrix.on_rating_change)
+    # Rebuilt when a new shared store is published, since article positions may have moved
+    if USER_ARTICLE_MATRIX is not None:
+        RATINGS.unsubscribe(USER_ARTICLE_MATRIX.on_rating_change)
+    USER_ARTICLE_MATRIX = matrix
+
+STARTUP.stage('user_article_matrix', initialize_user_article_matrix, depends=['catalog', 'models'])
+
+# Batches concurrent content-model predictions into one forward pass
+CONTENT_SCHEDULER = InferenceScheduler(
+    lambda batch: load_models.MODEL_CONTENT.predict(batch, verbose=0),
+    max_wait=float(os.getenv('INFERENCE_MAX_WAIT_MS', 5)) / 1000,
+    max_batch=int(os.getenv('INFERENCE_MAX_BATCH', 32)),
+    name='content-model',
+    timeout=float(os.getenv('INFERENCE_TIMEOUT_S', 30)),
+)
+
 # Function to recommend articles for a user based on ratings and content
 def recommend_for_user_legacy(user_id):
     try:
@@ -93,7 +140,7 @@ def recommend_for_user_legacy(user_id):
 
         for rating in ratings:
             user_idx = user_index_mapping.get(rating['user_id'])
-            article_idx = next((idx for idx, article in enumerate(articles) if article['article_id'] == rating['article_id']), None)
+            article_idx = find_article_position(rating['article_id'])
             if user_idx is not None and article_idx is not None:
                 user_article_matrix[user_idx, article_idx] = rating['article_rating']
 
@@ -102,7 +149,7 @@ def recommend_for_user_legacy(user_id):
         if user_ratings:
             # 
             top_rated_article_id = max(user_ratings, key=lambda x: x['article_rating'])['article_id']
-            similar_articles = get_recommendations_legacy(top_rated_article_id, cosine_sim)
+            similar_articles = get_recommendations_legacy(top_rated_article_id)
             similar_articles = [article for article in similar_articles if article['article_id'] not in [rating['article_id'] for rating in user_ratings]]
             similar_articles = sorted(similar_articles, key=lambda x: x.get('cited_by', 0), reverse=True)
 
@@ -110,7 +157,7 @@ def recommend_for_user_legacy(user_id):
 
         else:
             # untested
-            predicted_ratings = MODEL_CONTENT.predict(user_article_matrix)
+            predicted_ratings = load_models.MODEL_CONTENT.predict(user_article_matrix)
             recommended_article_indices = np.argsort(predicted_ratings)[::-1][:10]
             recommended_articles = [articles[i] for i in recommended_article_indices]
             recommended_articles = sorted(recommended_articles, key=lambda x: x.get('cited_by', 0), reverse=True)
@@ -121,103 +168,62 @@ def recommend_for_user_legacy(user_id):
         print(f"Error recommending articles for user {user_id}: {e}")
         return []
 
-def recommend_for_user(user_id, subject_area, model=MODEL_CONTENT, num_recommendations=10):
+def recommend_positions_for_user(user_id, subject_area, model=CONTENT_SCHEDULER, num_recommendations=10):
     """
     Recommend articles for a given user based on their ratings and article content.
 
     Parameters:
     - user_id: int, the ID of the user for whom to recommend articles.
-    - model: keras model, trained model for predicting user preferences.
+    - model: keras model (or scheduler wrapping one), trained model for predicting user preferences.
     - num_recommendations: int, the number of articles to recommend.
 
     Returns:
-    - DataFrame: DataFrame containing the recommended articles.
+    - list: the catalog positions of the recommended articles.
     """
 
-    articles = pd.DataFrame(ARTICLES)
-    ratings = pd.DataFrame(fetch_ratings())
-    ratings['article_id']=ratings['article_id'].astype(int)
-    ratings['article_rating']=ratings['article_rating'].astype(int)
-    articles_ratings = pd.merge(
-        ratings, articles,
-        on='article_id',
-        how='inner',  # Ensure only matched entries are included
-        suffixes=('_rating', '_info')  # Rename conflicting columns if any
-    )
-    # print(articles_ratings)
-    ratings_aggregated = ratings.groupby(['user_id', 'article_id']).agg({'article_rating': 'mean'}).reset_index()
-    user_article_matrix = ratings_aggregated.pivot(index='user_id', columns='article_id', values='article_rating').fillna(0)
-    # Desired shape
-    num_users = 2968
-    num_articles = 2494
-    # Ensure the DataFrame has the correct number of users (rows)
-    current_num_users = user_article_matrix.shape[0]
-    if current_num_users < num_users:
-        additional_users = pd.DataFrame(0.0, index=np.arange(num_users - current_num_users), columns=user_article_matrix.columns)
-        user_article_matrix = pd.concat([user_article_matrix, additional_users], ignore_index=False)
-
-
-    # Ensure the DataFrame has the correct number of articles (columns)
-    current_num_articles = user_article_matrix.shape[1]
-    if current_num_articles < num_articles:
-        additional_articles = pd.DataFrame(0.0, index=user_article_matrix.index, columns=np.arange(num_articles - current_num_articles))
-        user_article_matrix = pd.concat([user_article_matrix, additional_articles], axis=1)
-    
-    # print("user_article_matrix_changed_col===>",user_article_matrix)
-
-    user_index_mapping = {user_id: idx for idx, user_id in enumerate(user_article_matrix.index)}
-    # print("user_index_mapping ===>",user_index_mapping)
-    # print("user_id ===>",user_id)
-
-    if user_id in user_index_mapping:
-        # Existing user logic
-        user_idx = user_index_mapping[user_id]
-        user_vector = user_article_matrix.iloc[user_idx].values.reshape(1, -1)  # Ensure input shape matches model expectation
-        # print("articles ===>\n",articles)
-
-        # print("user_article_matrix ===>\n",user_article_matrix)
-        # print("Shape of user_article_matrix:", user_article_matrix.shape)
-        # print("user_index_mapping ===>",user_index_mapping)
-        # print("user_idx ===>",user_idx)
-        # print("user_vector ===>",user_vector)
-        predicted_ratings = model.predict(user_vector)
-        recommended_articles_indices = np.argsort(predicted_ratings[0])[::-1]
-
-        # Get articles rated by the user
-        user_ratings = articles_ratings[articles_ratings['user_id'] == user_id]
+    num_articles = len(ARTICLES)
 
-        # Filter out articles already rated by the user
-        rated_article_ids = user_ratings['article_id'].tolist()
-        recommended_articles = articles[~articles['article_id'].isin(rated_article_ids)]
-
-
-        # Sort recommended articles by predicted ratings
-        recommended_articles = recommended_articles.iloc[recommended_articles_indices[:num_recommendations]]
+    if USER_ARTICLE_MATRIX.has_user(user_id):
+        # Existing user logic
+        with span('content.predict'):
+            user_vector = USER_ARTICLE_MATRIX.user_vector(user_id)  # Width matches the model input
+            predicted_ratings = model.predict(user_vector)
+        with span('content.rank'):
+            recommended_articles_indices = np.argsort(predicted_ratings[0])[::-1]
+            recommended_articles_indices = recommended_articles_indices[recommended_articles_indices < num_articles]
+
+            # Filter out articles already rated by the user, keeping the predicted order
+            rated_positions = USER_ARTICLE_MATRIX.user_columns(user_id)
+            recommended_articles_indices = recommended_articles_indices[
+                np.isin(recommended_articles_indices, rated_positions, invert=True)
+            ][:num_recommendations]
 
         # Sort recommended articles by 'cited_by' in descending order
-        recommended_articles = recommended_articles.sort_values(by='cited_by', ascending=False)
-
-        # Convert DataFrame to list of dictionaries
-        recommended_articles_dict = pd.DataFrame(recommended_articles).head(num_recommendations).to_dict(orient='records')
-        return recommended_articles_dict
+        with span('content.sort'):
+            return ARTICLES.sort_positions(recommended_articles_indices, 'cited_by', descending=True).tolist()
     else:
         # New user logic
-        user_vector = np.zeros((1, user_article_matrix.shape[1]))  # Use a zero vector for new users
-        predicted_ratings = model.predict(user_vector)
-        recommended_articles_indices = np.argsort(predicted_ratings[0])[::-1]
-
-        recommended_articles = articles.iloc[recommended_articles_indices]
+        with span('content.predict'):
+            user_vector = np.zeros((1, USER_ARTICLE_MATRIX.width))  # Use a zero vector for new users
+            predicted_ratings = model.predict(user_vector)
+        with span('content.rank'):
+            recommended_articles_indices = np.argsort(predicted_ratings[0])[::-1]
+            recommended_articles_indices = recommended_articles_indices[recommended_articles_indices < num_articles]
 
         # Filter articles based on subject_area in index_keywords
-        subject_area_pattern = fr'\b{subject_area}\b'
-        filtered_articles = recommended_articles[recommended_articles['index_keywords'].str.contains(subject_area_pattern, case=False, na=False, regex=True)]
+        with span('content.subject_filter'):
+            subject_area_pattern = fr'\b{subject_area}\b'
+            matches = pd.Series(ARTICLES.column('index_keywords')).str.contains(subject_area_pattern, case=False, na=False, regex=True).to_numpy()
+            filtered_indices = recommended_articles_indices[matches[recommended_articles_indices]]
 
-        if filtered_articles.empty:
+        if not len(filtered_indices):
             return []
-        elif len(filtered_articles) > num_recommendations:
-            filtered_articles[:num_recommendations]
-            
+
         # Sort recommended articles by 'cited_by' in descending order
-        filtered_articles = filtered_articles.sort_values(by='cited_by', ascending=False)
+        with span('content.sort'):
+            positions = ARTICLES.sort_positions(filtered_indices, 'cited_by', descending=True)
+            return positions[:num_recommendations].tolist()
 
-        return filtered_articles.head(num_recommendations).to_dict(orient='records')
+# Function to recommend articles for a user as dictionaries (see recommend_positions_for_user)
+def recommend_for_user(user_id, subject_area, model=CONTENT_SCHEDULER, num_recommendations=10):
+    return ARTICLES.rows(recommend_positions_for_user(user_id, subject_area, model, num_recommendations))
@@ -0,0 +1,213 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import jwt
+from collections import Counter
+from dotenv import load_dotenv
+
+from startup import STARTUP
+# Load environment variables from .env file
+load_dotenv()
+
+# Secret an admin signs X-Profile tokens with (see controller_profiling.py); unset disables
+# on-demand profiling. Kept apart from JWT_SECRET so user tokens can never turn it on.
+PROFILE_SECRET = os.getenv('PROFILE_SECRET')
+# Where request profiles and continuous samples are written
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+# Continuous sampling of the hot paths: milliseconds between samples (0 disables) and
+# seconds between the files it writes
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 0))
+PROFILE_FLUSH_SECONDS = float(os.getenv('PROFILE_FLUSH_SECONDS', 60))
+# Bounds of a request sampler's interval_ms: shorter would busy-spin the sampler thread
+# against the request it profiles, longer would hardly sample anything
+MIN_SAMPLE_INTERVAL_MS = 0.5
+MAX_SAMPLE_INTERVAL_MS = 100
+# Functions whose stacks the continuous sampler keeps
+HOT_PATHS = {'recommend_article_positions', 'recommend_positions_for_user', 'similar_article_positions',
+             'get_recommendations_legacy', 'search_catalog', 'articles_json'}
+
+
+# Stack of a frame as "file:function;file:function;..." from the outermost call inward,
+# one line of the collapsed format flamegraph.pl and speedscope read
+def collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _on_hot_path(frame):
+    while frame is not None:
+        if frame.f_code.co_name in HOT_PATHS:
+            return True
+        frame = frame.f_back
+    return False
+
+
+# Claims of a valid X-Profile token, e.g. {'profiler': 'sample', 'interval_ms': 1}.
+# Raises jwt.InvalidTokenError if it is not signed with PROFILE_SECRET or has expired.
+def verify_profile_token(token):
+    if not PROFILE_SECRET:
+        raise jwt.InvalidTokenError("Profiling is disabled")
+    return jwt.decode(token, PROFILE_SECRET, algorithms=["HS256"], options={'require': ['exp']})
+
+
+# Function to turn the interval_ms claim of a token into a usable sampling interval
+def sample_interval_ms(value, default=1):
+    try:
+        interval = float(value)
+    except (TypeError, ValueError):
+        return default
+    if interval != interval:  # NaN
+        return default
+    return min(max(interval, MIN_SAMPLE_INTERVAL_MS), MAX_SAMPLE_INTERVAL_MS)
+
+
+# Samples the stack of one thread every interval seconds while it serves a request
+class StackSampler:
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def write(self, path):
+        write_collapsed(path, self.stacks)
+
+
+def write_collapsed(path, stacks):
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+# One request profiled with cProfile ('cprofile', written as .pstats) or the stack sampler
+# ('sample', written as collapsed stacks in .folded)
+class RequestProfile:
+    def __init__(self, profiler='sample', interval_ms=1):
+        self.id = uuid.uuid4().hex
+        self.profiler = profiler
+        self.started = None
+        if profiler == 'cprofile':
+            self._profiler = cProfile.Profile()
+        else:
+            self._profiler = StackSampler(threading.get_ident(), sample_interval_ms(interval_ms) / 1000)
+
+    # Start profiling; returns False if cProfile could not be enabled because another
+    # profiler is already active (Python 3.12+ allows only one), so the request runs unprofiled
+    def start(self):
+        self.started = time.perf_counter()
+        if self.profiler == 'cprofile':
+            try:
+                self._profiler.enable()
+            except ValueError as e:
+                print(f"Not profiling request: {e}")
+                return False
+        else:
+            self._profiler.start()
+        return True
+
+    # Stop profiling and write the profile plus its metadata; returns the metadata
+    def stop(self, metadata, directory=PROFILE_DIR):
+        duration = time.perf_counter() - self.started
+        if self.profiler == 'cprofile':
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+        os.makedirs(directory, exist_ok=True)
+        extension = 'pstats' if self.profiler == 'cprofile' else 'folded'
+        path = os.path.join(directory, f"{self.id}.{extension}")
+        if self.profiler == 'cprofile':
+            self._profiler.dump_stats(path)
+        else:
+            self._profiler.write(path)
+        metadata = dict(metadata, id=self.id, profiler=self.profiler, file=os.path.basename(path),
+                        duration_ms=duration * 1000, created_at=time.time())
+        with open(os.path.join(directory, f"{self.id}.json"), 'w') as f:
+            json.dump(metadata, f, indent=2, default=str)
+        return metadata
+
+
+# Metadata of the stored request profiles, newest first
+def list_profiles(directory=PROFILE_DIR):
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+    return sorted(profiles, key=lambda profile: profile['created_at'], reverse=True)
+
+
+# Low-rate sampler of every thread that is inside one of the HOT_PATHS functions.
+# Aggregated stacks are written to <directory>/continuous-<pid>-<time>.folded every
+# flush_interval seconds, so a flamegraph of production traffic is always at hand.
+class ContinuousSampler:
+    def __init__(self, interval, flush_interval, directory=PROFILE_DIR):
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.directory = directory
+        self.samples = 0
+        self.files = 0
+        self._stacks = Counter()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='continuous-profiler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            time.sleep(self.interval)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own and _on_hot_path(frame):
+                    self._stacks[collapse(frame)] += 1
+                    self.samples += 1
+            if time.monotonic() >= next_flush:
+                next_flush += self.flush_interval
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Error writing continuous profile: {e}")
+
+    def flush(self):
+        stacks, self._stacks = self._stacks, Counter()
+        if not stacks:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        write_collapsed(os.path.join(self.directory, f"continuous-{os.getpid()}-{int(time.time())}.folded"), stacks)
+        self.files += 1
+
+
+CONTINUOUS_SAMPLER = ContinuousSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000, PROFILE_FLUSH_SECONDS)
+
+
+def initialize_continuous_sampler():
+    if PROFILE_SAMPLE_INTERVAL_MS > 0:
+        CONTINUOUS_SAMPLER.start()
+
+STARTUP.stage('continuous_profiler', initialize_continuous_sampler)
@@ -0,0 +1,66 @@
+# Build the shared store that workers memory-map (see shared_store.py) and publish it atomically.
+# Run after exporting the models: python publish_store.py [path]
+# The path defaults to SHARED_STORE_PATH. Running workers with SHARED_STORE_POLL set pick up
+# the new build without a restart; the models are only included when their .npz exports exist.
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from catalog import ArticleCatalog
+from collaborative_scorer import CollaborativeScorer
+from numpy_models import NumpyModel
+from search_index import TitleSearchIndex, SortOrders
+from shared_store import SHARED_STORE_PATH, write_store
+from similarity_index import SimilarityIndex, documents_fingerprint, keyword_documents
+
+ARTICLES_PATH = 'articles_selected_with_doi.csv'
+MODELS = {
+    'content': 'ContentBasedFilteringModel.npz',
+    'collaborative': 'CollaborativeFilteringModel.npz',
+}
+# Same as operate_content_model.SIMILARITY_NEIGHBORS
+SIMILARITY_NEIGHBORS = 20
+
+
+def build_store():
+    arrays, metadata = {}, {}
+
+    catalog = ArticleCatalog()
+    catalog.load_frame(pd.read_csv(ARTICLES_PATH))
+    arrays_part, metadata['catalog'] = catalog.to_store()
+    arrays.update(arrays_part)
+    titles = catalog.column('title')
+    arrays.update(TitleSearchIndex(titles).to_store())
+    arrays.update(SortOrders(titles, catalog.column('year'), catalog.column('cited_by')).to_store())
+
+    documents = keyword_documents(catalog.column('index_keywords'))
+    tfidf_matrix = TfidfVectorizer(stop_words='english').fit_transform(documents)
+    index = SimilarityIndex.build(tfidf_matrix, k=SIMILARITY_NEIGHBORS, fingerprint=documents_fingerprint(documents))
+    arrays_part, metadata['similarity'] = index.to_store()
+    arrays.update(arrays_part)
+
+    if all(os.path.exists(path) for path in MODELS.values()):
+        metadata['models'] = {}
+        for name, path in MODELS.items():
+            with np.load(path) as data:
+                metadata['models'][name] = json.loads(str(data['architecture']))
+                arrays.update({f"models/{name}/{key}": data[key] for key in data.files if key != 'architecture'})
+        scorer = CollaborativeScorer.from_keras_model(NumpyModel.load(MODELS['collaborative']))
+        arrays_part, metadata['scorer'] = scorer.to_store()
+        arrays.update(arrays_part)
+    else:
+        print("Model exports not found, publishing the catalog and similarity index only")
+    return arrays, metadata
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else SHARED_STORE_PATH
+    if not path:
+        sys.exit("usage: python publish_store.py PATH (or set SHARED_STORE_PATH)")
+    arrays, metadata = build_store()
+    build_id = write_store(path, arrays, metadata)
+    size = sum(array.nbytes for array in arrays.values())
+    print(f"Published {path} (build {build_id}, {len(arrays)} arrays, {size / 2**20:.1f} MB)")
@@ -0,0 +1,251 @@
+from firebase import db
+from firebase_admin import firestore
+import atexit
+import fcntl
+import glob
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from load_ratings import RATINGS
+from startup import STARTUP
+# Load environment variables from .env file
+load_dotenv()
+
+
+class QueueFull(Exception):
+    pass
+
+
+# Write-behind queue for rating writes.
+# Each write is appended to a local log (fsynced) before it is acknowledged, then a
+# background thread coalesces writes per (user, article) and commits them to Firestore
+# in batches. The log is replayed at startup, so acknowledged writes survive a crash.
+#
+# Every queue logs to its own "<log_path>.<pid>-<n>" and holds an exclusive flock on it while
+# it runs, so Gunicorn workers sharing RATING_LOG_PATH never compact or replay each other's
+# writes. At start, a queue takes over the logs whose lock is free: those of processes that
+# died with writes still pending.
+class RatingWriteQueue:
+    # Every entry is two Firestore writes and a batch allows at most 500
+    MAX_BATCH = 250
+    # Numbers the queues of this process, for their log names
+    _instances = itertools.count()
+
+    def __init__(self, db, store, log_path, flush_interval=0.5, max_batch=MAX_BATCH, max_pending=10000):
+        self.db = db
+        self.store = store
+        self.log_path = log_path
+        self.flush_interval = flush_interval
+        self.max_batch = min(max_batch, self.MAX_BATCH)
+        self.max_pending = max_pending
+        self.committed = 0
+        self.coalesced = 0
+        self.failed_commits = 0
+        self._pending = OrderedDict()  # (user_id, article_id) -> entry
+        self._cond = threading.Condition()
+        self._log = None
+        self._thread = None
+        self._stopping = False
+        self._deadline = None
+        self.own_log_path = None
+
+    def start(self):
+        # Named after the worker's pid, known only once Gunicorn has forked it
+        self.own_log_path = f"{self.log_path}.{os.getpid()}-{next(self._instances)}"
+        orphans = self._replay()
+        # Carry the taken-over writes into our own (new, locked) log before dropping the
+        # orphans. A dead process may have had our pid, and its log is then replaced in place.
+        with self._cond:
+            self._compact_log()
+        for orphan in orphans:
+            if orphan.name != self.own_log_path:
+                os.unlink(orphan.name)
+            orphan.close()
+        self._thread = threading.Thread(target=self._run, name='rating-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Queue a rating write: {'op': 'set' | 'delete', 'rating_id', 'user_id', 'article_id', 'article_rating'}.
+    # Raises QueueFull when too many distinct writes are waiting for Firestore.
+    def submit(self, entry):
+        key = (entry['user_id'], str(entry['article_id']))
+        entry = dict(entry, queued_at=time.time())
+        with self._cond:
+            if self._log is None:
+                raise QueueFull("Rating queue is still starting")
+            if self._stopping:
+                raise QueueFull("Rating queue is shutting down")
+            if key not in self._pending and len(self._pending) >= self.max_pending:
+                raise QueueFull("Too many pending rating writes")
+            self._log.write(json.dumps(entry) + '\n')
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            if key in self._pending:
+                self.coalesced += 1
+                del self._pending[key]
+            self._pending[key] = entry
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        self._apply_locally(entry)
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    def _apply_locally(self, entry):
+        data = None
+        if entry['op'] == 'set':
+            data = {key: entry[key] for key in ('article_id', 'user_id', 'article_rating')}
+        self.store.apply_local(entry['rating_id'], data)
+
+    # Logs left by processes that are gone, each returned open and locked
+    def _claim_orphans(self):
+        orphans = []
+        for path in sorted(glob.glob(glob.escape(self.log_path) + '.*')) + [self.log_path]:
+            suffix = path[len(self.log_path) + 1:]
+            if path != self.log_path and not re.fullmatch(r'\d+-\d+', suffix) or not os.path.exists(path):
+                continue
+            log = open(path, 'r+', encoding='utf-8')
+            try:
+                fcntl.flock(log, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                log.close()  # Its worker is alive
+                continue
+            if os.fstat(log.fileno()).st_nlink == 0:
+                log.close()  # Taken over by another worker while we waited
+                continue
+            orphans.append(log)
+        return orphans
+
+    # Load the pending writes of the orphaned logs, oldest first; returns the locked logs
+    def _replay(self):
+        orphans = self._claim_orphans()
+        entries = []
+        for log in orphans:
+            for line in log:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A torn last line from a crash mid-write was never acknowledged
+                    continue
+        # Writes of one process are in order; interleave processes by submission time
+        for entry in sorted(entries, key=lambda entry: entry.get('queued_at', 0)):
+            key = (entry['user_id'], str(entry['article_id']))
+            self._pending.pop(key, None)
+            self._pending[key] = entry
+        for entry in self._pending.values():
+            self._apply_locally(entry)
+        if self._pending:
+            print(f"Replaying {len(self._pending)} pending rating writes")
+        return orphans
+
+    def _run(self):
+        backoff = self.flush_interval
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                if self._stopping and not self._pending:
+                    return
+            if self._flush_once():
+                backoff = self.flush_interval
+                continue
+            if self._stopping and time.monotonic() >= self._deadline:
+                # The writes stay in the log and are replayed by the next start
+                print(f"Giving up on {self.pending_count()} pending rating writes at shutdown")
+                return
+            delay = backoff if not self._stopping else min(backoff, max(self._deadline - time.monotonic(), 0))
+            time.sleep(delay)
+            backoff = min(backoff * 2, 5)
+
+    # Commit up to max_batch pending writes; returns False if the commit failed
+    def _flush_once(self):
+        with self._cond:
+            entries = []
+            while self._pending and len(entries) < self.max_batch:
+                entries.append(self._pending.popitem(last=False))
+        if not entries:
+            return True
+        batch = self.db.batch()
+        for (user_id, article_id), entry in entries:
+            rating_ref = self.db.collection('ratings').document(entry['rating_id'])
+            user_ref = self.db.collection('users').document(user_id)
+            if entry['op'] == 'set':
+                batch.set(rating_ref, {
+                    'article_id': entry['article_id'],
+                    'user_id': user_id,
+                    'article_rating': entry['article_rating'],
+                })
+                batch.set(user_ref, {'rated_articles': firestore.ArrayUnion([entry['article_id']]),
+                                     'articles_version': firestore.Increment(1)}, merge=True)
+            else:
+                batch.delete(rating_ref)
+                batch.set(user_ref, {'rated_articles': firestore.ArrayRemove([entry['article_id']]),
+                                     'articles_version': firestore.Increment(1)}, merge=True)
+        try:
+            batch.commit()
+        except Exception as e:
+            print(f"Error committing rating writes: {e}")
+            self.failed_commits += 1
+            with self._cond:
+                # Put back whatever was not superseded by a newer write meanwhile
+                for key, entry in reversed(entries):
+                    if key not in self._pending:
+                        self._pending[key] = entry
+                        self._pending.move_to_end(key, last=False)
+            return False
+        with self._cond:
+            self.committed += len(entries)
+            self._compact_log()
+        return True
+
+    # Rewrite the log to hold only writes still pending. Called with the lock held.
+    # The new file is locked before it replaces the old one, so no other process can take it.
+    def _compact_log(self):
+        temp_path = self.own_log_path + '.tmp'
+        log = open(temp_path, 'w', encoding='utf-8')
+        fcntl.flock(log, fcntl.LOCK_EX)
+        for entry in self._pending.values():
+            log.write(json.dumps(entry) + '\n')
+        log.flush()
+        os.fsync(log.fileno())
+        os.replace(temp_path, self.own_log_path)
+        self._log, old = log, self._log
+        if old is not None:
+            old.close()
+
+    # Flush everything pending and stop the background thread, retrying failed commits
+    # for at most `timeout` seconds
+    def close(self, timeout=30):
+        with self._cond:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._deadline = time.monotonic() + timeout
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout + 1)
+        with self._cond:
+            if self._log is not None:
+                if not self._pending:
+                    os.unlink(self.own_log_path)
+                self._log.close()
+
+
+# Write-behind mode is opt-in: RATING_WRITE_BEHIND=1
+RATING_QUEUE = None
+if os.getenv('RATING_WRITE_BEHIND') == '1':
+    RATING_QUEUE = RatingWriteQueue(
+        db, RATINGS,
+        os.getenv('RATING_LOG_PATH', 'rating_write_behind.log'),
+        flush_interval=float(os.getenv('RATING_FLUSH_INTERVAL', 0.5)),
+        max_pending=int(os.getenv('RATING_MAX_PENDING', 10000)),
+    )
+    # Replay on top of the initial snapshot, so pending deletes are not undone by it
+    STARTUP.stage('rating_queue', RATING_QUEUE.start, depends=['ratings'])
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from load_ratings import RATINGS
+# Load environment variables from .env file
+load_dotenv()
+
+
+# Bounded LRU cache of recommendation results with a TTL.
+# Keys start with the user id, e.g. (user_id, model_name, model_version, catalog_version),
+# so a model or catalog reload naturally misses and a user's entries can be dropped together.
+# A result computed while the user was invalidated is stale: callers take generation(user_id)
+# before computing and pass it to put(), which drops the result if the generation moved.
+class RecommendationCache:
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._user_keys = {}  # user_id -> set of keys
+        # Bumped by invalidate_user / clear. One int per user ever invalidated, like the
+        # ratings store's user index.
+        self._user_generations = {}  # user_id -> int
+        self._generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    # Token to pass to put() for a result about to be computed for the user
+    def generation(self, user_id):
+        with self._lock:
+            return self._generation, self._user_generations.get(user_id, 0)
+
+    def put(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != (self._generation, self._user_generations.get(key[0], 0)):
+                self.stale_puts += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._user_keys.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    # Drop every cached result for the user, e.g. after they rate or favorite an article
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._user_generations[user_id] = self._user_generations.get(user_id, 0) + 1
+            keys = self._user_keys.pop(user_id, ())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+    # RatingsStore subscriber: ratings written by any worker invalidate that user
+    def on_rating_change(self, old, new):
+        for rating in (old, new):
+            if rating is not None:
+                self.invalidate_user(rating[0])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'stale_puts': self.stale_puts,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+RECOMMENDATION_CACHE = RecommendationCache(
+    max_entries=int(os.getenv('RECOMMENDATION_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('RECOMMENDATION_CACHE_TTL', 300)),
+)
+RATINGS.subscribe(RECOMMENDATION_CACHE.on_rating_change)
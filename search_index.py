@@ -0,0 +1,191 @@
+import base64
+import json
+import numpy as np
+
+from shared_store import encode_strings
+
+NGRAM = 3
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+# Trigram inverted index over lowercased article titles.
+# A query's trigram posting lists are intersected to get candidates, which are then
+# checked with `query in title`, so results equal a linear substring scan in catalog order.
+class TitleSearchIndex:
+    def __init__(self, titles):
+        self.titles = [title.lower() if isinstance(title, str) else '' for title in titles]
+        postings = {}
+        for position, title in enumerate(self.titles):
+            for gram in _ngrams(title):
+                postings.setdefault(gram, []).append(position)
+        self.postings = {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()}
+        self.size = len(self.titles)
+
+    # Arrays for shared_store.write_store: lowercased titles and the postings as one array
+    def to_store(self, prefix='title_index'):
+        grams = sorted(self.postings)
+        lengths = [len(self.postings[gram]) for gram in grams]
+        offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        arrays = {
+            f"{prefix}/offsets": offsets,
+            f"{prefix}/positions": np.concatenate([self.postings[gram] for gram in grams]) if grams else np.empty(0, dtype=np.int32),
+        }
+        for name, values in (('grams', grams), ('titles', self.titles)):
+            for part, array in encode_strings(values).items():
+                arrays[f"{prefix}/{name}/{part}"] = array
+        return arrays
+
+    # Index whose titles and posting lists are views into a mapped shared store
+    @classmethod
+    def from_store(cls, store, prefix='title_index'):
+        index = cls([])
+        index.titles = store.strings(f"{prefix}/titles")
+        offsets, positions = store[f"{prefix}/offsets"], store[f"{prefix}/positions"]
+        index.postings = {
+            gram: positions[offsets[i]:offsets[i + 1]] for i, gram in enumerate(store.strings(f"{prefix}/grams").decode())
+        }
+        index.size = len(index.titles)
+        return index
+
+    # Positions (ascending) of titles that may contain the query
+    def candidates(self, query):
+        if len(query) < NGRAM:
+            return np.arange(self.size, dtype=np.int32)
+        lists = []
+        for gram in _ngrams(query):
+            positions = self.postings.get(gram)
+            if positions is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(positions)
+        lists.sort(key=len)
+        result = lists[0]
+        for positions in lists[1:]:
+            result = np.intersect1d(result, positions, assume_unique=True)
+            if not len(result):
+                break
+        return result
+
+    # Positions (ascending) of titles containing the lowercased query
+    def search(self, query):
+        if not query:
+            return list(range(self.size))
+        titles = self.titles
+        return [position for position in self.candidates(query).tolist() if query in titles[position]]
+
+
+def _int_key(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _stable_order(keys):
+    return np.array(sorted(range(len(keys)), key=keys.__getitem__), dtype=np.int32)
+
+
+# Precomputed /search orderings of the catalog, one per sort key.
+# orders[key] lists catalog positions in sort order and ranks[key] is its inverse,
+# so a filtered result set is paged by walking the order instead of sorting per request.
+class SortOrders:
+    WALK_CHUNK = 4096
+
+    def __init__(self, titles, years, cited_by):
+        self.size = len(titles)
+        years = [_int_key(year) for year in years]
+        cited_by = [_int_key(count) for count in cited_by]
+        # Same keys and stability as the old per-request sorts; unparsable numbers go last
+        self.orders = {
+            'title': _stable_order([title.lower() if isinstance(title, str) else '' for title in titles]),
+            'year': _stable_order([(year is None, -(year or 0)) for year in years]),
+            'cited_by': _stable_order([(count is None, -(count or 0)) for count in cited_by]),
+        }
+        self.ranks = {}
+        for key, order in self.orders.items():
+            ranks = np.empty(self.size, dtype=np.int32)
+            ranks[order] = np.arange(self.size, dtype=np.int32)
+            self.ranks[key] = ranks
+
+    def to_store(self, prefix='sort_orders'):
+        arrays = {f"{prefix}/orders/{key}": order for key, order in self.orders.items()}
+        arrays.update({f"{prefix}/ranks/{key}": ranks for key, ranks in self.ranks.items()})
+        return arrays
+
+    # Orders and ranks as views into a mapped shared store
+    @classmethod
+    def from_store(cls, store, prefix='sort_orders'):
+        sort_orders = cls([], [], [])
+        sort_orders.orders = store.group(f"{prefix}/orders")
+        sort_orders.ranks = store.group(f"{prefix}/ranks")
+        sort_orders.size = len(next(iter(sort_orders.orders.values())))
+        return sort_orders
+
+    # One page of `positions` in `sort_by` order, starting at order offset `after` and
+    # skipping `skip` matches. Returns the page and the order offset to resume from,
+    # or None when nothing is left.
+    def page(self, sort_by, positions, skip=0, count=20, after=0):
+        positions = np.asarray(positions, dtype=np.int32)
+        if not len(positions) or count <= 0:
+            return [], None
+        if len(positions) * 8 < self.size:
+            return self._page_by_rank(sort_by, positions, skip, count, after)
+        return self._page_by_walk(sort_by, positions, skip, count, after)
+
+    # Few matches: sort just the matches by their precomputed rank
+    def _page_by_rank(self, sort_by, positions, skip, count, after):
+        ranks = self.ranks[sort_by][positions]
+        keep = ranks >= after
+        positions, ranks = positions[keep], ranks[keep]
+        order = np.argsort(ranks)
+        selected = order[skip:skip + count]
+        if not len(selected):
+            return [], None
+        next_after = int(ranks[selected[-1]]) + 1 if skip + count < len(order) else None
+        return positions[selected].tolist(), next_after
+
+    # Many matches: walk the global order against a bitmap of the matches
+    def _page_by_walk(self, sort_by, positions, skip, count, after):
+        order = self.orders[sort_by]
+        mask = np.zeros(self.size, dtype=bool)
+        mask[positions] = True
+        page = []
+        offset = after
+        while offset < self.size and len(page) < count:
+            chunk = order[offset:offset + self.WALK_CHUNK]
+            hit_offsets = np.flatnonzero(mask[chunk])
+            if skip >= len(hit_offsets):
+                skip -= len(hit_offsets)
+                offset += len(chunk)
+                continue
+            hit_offsets = hit_offsets[skip:skip + count - len(page)]
+            skip = 0
+            page.extend(chunk[hit_offsets].tolist())
+            offset += int(hit_offsets[-1]) + 1 if len(page) == count else len(chunk)
+        if not page:
+            return [], None
+        # Something is left if any match sits at or past the offset the walk stopped at
+        exhausted = len(page) < count or not np.any(self.ranks[sort_by][positions] >= offset)
+        return page, None if exhausted else offset
+
+
+# Opaque /search cursor carrying the sort key and order offset to resume from
+def encode_cursor(sort_by, after):
+    return base64.urlsafe_b64encode(json.dumps([sort_by, after]).encode()).decode().rstrip('=')
+
+
+# Sort key and order offset of a cursor; raises ValueError unless the key is one of
+# `sort_orders` and the offset lies within its order
+def decode_cursor(cursor, sort_orders):
+    try:
+        sort_by, after = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(sort_by, str) or sort_by not in sort_orders.orders:
+        raise ValueError("Invalid cursor")
+    if not isinstance(after, int) or isinstance(after, bool) or not 0 <= after <= sort_orders.size:
+        raise ValueError("Invalid cursor")
+    return sort_by, after
@@ -0,0 +1,187 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+import numpy as np
+from dotenv import load_dotenv
+
+from startup import STARTUP
+# Load environment variables from .env file
+load_dotenv()
+
+# Binary file of named arrays that every worker memory-maps read-only, so the catalog
+# columns, model weights and similarity index are held once in the OS page cache instead
+# of once per process. Written by publish_store.py.
+#
+# Layout: header (magic, format version, manifest length), JSON manifest, then each array's
+# raw bytes at a 64-byte aligned offset. The manifest maps array names to dtype, shape and
+# offset and carries the build id and free-form metadata.
+MAGIC = b'ARTSTOR\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIQ')
+ALIGNMENT = 64
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+# Strings as one UTF-8 buffer plus int64 offsets; missing values (NaN in the CSV) are flagged
+def encode_strings(values):
+    encoded = [value.encode('utf-8') if isinstance(value, str) else b'' for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {
+        'offsets': offsets,
+        'data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'missing': np.array([not isinstance(value, str) for value in values], dtype=bool),
+    }
+
+
+# String array as laid out by encode_strings, e.g. mapped from a store; values are decoded on access
+class StringColumn:
+    def __init__(self, offsets, data, missing):
+        self.offsets = offsets
+        self.data = data
+        self.missing = missing
+
+    def __len__(self):
+        return len(self.missing)
+
+    def __getitem__(self, position):
+        if self.missing[position]:
+            return float('nan')
+        return self.data[self.offsets[position]:self.offsets[position + 1]].tobytes().decode('utf-8')
+
+    def take(self, positions):
+        return np.array([self[position] for position in positions], dtype=object)
+
+    def decode(self):
+        return self.take(range(len(self)))
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.data.nbytes + self.missing.nbytes
+
+
+# Write arrays and metadata to path. The file is written next to it and renamed over it,
+# so readers see either the previous build or the complete new one. Returns the build id.
+def write_store(path, arrays, metadata=None):
+    build_id = uuid.uuid4().hex
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype == object:
+            raise TypeError(f"{name}: object arrays cannot be memory-mapped")
+        entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+    manifest = json.dumps({
+        'build_id': build_id,
+        'created_at': time.time(),
+        'metadata': metadata or {},
+        'arrays': entries,
+    }).encode('utf-8')
+    data_start = _align(HEADER.size + len(manifest))
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as store:
+        store.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(manifest)))
+        store.write(manifest)
+        for name, array in arrays.items():
+            store.seek(data_start + entries[name]['offset'])
+            store.write(np.ascontiguousarray(array).tobytes())
+        store.truncate(data_start + offset)
+        store.flush()
+        os.fsync(store.fileno())
+    os.replace(temp_path, path)
+    return build_id
+
+
+# A store file mapped read-only. Arrays are views into the mapping, so they are shared
+# between processes and cannot be written to.
+class MappedStore:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as store:
+            self.inode = os.fstat(store.fileno()).st_ino
+            self._map = mmap.mmap(store.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, manifest_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a shared store file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+        manifest = json.loads(self._map[HEADER.size:HEADER.size + manifest_length].decode('utf-8'))
+        data_start = _align(HEADER.size + manifest_length)
+        self.build_id = manifest['build_id']
+        self.created_at = manifest['created_at']
+        self.metadata = manifest['metadata']
+        self.arrays = {}
+        for name, entry in manifest['arrays'].items():
+            dtype = np.dtype(entry['dtype'])
+            count = int(np.prod(entry['shape'], dtype=np.int64))
+            self.arrays[name] = np.frombuffer(
+                self._map, dtype=dtype, count=count, offset=data_start + entry['offset']
+            ).reshape(entry['shape'])
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    # Arrays under "<prefix>/", keyed by the rest of their name
+    def group(self, prefix):
+        prefix = prefix.rstrip('/') + '/'
+        return {name[len(prefix):]: array for name, array in self.arrays.items() if name.startswith(prefix)}
+
+    def strings(self, prefix):
+        return StringColumn(self[f"{prefix}/offsets"], self[f"{prefix}/data"], self[f"{prefix}/missing"])
+
+    # True once a newer build has been renamed over the mapped file
+    def is_stale(self):
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return False
+
+
+# Workers map the store when SHARED_STORE_PATH is set; otherwise every stage loads its own copy
+SHARED_STORE_PATH = os.getenv('SHARED_STORE_PATH')
+# Seconds between checks for a newly published store (0 disables reloading)
+SHARED_STORE_POLL = float(os.getenv('SHARED_STORE_POLL', 0))
+# Stages that read from the store; rerun (with their dependents) when a new build is published
+SHARED_STORE_STAGES = ['catalog', 'models']
+
+SHARED_STORE = None
+
+
+def initialize_shared_store():
+    global SHARED_STORE
+    if not SHARED_STORE_PATH:
+        return
+    SHARED_STORE = MappedStore(SHARED_STORE_PATH)
+    print(f"Mapped shared store {SHARED_STORE_PATH} (build {SHARED_STORE.build_id})")
+    if SHARED_STORE_POLL > 0:
+        threading.Thread(target=watch_shared_store, name='shared-store-watch', daemon=True).start()
+
+
+# Map each newly published build and reload the stages that read from it.
+# The old mapping stays valid for as long as anything still references its arrays.
+def watch_shared_store():
+    global SHARED_STORE
+    while True:
+        time.sleep(SHARED_STORE_POLL)
+        try:
+            if not SHARED_STORE.is_stale():
+                continue
+            SHARED_STORE = MappedStore(SHARED_STORE_PATH)
+            print(f"Mapped new shared store build {SHARED_STORE.build_id}")
+            STARTUP.rerun(SHARED_STORE_STAGES)
+        except Exception as e:
+            print(f"Error reloading shared store: {e}")
+
+
+STARTUP.stage('shared_store', initialize_shared_store)
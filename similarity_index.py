@@ -0,0 +1,80 @@
+import hashlib
+import numpy as np
+from sklearn.preprocessing import normalize
+
+
+# One TF-IDF document per article from its index_keywords, so rows line up with catalog positions
+def keyword_documents(values):
+    documents = []
+    for index_keywords in values:
+        if isinstance(index_keywords, list):
+            # Join list elements, converting non-string elements to strings
+            documents.append(' '.join(str(keyword) for keyword in index_keywords))
+        elif isinstance(index_keywords, str):
+            # If index_keywords is already a string, append it directly
+            documents.append(index_keywords)
+        else:
+            # Missing keywords (NaN from the CSV) still take a row
+            documents.append('')
+    return documents
+
+
+# Fingerprint of the documents an index was built from, to detect stale files on disk
+def documents_fingerprint(documents):
+    digest = hashlib.sha1()
+    for document in documents:
+        digest.update(document.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+# Top-k nearest neighbors of every article by cosine similarity of their TF-IDF vectors.
+# Row i holds the neighbor positions of article i (best first, itself excluded) and their scores,
+# so a lookup is O(k) and memory is N x k instead of the dense N x N similarity matrix.
+class SimilarityIndex:
+    def __init__(self, neighbors, scores, fingerprint=''):
+        self.neighbors = neighbors
+        self.scores = scores
+        self.fingerprint = fingerprint
+
+    # Build the index chunk by chunk so only chunk_size x N similarities are in memory at once
+    @classmethod
+    def build(cls, tfidf_matrix, k=20, chunk_size=512, fingerprint=''):
+        vectors = normalize(tfidf_matrix.tocsr())
+        num_rows = vectors.shape[0]
+        k = max(min(k, num_rows - 1), 0)
+        neighbors = np.empty((num_rows, k), dtype=np.int32)
+        scores = np.empty((num_rows, k), dtype=np.float32)
+        for start in range(0, num_rows, chunk_size):
+            stop = min(start + chunk_size, num_rows)
+            sims = (vectors[start:stop] @ vectors.T).toarray()
+            rows = np.arange(stop - start)
+            sims[rows, rows + start] = -np.inf
+            if k == 0:
+                continue
+            top = np.argpartition(sims, -k, axis=1)[:, -k:]
+            top_scores = np.take_along_axis(sims, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            neighbors[start:stop] = np.take_along_axis(top, order, axis=1)
+            scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+        return cls(neighbors, scores, fingerprint)
+
+    def save(self, path):
+        np.savez(path, neighbors=self.neighbors, scores=self.scores, fingerprint=np.array(self.fingerprint))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['neighbors'], data['scores'], str(data['fingerprint']))
+
+    def to_store(self, prefix='similarity'):
+        return {f"{prefix}/neighbors": self.neighbors, f"{prefix}/scores": self.scores}, {'fingerprint': self.fingerprint}
+
+    # Index whose neighbor and score rows are views into a mapped shared store
+    @classmethod
+    def from_store(cls, store, prefix='similarity'):
+        return cls(store[f"{prefix}/neighbors"], store[f"{prefix}/scores"], store.metadata[prefix]['fingerprint'])
+
+    # Positions and scores of the most similar articles to the article at `position`
+    def similar(self, position, count=10):
+        return self.neighbors[position, :count], self.scores[position, :count]
@@ -0,0 +1,123 @@
+import threading
+import time
+
+
+# Startup stages (loading the catalog, models, indexes, ...) registered by the modules that
+# own them and run in background threads once their dependencies are done, so importing the
+# app is cheap and independent stages load in parallel. Each stage's timing and outcome is
+# recorded for /readyz.
+class Startup:
+    def __init__(self):
+        self.stages = {}
+        self.started_at = None
+        self._lock = threading.Lock()
+
+    # Register fn to run as stage `name` after every stage in `depends` succeeded
+    def stage(self, name, fn, depends=()):
+        self.stages[name] = {
+            'fn': fn,
+            'depends': tuple(depends),
+            'state': 'pending',
+            'started_at': None,
+            'duration': None,
+            'error': None,
+            'done': threading.Event(),
+        }
+
+    def start(self):
+        with self._lock:
+            if self.started_at is not None:
+                return
+            self.started_at = time.monotonic()
+        for name in self.stages:
+            threading.Thread(target=self._run, args=(name,), name=f"startup-{name}", daemon=True).start()
+
+    def _run(self, name):
+        stage = self.stages[name]
+        for dependency in stage['depends']:
+            self.stages[dependency]['done'].wait()
+            if self.stages[dependency]['state'] != 'ready':
+                stage['state'] = 'skipped'
+                stage['error'] = f"dependency {dependency} did not load"
+                stage['done'].set()
+                return
+        stage['state'] = 'running'
+        stage['started_at'] = time.monotonic() - self.started_at
+        started = time.monotonic()
+        try:
+            stage['fn']()
+            stage['state'] = 'ready'
+        except Exception as e:
+            print(f"Error in startup stage {name}: {e}")
+            stage['state'] = 'failed'
+            stage['error'] = str(e)
+        stage['duration'] = time.monotonic() - started
+        print(f"Startup stage {name} {stage['state']} in {stage['duration']:.2f}s")
+        stage['done'].set()
+
+    # Run the named stages again, then every stage that depends on them, in dependency order.
+    # Requests keep being served from the previous data while this runs; a stage that fails
+    # keeps its old data, records the error and its dependents are not rerun.
+    def rerun(self, names):
+        selected = set(names)
+        changed = True
+        while changed:
+            changed = False
+            for name, stage in self.stages.items():
+                if name not in selected and selected.intersection(stage['depends']):
+                    selected.add(name)
+                    changed = True
+        done, failed = set(), set()
+        while len(done) + len(failed) < len(selected):
+            for name in self.stages:
+                stage = self.stages[name]
+                if name not in selected or name in done or name in failed:
+                    continue
+                pending = [dependency for dependency in stage['depends'] if dependency in selected]
+                if any(dependency in failed for dependency in pending):
+                    failed.add(name)
+                    continue
+                if any(dependency not in done for dependency in pending):
+                    continue
+                started = time.monotonic()
+                try:
+                    stage['fn']()
+                    stage['error'] = None
+                    done.add(name)
+                except Exception as e:
+                    print(f"Error rerunning startup stage {name}: {e}")
+                    stage['error'] = str(e)
+                    failed.add(name)
+                print(f"Startup stage {name} rerun in {time.monotonic() - started:.2f}s")
+        return not failed
+
+    def ready(self):
+        return all(stage['state'] == 'ready' for stage in self.stages.values())
+
+    # Names of the given registered stages that have not loaded (yet, or at all)
+    def pending(self, names):
+        return [name for name in names if name in self.stages and self.stages[name]['state'] != 'ready']
+
+    # Block until every stage finished (successfully or not); returns ready()
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for stage in self.stages.values():
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not stage['done'].wait(remaining):
+                return False
+        return self.ready()
+
+    def status(self):
+        return {
+            name: {
+                'state': stage['state'],
+                'depends': list(stage['depends']),
+                'started_at_seconds': stage['started_at'],
+                'duration_seconds': stage['duration'],
+                'error': stage['error'],
+            }
+            for name, stage in self.stages.items()
+        }
+
+
+STARTUP = Startup()
@@ -0,0 +1,14 @@
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_firestore import FakeFirestore, FakeAsyncFirestore
+
+# Modules that import `firebase` get the in-memory Firestore instead of a client built from
+# serviceaccount.json, as benchmarks/loadtest_server.py does
+if 'firebase' not in sys.modules:
+    FAKE_DB = FakeFirestore()
+    sys.modules['firebase'] = types.SimpleNamespace(db=FAKE_DB, async_client=lambda: FakeAsyncFirestore(FAKE_DB))
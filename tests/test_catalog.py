@@ -0,0 +1,45 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from catalog import ArticleCatalog
+
+
+def frame(titles):
+    return pd.DataFrame({'article_id': np.arange(1, len(titles) + 1), 'title': titles, 'year': [2020.0, np.nan][:len(titles)]})
+
+
+def test_row_json_encodes_projections_and_missing_values():
+    catalog = ArticleCatalog()
+    catalog.load_frame(frame(['alpha', 'beta']))
+    assert json.loads(catalog.row_json(1)) == {'article_id': 2, 'title': 'beta', 'year': None}
+    assert json.loads(catalog.rows_json([1, 0], ('title',))) == [{'title': 'beta'}, {'title': 'alpha'}]
+
+
+def test_reload_drops_the_fragments_of_the_old_catalog():
+    catalog = ArticleCatalog()
+    catalog.load_frame(frame(['alpha', 'beta']))
+    assert json.loads(catalog.row_json(0, ('title',))) == {'title': 'alpha'}
+    catalog.load_frame(frame(['gamma', 'delta']))
+    assert json.loads(catalog.row_json(0, ('title',))) == {'title': 'gamma'}
+
+
+# A request that read the state before a reload finishes encoding after it: its fragment
+# must go into the old state's cache, not the new one
+def test_fragment_encoded_across_a_reload_stays_with_its_state():
+    catalog = ArticleCatalog()
+    catalog.load_frame(frame(['alpha', 'beta']))
+    old_state = catalog._state
+    catalog.load_frame(frame(['gamma', 'delta']))
+    assert json.loads(catalog._row_json(old_state, 0, ('title',))) == {'title': 'alpha'}
+    assert json.loads(catalog.row_json(0, ('title',))) == {'title': 'gamma'}
+
+
+def test_full_caches_are_dropped():
+    catalog = ArticleCatalog(fragment_cache_size=1)
+    catalog.load_frame(frame(['alpha', 'beta']))
+    assert [json.loads(catalog.row_json(position))['title'] for position in (0, 1, 0)] == ['alpha', 'beta', 'alpha']
+    for i in range(ArticleCatalog.MAX_PROJECTIONS + 1):
+        catalog.row_json(0, ('title',) * (i + 1))
+    assert len(catalog._state[4]) <= ArticleCatalog.MAX_PROJECTIONS
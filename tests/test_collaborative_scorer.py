@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import tiny_models
+from collaborative_scorer import CollaborativeScorer
+
+NUM_USERS = 7
+NUM_ARTICLES = 11
+
+
+@pytest.fixture(scope='module')
+def collaborative():
+    return tiny_models(NUM_USERS, NUM_ARTICLES, hidden=8, embedding_dim=4)[1]
+
+
+def test_scorer_matches_model_predict(collaborative):
+    scorer = CollaborativeScorer.from_keras_model(collaborative)
+    assert scorer.check_parity(collaborative) < 1e-6
+    articles = np.arange(NUM_ARTICLES)
+    for user in range(NUM_USERS):
+        expected = collaborative.predict([np.full(NUM_ARTICLES, user), articles]).flatten()
+        np.testing.assert_allclose(scorer.score(user, articles), expected, atol=1e-6)
+        assert list(scorer.top_k(user, articles, 3)) == list(np.argsort(expected)[::-1][:3])
+
+
+def test_scorer_survives_the_shared_store_layout(collaborative):
+    scorer = CollaborativeScorer.from_keras_model(collaborative)
+    arrays, metadata = scorer.to_store()
+
+    class Store(dict):
+        pass
+
+    store = Store(arrays)
+    store.metadata = {'scorer': metadata}
+    restored = CollaborativeScorer.from_store(store)
+    articles = np.arange(NUM_ARTICLES)
+    np.testing.assert_array_equal(restored.score(2, articles), scorer.score(2, articles))
+
+
+# operate_collaborative_model.SCORER_TOLERANCE: the startup check falls back to model.predict above it
+SCORER_TOLERANCE = 1e-4
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def assert_keras_parity(model, num_users, num_articles):
+    scorer = CollaborativeScorer.from_keras_model(model)
+    assert scorer.check_parity(model) < SCORER_TOLERANCE
+    articles = np.arange(num_articles)
+    for user in np.random.default_rng(0).integers(0, num_users, 5):
+        expected = model.predict([np.full(num_articles, user), articles], verbose=0).flatten()
+        np.testing.assert_allclose(scorer.score(user, articles), expected, atol=SCORER_TOLERANCE)
+
+
+# Same embedding -> concatenate -> Dense(relu) -> Dense(sigmoid) layout as the trained model
+def test_scorer_matches_keras():
+    tf = pytest.importorskip('tensorflow')
+    user = tf.keras.Input(shape=(1,), name='user')
+    article = tf.keras.Input(shape=(1,), name='article')
+    user_vector = tf.keras.layers.Flatten()(tf.keras.layers.Embedding(NUM_USERS, 4, name='user_embedding')(user))
+    article_vector = tf.keras.layers.Flatten()(tf.keras.layers.Embedding(NUM_ARTICLES, 4, name='article_embedding')(article))
+    hidden = tf.keras.layers.Dense(8, activation='relu')(tf.keras.layers.Concatenate()([user_vector, article_vector]))
+    model = tf.keras.Model([user, article], tf.keras.layers.Dense(1, activation='sigmoid')(hidden))
+    assert_keras_parity(model, NUM_USERS, NUM_ARTICLES)
+
+
+def test_scorer_matches_the_shipped_model():
+    tf = pytest.importorskip('tensorflow')
+    path = os.path.join(ROOT, 'CollaborativeFilteringModel.keras')
+    if not os.path.exists(path):
+        pytest.skip('CollaborativeFilteringModel.keras not present')
+    model = tf.keras.models.load_model(path)
+    assert_keras_parity(model, model.get_layer('user_embedding').input_dim, model.get_layer('article_embedding').input_dim)
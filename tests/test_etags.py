@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip('firebase_admin')
+
+from flask import Flask
+
+import etags
+import load_articles
+
+app = Flask(__name__)
+
+
+@pytest.fixture
+def fingerprint(monkeypatch):
+    monkeypatch.setattr(load_articles, 'CATALOG_FINGERPRINT', 'csv:abc')
+    return monkeypatch
+
+
+def test_untagged_and_not_stored_before_the_catalog_loads(monkeypatch):
+    monkeypatch.setattr(load_articles, 'CATALOG_FINGERPRINT', None)
+    with app.test_request_context('/search?query=a'):
+        etag = etags.catalog_etag()
+        assert etag is None
+        assert etags.not_modified(etag, etags.CATALOG_CACHE_CONTROL) is None
+        response = etags.tagged(app.response_class('{}'), etag, etags.CATALOG_CACHE_CONTROL)
+    assert response.get_etag() == (None, None)
+    assert response.headers['Cache-Control'] == 'no-store'
+
+
+def test_tagged_and_revalidated_once_loaded(fingerprint):
+    with app.test_request_context('/search?query=a'):
+        etag = etags.catalog_etag()
+        response = etags.tagged(app.response_class('{}'), etag, etags.CATALOG_CACHE_CONTROL)
+    assert response.get_etag() == (etag, False)
+    assert response.headers['Cache-Control'].startswith('private')
+    with app.test_request_context('/search?query=a', headers={'If-None-Match': f'"{etag}-gzip"'}):
+        assert etags.not_modified(etags.catalog_etag(), etags.CATALOG_CACHE_CONTROL).status_code == 304
+
+
+def test_not_stored_if_the_catalog_reloads_mid_request(fingerprint):
+    with app.test_request_context('/search?query=a'):
+        etag = etags.catalog_etag()
+        fingerprint.setattr(load_articles, 'CATALOG_FINGERPRINT', 'csv:def')
+        response = etags.tagged(app.response_class('{}'), etag, etags.CATALOG_CACHE_CONTROL)
+    assert response.get_etag() == (None, None)
+    assert response.headers['Cache-Control'] == 'no-store'
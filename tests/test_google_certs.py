@@ -0,0 +1,66 @@
+import time
+import pytest
+
+from fake_google_certs import FakeGoogleCerts
+from google_certs import GoogleCertCache
+
+AUDIENCE = 'client-1'
+
+
+@pytest.fixture
+def fake():
+    fake = FakeGoogleCerts(max_age=3600)
+    yield fake
+    fake.close()
+
+
+def test_certs_are_cached_within_max_age(fake):
+    cache = GoogleCertCache(fake.url)
+    cache.verify(fake.mint_id_token(AUDIENCE), AUDIENCE)
+    cache.verify(fake.mint_id_token(AUDIENCE), AUDIENCE)
+    assert fake.requests == 1
+    assert cache.stats()['fetches'] == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_certs_are_refetched_after_expiry(fake):
+    fake.max_age = 1
+    cache = GoogleCertCache(fake.url)
+    cache.certs()
+    time.sleep(1.1)
+    cache.verify(fake.mint_id_token(AUDIENCE), AUDIENCE)
+    assert fake.requests == 2
+    assert cache.stats()['fetches'] == 2
+
+
+def test_unknown_key_id_refetches_at_most_once_per_interval(fake):
+    cache = GoogleCertCache(fake.url, min_refetch=60)
+    cache.certs()
+    cache._last_fetch -= 60  # as if the certificates were fetched a minute ago
+    fake.rotate()
+    assert cache.verify(fake.mint_id_token(AUDIENCE, email='a@b.c'), AUDIENCE)['email'] == 'a@b.c'
+    assert fake.requests == 2
+
+    # Another rotation within min_refetch is not fetched: the token is rejected
+    fake.rotate()
+    with pytest.raises(ValueError):
+        cache.verify(fake.mint_id_token(AUDIENCE), AUDIENCE)
+    assert fake.requests == 2
+
+
+def test_expired_certs_are_kept_when_the_fetch_fails(fake):
+    fake.max_age = 1
+    cache = GoogleCertCache(fake.url)
+    cache.certs()
+    time.sleep(1.1)
+    fake.failing = True
+    assert cache.verify(fake.mint_id_token(AUDIENCE, email='a@b.c'), AUDIENCE)['email'] == 'a@b.c'
+    assert cache.stats()['failed_fetches'] == 1
+
+
+def test_first_fetch_failure_is_raised(fake):
+    fake.failing = True
+    cache = GoogleCertCache(fake.url)
+    with pytest.raises(Exception):
+        cache.certs()
+    assert cache.stats()['failed_fetches'] == 1
@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import TimeoutError
+
+import numpy as np
+import pytest
+
+from inference_scheduler import InferenceScheduler
+
+
+def test_rows_come_back_to_their_callers():
+    scheduler = InferenceScheduler(lambda batch: batch * 2, max_wait=0.01, max_batch=8)
+    results = {}
+
+    def call(i):
+        results[i] = scheduler.predict(np.full((2, 3), i))
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i in range(10):
+        assert np.array_equal(results[i], np.full((2, 3), 2 * i))
+    assert scheduler.stats()['rows'] == 20
+
+
+def test_short_output_fails_every_caller():
+    scheduler = InferenceScheduler(lambda batch: batch[:-1], max_wait=0.01, timeout=5)
+    with pytest.raises(ValueError, match='returned 2 rows for a batch of 3'):
+        scheduler.predict(np.zeros((3, 2)))
+
+
+def test_caller_gives_up_after_timeout():
+    release = threading.Event()
+
+    def slow(batch):
+        release.wait(5)
+        return batch
+
+    scheduler = InferenceScheduler(slow, max_wait=0, max_batch=1, timeout=0.1)
+    with pytest.raises(TimeoutError):
+        scheduler.predict(np.zeros((3, 2)))
+    release.set()
+    # The rows still queued behind the slow one were cancelled rather than predicted
+    assert np.array_equal(scheduler.predict(np.ones((1, 2))), np.ones((1, 2)))
+    assert scheduler.stats()['rows'] <= 2
@@ -0,0 +1,45 @@
+import json
+
+import pandas as pd
+import pytest
+
+import firebase
+import load_articles
+
+
+# Articles found in the CSV catalog are served with the catalog's column types (article_id and
+# year as numbers) and without the rated_users list of the Firestore documents; articles only
+# in Firestore are served as stored. /articles/<id> and the favorite/rated lists return these.
+@pytest.fixture
+def catalog(monkeypatch):
+    catalog = load_articles.ArticleCatalog()
+    catalog.load_frame(pd.DataFrame({
+        'article_id': [7, 8],
+        'title': ['Graph learning', 'Soil data'],
+        'year': [2020, 2021],
+        'cited_by': [3, 0],
+    }))
+    monkeypatch.setattr(load_articles, 'ARTICLES', catalog)
+    firebase.db.collection('articles').document('fsonly').set({
+        'article_id': 'fsonly', 'title': 'Only in Firestore', 'year': '2019', 'cited_by': 1, 'rated_users': [],
+    })
+    return catalog
+
+
+def test_catalog_articles_use_the_catalog_shape(catalog):
+    assert load_articles.get_articles_by_ids(['8', 7]) == [
+        {'article_id': 8, 'title': 'Soil data', 'year': 2021, 'cited_by': 0},
+        {'article_id': 7, 'title': 'Graph learning', 'year': 2020, 'cited_by': 3},
+    ]
+
+
+def test_firestore_only_articles_are_served_as_stored(catalog):
+    items = load_articles.get_article_items_by_ids(['7', 'fsonly', 'missing'])
+    assert json.loads(load_articles.articles_json(items)) == [
+        {'article_id': 7, 'cited_by': 3, 'title': 'Graph learning', 'year': 2020},
+        {'article_id': 'fsonly', 'cited_by': 1, 'rated_users': [], 'title': 'Only in Firestore', 'year': '2019'},
+    ]
+    assert json.loads(load_articles.articles_json(items, ('article_id', 'year'))) == [
+        {'article_id': 7, 'year': 2020},
+        {'article_id': 'fsonly', 'year': '2019'},
+    ]
@@ -0,0 +1,36 @@
+import asyncio
+
+import metrics
+from async_firestore import AsyncFirestore
+from fake_firestore import FakeFirestore, FakeAsyncFirestore
+
+
+def test_sync_calls_count_against_the_current_request():
+    db = metrics.instrument_firestore(FakeFirestore())
+    token = metrics.begin_request('/test')
+    db.collection('users').document('u1').set({'name': 'A'})
+    db.collection('users').document('u1').get()
+    current = metrics.end_request(token, 'GET', 200, 0.01)
+    assert (current.reads, current.writes) == (1, 1)
+
+
+def test_async_calls_on_the_loop_thread_count_against_the_calling_request():
+    sync_db = FakeFirestore()
+    sync_db.collection('users').document('u1').set({'name': 'A'})
+    firestore = AsyncFirestore(lambda: metrics.instrument_async_firestore(FakeAsyncFirestore(sync_db)))
+    users = firestore.client.collection('users')
+
+    async def view():
+        batch = firestore.client.batch()
+        batch.set(users.document('u2'), {'name': 'B'})
+        await firestore.run(batch.commit())
+        await firestore.gather(users.document('u1').get(), users.document('u2').get())
+        return await firestore.get_all([users.document('u1')])
+
+    token = metrics.begin_request('/test')
+    with metrics.span('view'):
+        docs = asyncio.run(view())
+    current = metrics.end_request(token, 'GET', 200, 0.01)
+    assert [doc.id for doc in docs] == ['u1']
+    assert (current.reads, current.writes) == (3, 1)
+    assert [stage for stage, _ in current.spans] == ['view']
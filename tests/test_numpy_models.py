@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import tiny_model_exports, tiny_models, write_tiny_models
+from numpy_models import NumpyModel
+
+NUM_USERS = 7
+NUM_ARTICLES = 11
+
+
+@pytest.fixture(scope='module')
+def models():
+    return tiny_models(NUM_USERS, NUM_ARTICLES, hidden=8, embedding_dim=4)
+
+
+def test_content_model_is_the_dense_forward_pass(models):
+    content, _ = models
+    architecture, weights = tiny_model_exports(NUM_USERS, NUM_ARTICLES, hidden=8, embedding_dim=4)[0]
+    ratings = np.random.default_rng(1).random((3, NUM_ARTICLES)).astype(np.float32)
+    hidden = np.maximum(ratings @ weights['hidden/0'] + weights['hidden/1'], 0)
+    expected = 1 / (1 + np.exp(-(hidden @ weights['output/0'] + weights['output/1'])))
+    assert content.input_shape == (None, NUM_ARTICLES)
+    np.testing.assert_allclose(content.predict(ratings), expected, rtol=1e-5)
+
+
+def test_npz_round_trip(tmp_path, models):
+    content_path, collaborative_path = tmp_path / 'content.npz', tmp_path / 'collaborative.npz'
+    write_tiny_models(NUM_USERS, NUM_ARTICLES, content_path, collaborative_path, hidden=8, embedding_dim=4)
+    ratings = np.random.default_rng(2).random((2, NUM_ARTICLES))
+    np.testing.assert_array_equal(NumpyModel.load(content_path).predict(ratings), models[0].predict(ratings))
+    pairs = [np.array([0, 3, 6]), np.array([10, 0, 5])]
+    np.testing.assert_array_equal(NumpyModel.load(collaborative_path).predict(pairs), models[1].predict(pairs))
+
+
+def test_unknown_layers_are_rejected():
+    architecture = {'layers': [{'name': 'lstm', 'class_name': 'LSTM', 'config': {}, 'inbound': [], 'num_weights': 0}],
+                    'inputs': ['lstm'], 'outputs': ['lstm'], 'input_shapes': [[None, 1]]}
+    with pytest.raises(ValueError, match='Unsupported layer type: LSTM'):
+        NumpyModel(json.loads(json.dumps(architecture)), {})
+
+
+# The export itself needs TensorFlow: a Keras model with the collaborative graph must
+# come out of describe_model serving the same predictions within export_models.TOLERANCE
+def test_export_matches_keras():
+    tf = pytest.importorskip('tensorflow')
+    import export_models
+
+    user = tf.keras.Input(shape=(1,), name='user')
+    article = tf.keras.Input(shape=(1,), name='article')
+    user_vector = tf.keras.layers.Flatten()(tf.keras.layers.Embedding(NUM_USERS, 4, name='user_embedding')(user))
+    article_vector = tf.keras.layers.Flatten()(tf.keras.layers.Embedding(NUM_ARTICLES, 4, name='article_embedding')(article))
+    hidden = tf.keras.layers.Dense(8, activation='relu')(tf.keras.layers.Concatenate()([user_vector, article_vector]))
+    model = tf.keras.Model([user, article], tf.keras.layers.Dense(1, activation='sigmoid')(hidden))
+
+    numpy_model = NumpyModel(*export_models.describe_model(model))
+    inputs = export_models.sample_inputs(numpy_model)
+    assert np.max(np.abs(model.predict(inputs, verbose=0) - numpy_model.predict(inputs))) < export_models.TOLERANCE
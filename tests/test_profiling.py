@@ -0,0 +1,24 @@
+import pytest
+
+import profiling
+
+
+@pytest.mark.parametrize('claim, interval', [(1, 1), ('2.5', 2.5), (0, 0.5), (-3, 0.5), (10 ** 6, 100),
+                                             ('nan', 1), ('fast', 1), (None, 1)])
+def test_sample_interval_is_clamped(claim, interval):
+    assert profiling.sample_interval_ms(claim) == interval
+
+
+def test_zero_interval_does_not_busy_spin():
+    profile = profiling.RequestProfile('sample', 0)
+    assert profile._profiler.interval == profiling.MIN_SAMPLE_INTERVAL_MS / 1000
+
+
+def test_overlapping_cprofile_leaves_the_request_unprofiled():
+    class Busy:
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+
+    profile = profiling.RequestProfile('cprofile')
+    profile._profiler = Busy()
+    assert profile.start() is False
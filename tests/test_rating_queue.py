@@ -0,0 +1,89 @@
+import time
+import pytest
+
+pytest.importorskip('firebase_admin')
+
+from fake_firestore import FakeFirestore
+from rating_queue import RatingWriteQueue, QueueFull
+
+
+class RecordingStore:
+    def __init__(self):
+        self.applied = []
+
+    def apply_local(self, doc_id, data):
+        self.applied.append((doc_id, data))
+
+
+class FailingFirestore(FakeFirestore):
+    def batch(self):
+        batch = super().batch()
+        def commit():
+            raise RuntimeError("Firestore unavailable")
+        batch.commit = commit
+        return batch
+
+
+def rating(user_id, article_id, value=4):
+    return {'op': 'set', 'rating_id': f"{user_id}_{article_id}", 'user_id': user_id,
+            'article_id': article_id, 'article_rating': value}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_submit_before_start_is_refused(tmp_path):
+    queue = RatingWriteQueue(FakeFirestore(), RecordingStore(), str(tmp_path / 'ratings.log'))
+    with pytest.raises(QueueFull):
+        queue.submit(rating('u1', 1))
+
+
+def test_two_queues_on_one_path_keep_their_own_writes(tmp_path):
+    path = str(tmp_path / 'ratings.log')
+    committed = FakeFirestore()
+    first = RatingWriteQueue(committed, RecordingStore(), path, flush_interval=0.01)
+    second = RatingWriteQueue(FailingFirestore(), RecordingStore(), path, flush_interval=3600)
+    first.start()
+    second.start()
+
+    second.submit(rating('u2', 2))
+    first.submit(rating('u1', 1))
+    wait_for(lambda: first.committed == 1)
+    assert committed.collection('ratings').document('u1_1').get().exists
+
+    # Compacting the first log kept the write the second queue acknowledged
+    assert second.pending_count() == 1
+    assert first.own_log_path != second.own_log_path
+
+    # The second worker dies: a new queue takes over its log, and only its write
+    second._log.close()
+    store = RecordingStore()
+    third = RatingWriteQueue(FakeFirestore(), store, path, flush_interval=0.01)
+    third.start()
+    assert [doc_id for doc_id, _ in store.applied] == ['u2_2']
+    wait_for(lambda: third.committed == 1)
+
+    # The live first queue was not taken over
+    assert first.pending_count() == 0
+    first.close()
+    third.close()
+
+
+def test_close_gives_up_after_timeout_and_keeps_the_log(tmp_path):
+    path = str(tmp_path / 'ratings.log')
+    queue = RatingWriteQueue(FailingFirestore(), RecordingStore(), path, flush_interval=0.01)
+    queue.start()
+    queue.submit(rating('u1', 1))
+    started = time.monotonic()
+    queue.close(timeout=0.5)
+    assert time.monotonic() - started < 3
+    assert queue.failed_commits < 20
+
+    # The write is replayed by the next start
+    store = RecordingStore()
+    RatingWriteQueue(FakeFirestore(), store, path).start()
+    assert [doc_id for doc_id, _ in store.applied] == ['u1_1']
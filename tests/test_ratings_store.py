@@ -0,0 +1,52 @@
+from fake_firestore import FakeFirestore
+from load_ratings import RatingsStore
+
+
+def started_store():
+    db = FakeFirestore()
+    db.collection('users').document('u1').set({'user_id': 'u1', 'email': 'u1@example.com'})
+    db.collection('ratings').document('r1').set({'user_id': 'u1', 'article_id': '3', 'article_rating': 4})
+    store = RatingsStore(db, timeout=1)
+    store.start()
+    return db, store
+
+
+def test_initial_snapshot_is_loaded():
+    _, store = started_store()
+    assert store.ratings_loaded() and store.users_loaded()
+    assert store.find_rating_id('u1', '3') == 'r1'
+    assert store.find_user_by_email('u1@example.com')[0] == 'u1'
+    assert store.ratings_frame().to_dict('records') == [{'user_id': 'u1', 'article_id': 3, 'article_rating': 4}]
+
+
+def test_listener_keeps_the_store_and_subscribers_current():
+    db, store = started_store()
+    changes = []
+    store.subscribe(lambda old, new: changes.append((old, new)))
+    version = store.version
+    db.collection('ratings').document('r2').set({'user_id': 'u2', 'article_id': 5, 'article_rating': 2})
+    db.collection('ratings').document('r1').set({'user_id': 'u1', 'article_id': '3', 'article_rating': 1})
+    db.collection('ratings').document('r2').delete()
+    assert changes == [
+        (None, ('u1', 3, 4)),  # replayed on subscribe
+        (None, ('u2', 5, 2)),
+        (('u1', 3, 4), ('u1', 3, 1)),
+        (('u2', 5, 2), None),
+    ]
+    assert store.version > version
+    assert store.find_rating_id('u2', 5) is None
+    assert store.ratings_arrays()['article_ratings'].tolist() == [1]
+
+
+def test_updates_keep_the_user_encoding_order():
+    db, store = started_store()
+    db.collection('users').document('u2').set({'user_id': 'u2', 'email': 'u2@example.com'})
+    db.collection('ratings').document('r2').set({'user_id': 'u2', 'article_id': 5, 'article_rating': 2})
+    users = store.ratings_arrays()['user_ids']
+    db.collection('ratings').document('r1').set({'user_id': 'u1', 'article_id': '3', 'article_rating': 1})
+    db.collection('users').document('u1').set({'user_id': 'u1', 'email': 'u1@example.org'})
+    assert store.ratings_arrays()['user_ids'] == users == ['u1', 'u2']
+    assert store.ratings_frame()['article_id'].tolist() == [3, 5]
+    assert store.users_frame()['user_id'].tolist() == ['u1', 'u2']
+    assert store.find_user_by_email('u1@example.org')[0] == 'u1'
+    assert store.find_user_by_email('u1@example.com') is None
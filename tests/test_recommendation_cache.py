@@ -0,0 +1,37 @@
+from recommendation_cache import RecommendationCache
+
+
+def test_put_after_an_invalidation_during_the_compute_is_dropped():
+    cache = RecommendationCache()
+    generation = cache.generation('u1')
+    assert cache.get(('u1', 'content')) is None
+    cache.invalidate_user('u1')  # the user rates an article while recommendations are computed
+    cache.put(('u1', 'content'), [1, 2], generation)
+    assert cache.get(('u1', 'content')) is None
+    assert cache.stats()['stale_puts'] == 1
+    cache.put(('u1', 'content'), [3], cache.generation('u1'))
+    assert cache.get(('u1', 'content')) == [3]
+
+
+def test_other_users_and_clear():
+    cache = RecommendationCache()
+    generation = cache.generation('u1')
+    cache.invalidate_user('u2')
+    cache.put(('u1', 'content'), [1], generation)
+    assert cache.get(('u1', 'content')) == [1]
+    generation = cache.generation('u1')
+    cache.clear()
+    cache.put(('u1', 'content'), [2], generation)
+    assert cache.get(('u1', 'content')) is None
+
+
+def test_lru_and_ttl():
+    cache = RecommendationCache(max_entries=2, ttl=60)
+    for user in ('u1', 'u2', 'u3'):
+        cache.put((user, 'content'), [user])
+    assert cache.get(('u1', 'content')) is None
+    assert cache.get(('u3', 'content')) == ['u3']
+    expired = RecommendationCache(ttl=-1)
+    expired.put(('u1', 'content'), [1])
+    assert expired.get(('u1', 'content')) is None
+    assert expired.stats()['evictions'] == 1
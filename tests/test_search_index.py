@@ -0,0 +1,46 @@
+import pytest
+
+from search_index import SortOrders, encode_cursor, decode_cursor
+
+
+def sort_orders(size):
+    return SortOrders([f"title {i:05d}" for i in range(size)], [2000 + i % 20 for i in range(size)], list(range(size)))
+
+
+# Every page of `positions` by following cursors from the start
+def walk(orders, positions, sort_by, per_page):
+    pages, after = [], 0
+    while True:
+        page, after = orders.page(sort_by, positions, 0, per_page, after)
+        pages.append(page)
+        if after is None:
+            return pages
+
+
+@pytest.mark.parametrize('size, step', [(100, 1), (10000, 3), (10000, 97)])  # walk and rank paths
+def test_cursor_pages_cover_the_matches_without_an_empty_last_page(size, step):
+    orders = sort_orders(size)
+    positions = list(range(0, size, step))
+    for per_page in (7, len(positions)):
+        pages = walk(orders, positions, 'title', per_page)
+        assert [position for page in pages for position in page] == positions
+        assert all(pages)
+
+
+def test_decode_cursor_round_trips():
+    orders = sort_orders(50)
+    assert decode_cursor(encode_cursor('year', 12), orders) == ('year', 12)
+    assert decode_cursor(encode_cursor('title', 50), orders) == ('title', 50)
+
+
+@pytest.mark.parametrize('cursor', [
+    encode_cursor('title', -5),
+    encode_cursor('title', 51),
+    encode_cursor('bogus', 3),
+    encode_cursor('title', True),
+    encode_cursor('title', '3'),
+    'not a cursor',
+])
+def test_decode_cursor_rejects_invalid_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, sort_orders(50))
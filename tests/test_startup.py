@@ -0,0 +1,27 @@
+import threading
+
+from startup import Startup
+
+
+def test_pending_lists_stages_that_have_not_loaded():
+    release = threading.Event()
+    startup = Startup()
+    startup.stage('catalog', lambda: None)
+    startup.stage('models', lambda: release.wait(5))
+    startup.stage('index', lambda: None, depends=['models'])
+    startup.start()
+    startup.stages['catalog']['done'].wait(5)
+    assert startup.pending(['catalog', 'models', 'index', 'unregistered']) == ['models', 'index']
+    release.set()
+    assert startup.wait(5)
+    assert startup.pending(['catalog', 'models', 'index']) == []
+
+
+def test_failed_dependencies_stay_pending():
+    startup = Startup()
+    startup.stage('models', lambda: 1 / 0)
+    startup.stage('index', lambda: None, depends=['models'])
+    startup.start()
+    assert not startup.wait(5)
+    assert startup.status()['index']['state'] == 'skipped'
+    assert startup.pending(['index']) == ['index']
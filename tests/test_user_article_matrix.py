@@ -0,0 +1,45 @@
+import numpy as np
+
+from user_article_matrix import UserArticleMatrix
+
+# Article ids -> catalog positions, as load_articles.find_article_position maps them
+POSITIONS = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'wide': 5}
+
+
+def matrix(width=4):
+    return UserArticleMatrix(POSITIONS.get, width)
+
+
+def test_ratings_land_in_their_article_columns():
+    m = matrix()
+    m.on_rating_change(None, ('u1', 'c', 4))
+    m.on_rating_change(None, ('u2', 'a', 2))
+    m.on_rating_change(None, ('u1', 'a', 5))
+    csr, user_ids = m.to_csr()
+    assert user_ids == ['u1', 'u2']
+    np.testing.assert_array_equal(csr.toarray(), [[5, 0, 4, 0], [2, 0, 0, 0]])
+    np.testing.assert_array_equal(m.user_vector('u1'), [[5, 0, 4, 0]])
+    assert sorted(m.user_columns('u1')) == [0, 2]
+
+
+def test_repeated_ratings_are_averaged_and_removed_one_at_a_time():
+    m = matrix()
+    m.on_rating_change(None, ('u1', 'b', 2))
+    m.on_rating_change(None, ('u1', 'b', 5))
+    np.testing.assert_array_equal(m.user_vector('u1'), [[0, 3.5, 0, 0]])
+    m.on_rating_change(('u1', 'b', 2), ('u1', 'b', 4))
+    np.testing.assert_array_equal(m.user_vector('u1'), [[0, 4.5, 0, 0]])
+    m.on_rating_change(('u1', 'b', 4), None)
+    m.on_rating_change(('u1', 'b', 5), None)
+    assert not m.has_user('u1')
+    # The user keeps its row, so other users' rows never move
+    assert m.to_csr()[1] == ['u1']
+
+
+def test_articles_outside_the_model_are_ignored():
+    m = matrix()
+    m.on_rating_change(None, ('u1', 'wide', 3))
+    m.on_rating_change(None, ('u1', 'unknown', 3))
+    assert not m.has_user('u1')
+    assert m.user_columns('nobody').size == 0
+    np.testing.assert_array_equal(m.user_vector('nobody'), np.zeros((1, 4)))
@@ -0,0 +1,92 @@
+import threading
+import numpy as np
+import scipy.sparse as sp
+
+
+# Sparse user x article rating matrix maintained incrementally from rating changes.
+# Rows are users in first-seen order and never move; columns are article positions
+# given by `column_of(article_id)`. Repeated ratings of the same (user, article)
+# are averaged, matching the groupby-mean the content model was trained on.
+class UserArticleMatrix:
+    def __init__(self, column_of, width):
+        self.column_of = column_of
+        self.width = width
+        self._lock = threading.Lock()
+        self._user_rows = {}  # user_id -> row
+        self._rows = []  # row -> {column: [rating_sum, rating_count]}
+
+    # RatingsStore subscriber: apply one rating change
+    def on_rating_change(self, old, new):
+        with self._lock:
+            if old is not None:
+                self._remove(*old)
+            if new is not None:
+                self._add(*new)
+
+    def _column(self, article_id):
+        column = self.column_of(article_id)
+        if column is None or column >= self.width:
+            return None
+        return column
+
+    def _add(self, user_id, article_id, rating):
+        column = self._column(article_id)
+        if column is None:
+            return
+        row = self._user_rows.get(user_id)
+        if row is None:
+            row = self._user_rows[user_id] = len(self._rows)
+            self._rows.append({})
+        cell = self._rows[row].setdefault(column, [0, 0])
+        cell[0] += rating
+        cell[1] += 1
+
+    def _remove(self, user_id, article_id, rating):
+        column = self._column(article_id)
+        row = self._user_rows.get(user_id)
+        if column is None or row is None or column not in self._rows[row]:
+            return
+        cell = self._rows[row][column]
+        cell[0] -= rating
+        cell[1] -= 1
+        if cell[1] <= 0:
+            del self._rows[row][column]
+
+    # Whether the user has at least one rating in the matrix
+    def has_user(self, user_id):
+        with self._lock:
+            row = self._user_rows.get(user_id)
+            return row is not None and bool(self._rows[row])
+
+    # Columns (article positions) the user has rated
+    def user_columns(self, user_id):
+        with self._lock:
+            row = self._user_rows.get(user_id)
+            if row is None:
+                return np.empty(0, dtype=np.int64)
+            return np.fromiter(self._rows[row].keys(), dtype=np.int64)
+
+    # Dense (1, width) model input for one user, filled in O(nnz)
+    def user_vector(self, user_id):
+        vector = np.zeros((1, self.width), dtype=np.float32)
+        with self._lock:
+            row = self._user_rows.get(user_id)
+            if row is not None:
+                for column, (rating_sum, count) in self._rows[row].items():
+                    vector[0, column] = rating_sum / count
+        return vector
+
+    # Snapshot of the whole matrix as CSR, rows in stable user order
+    def to_csr(self):
+        with self._lock:
+            indptr = [0]
+            indices = []
+            data = []
+            for cells in self._rows:
+                for column, (rating_sum, count) in cells.items():
+                    indices.append(column)
+                    data.append(rating_sum / count)
+                indptr.append(len(indices))
+            user_ids = list(self._user_rows)
+        matrix = sp.csr_matrix((np.array(data, dtype=np.float32), indices, indptr), shape=(len(indptr) - 1, self.width))
+        return matrix, user_ids